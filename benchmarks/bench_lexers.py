@@ -0,0 +1,102 @@
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QApplication
+from PyQt5.Qsci import (QsciScintilla, QsciLexerPython, QsciLexerJava, QsciLexerHTML, QsciLexerJavaScript,
+                        QsciLexerCSS, QsciLexerCPP, QsciLexerRuby)
+
+import main
+
+ROUNDS = 20
+SAMPLES = {
+    'sample.py': "def f(x):\n    return [i * 2 for i in range(x)]  # comment\n",
+    'Sample.java': "class Sample {\n    int f(int x) { return x * 2; } // comment\n}\n",
+    'sample.cpp': "#include <vector>\nint f(int x) { return x * 2; } // comment\n",
+    'sample.js': "function f(x) {\n    return x.map(i => i * 2); // comment\n}\n",
+    'sample.php': "<?php\nfunction f($x) { return $x * 2; } // comment\n?>\n",
+}
+LINES = 20000
+
+
+def oldLoadFile(editor, fileName):
+    # Replica of the loadFile body before the lexer registry
+    with open(fileName, 'r') as f:
+        editor.setText(f.read())
+    if fileName.endswith('.py'):
+        lexer = QsciLexerPython()
+    elif fileName.endswith('.java'):
+        lexer = QsciLexerJava()
+    elif fileName.endswith('.html'):
+        lexer = QsciLexerHTML()
+    elif fileName.endswith('.js'):
+        lexer = QsciLexerJavaScript()
+    elif fileName.endswith('.css'):
+        lexer = QsciLexerCSS()
+    elif fileName.endswith('.cpp'):
+        lexer = QsciLexerCPP()
+    elif fileName.endswith('.rb'):
+        lexer = QsciLexerRuby()
+    else:
+        lexer = None
+    if lexer:
+        lexer.setDefaultFont(QFont("Consolas", 10))
+        editor.setLexer(lexer)
+
+
+def bench(label, openFile, fileNames, app):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for fileName in fileNames:
+            openFile(fileName)
+            app.processEvents()
+    elapsed = time.perf_counter() - start
+    opens = ROUNDS * len(fileNames)
+    print(f"{label:<28} {opens:>6} opens  {elapsed * 1000 / opens:8.2f} ms/open")
+    return elapsed
+
+
+def run():
+    app = QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        fileNames = []
+        for name, text in SAMPLES.items():
+            fileName = os.path.join(tmp, name)
+            with open(fileName, 'w') as f:
+                f.write(text * (LINES // text.count('\n')))
+            fileNames.append(fileName)
+
+        editor = QsciScintilla()
+        editor.resize(1000, 700)
+        editor.show()
+        before = bench('before: new lexer per open', lambda fileName: oldLoadFile(editor, fileName), fileNames, app)
+
+        # The window opens the working directory as its project and restores the last session. It gets an
+        # empty project beside the samples and a session of its own, so the user's is neither restored nor replaced.
+        projectDir = os.path.join(tmp, 'project')
+        os.mkdir(projectDir)
+        os.chdir(projectDir)
+        os.environ['SCRIPTBLISS_SESSION'] = os.path.join(tmp, 'session.json')
+        window = main.MainWindow()
+
+        def newLoadFile(fileName):
+            window.loadFile(fileName)
+            while window.loader is not None:
+                app.processEvents()
+
+        try:
+            after = bench('after: lexer registry', newLoadFile, fileNames, app)
+        finally:
+            window.close()
+            os.chdir(ROOT)
+        print(f"speedup: {before / after:.1f}x ({len(fileNames)} files x {LINES} lines, {ROUNDS} rounds)")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,123 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 7
+SESSION_FILES = 50
+
+# Runs in a fresh interpreter so module caches and Qt state do not carry over between samples
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+# The window opens the working directory as its project
+os.chdir(sys.argv[3])
+import main
+from PyQt5.QtCore import QObject, QEvent
+from PyQt5.QtWidgets import QApplication
+imported = time.perf_counter()
+app = QApplication(sys.argv)
+times = {}
+
+class PaintWatcher(QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and 'firstPaint' not in times:
+            times['firstPaint'] = time.perf_counter()
+        return False
+
+finishStartup = getattr(main.MainWindow, 'finishStartup', None)
+if finishStartup is not None:
+    def timedFinishStartup(self):
+        finishStartup(self)
+        times['deferred'] = time.perf_counter()
+    main.MainWindow.finishStartup = timedFinishStartup
+
+watcher = PaintWatcher()
+app.installEventFilter(watcher)
+window = main.MainWindow()
+window.show()
+constructed = time.perf_counter()
+while 'firstPaint' not in times or (finishStartup is not None and 'deferred' not in times):
+    app.processEvents()
+# A restored session reads its current buffer in the background
+while getattr(window, 'loader', None) is not None:
+    app.processEvents()
+loaded = time.perf_counter()
+with open(sys.argv[2], 'w') as f:
+    json.dump({'import': imported - start, 'construct': constructed - imported,
+               'firstPaint': times['firstPaint'] - start,
+               'deferred': times.get('deferred', constructed) - start, 'loaded': loaded - start}, f)
+window.close()
+# Pool workers would otherwise outlive os._exit and compete with the next sample
+import multiprocessing
+for child in multiprocessing.active_children():
+    child.join()
+# Interpreter teardown is not what is being measured
+os._exit(0)
+'''
+
+
+def writeSession(workDir):
+    # A project of SESSION_FILES open files of 2000 lines each, the last one current
+    project = os.path.join(workDir, 'project')
+    os.mkdir(project)
+    files = []
+    for i in range(SESSION_FILES):
+        fileName = os.path.join(project, f'module{i:02}.py')
+        with open(fileName, 'w') as f:
+            f.write(''.join(f"def function{n}(value):\n    return value * {n}\n" for n in range(1000)))
+        files.append(fileName)
+    session = {'version': 1, 'project': project, 'current': files[-1], 'expanded': [], 'runTarget': None,
+               'buffers': [{'file': fileName, 'cursor': [1000, 0], 'top': 990, 'fullFeatures': False}
+                           for fileName in files]}
+    with open(os.path.join(workDir, 'session.json'), 'w') as f:
+        json.dump(session, f)
+
+
+def sample(withSession=False):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    # Lets the warm-up sample write bytecode, so later samples measure a cached import like an installed copy
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    # Results go through a file because the shell started by the terminal tab inherits stdout
+    with tempfile.TemporaryDirectory(prefix='scriptbliss-startup-') as workDir:
+        # The user's own session and settings are neither used nor replaced, and the project is an empty
+        # directory rather than the checkout, which would get indexed and have .scriptbliss written into it
+        env['SCRIPTBLISS_SESSION'] = os.path.join(workDir, 'session.json')
+        env['XDG_CONFIG_HOME'] = os.path.join(workDir, 'config')
+        projectDir = os.path.join(workDir, 'start')
+        os.mkdir(projectDir)
+        if withSession:
+            writeSession(workDir)
+        results = os.path.join(workDir, 'results.json')
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', CHILD, ROOT, results, projectDir], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        with open(results) as f:
+            result = json.load(f)
+    result['process'] = elapsed
+    return result
+
+
+def report(title, samples):
+    print(title)
+    for key, label in (('import', 'import main + PyQt5'), ('construct', 'MainWindow() + show()'),
+                       ('firstPaint', 'time to first paint'), ('deferred', 'deferred startup done'),
+                       ('loaded', 'current buffer loaded'), ('process', 'whole process')):
+        values = [s[key] * 1000 for s in samples]
+        print(f"{label:<24} {statistics.median(values):8.1f} ms  (min {min(values):.1f}, max {max(values):.1f})")
+
+
+def run():
+    sample()  # warms the OS file cache and writes bytecode
+    report(f"median of {RUNS} fresh processes (QT_QPA_PLATFORM=offscreen)", [sample() for _ in range(RUNS)])
+    report(f"\nrestoring a session of {SESSION_FILES} open files", [sample(True) for _ in range(RUNS)])
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QApplication, QFileSystemModel, QTreeView
+
+import main
+
+DIRS = 50
+FILES_PER_DIR = 1000
+EXTENSIONS = ('.py', '.cpp', '.js', '.txt', '.png', '.java', '.md', '.rb')
+
+
+class OldFileSystemModel(QFileSystemModel):
+    # Replica of CustomFileSystemModel before the per-node cache
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.icon_map = {ext: QIcon(os.path.join(ROOT, name)) for ext, name in main.FILE_ICONS.items()}
+
+    def data(self, index, role):
+        if role == Qt.DecorationRole and index.column() == 0:
+            file_path = self.filePath(index)
+            _, ext = os.path.splitext(file_path)
+            if ext in self.icon_map:
+                return self.icon_map[ext]
+        elif role == Qt.DisplayRole and index.column() == 0:
+            return os.path.basename(self.filePath(index))
+        return super().data(index, role)
+
+
+def makeTree(root):
+    for d in range(DIRS):
+        path = os.path.join(root, f'dir{d:03}')
+        os.mkdir(path)
+        for i in range(FILES_PER_DIR):
+            open(os.path.join(path, f'file{i:05}{EXTENSIONS[i % len(EXTENSIONS)]}'), 'w').close()
+
+
+def loadTree(app, model, root):
+    rootIndex = model.setRootPath(root)
+    while model.rowCount(rootIndex) < DIRS:
+        app.processEvents()
+    for d in range(DIRS):
+        index = model.index(d, 0, rootIndex)
+        model.fetchMore(index)
+        while model.rowCount(index) < FILES_PER_DIR:
+            app.processEvents()
+    return rootIndex
+
+
+def dataCalls(model, rootIndex):
+    indexes = [model.index(row, 0, model.index(d, 0, rootIndex))
+               for d in range(DIRS) for row in range(FILES_PER_DIR)]
+    start = time.perf_counter()
+    for _ in range(3):
+        for index in indexes:
+            model.data(index, Qt.DisplayRole)
+            model.data(index, Qt.DecorationRole)
+    return 6 * len(indexes) / (time.perf_counter() - start)
+
+
+def scroll(app, model, root, uniformRowHeights):
+    rootIndex = loadTree(app, model, root)
+    view = QTreeView()
+    view.setUniformRowHeights(uniformRowHeights)
+    view.setModel(model)
+    view.setRootIndex(rootIndex)
+    view.setHeaderHidden(True)
+    for column in (1, 2, 3):
+        view.setColumnHidden(column, True)
+    view.resize(300, 900)
+    view.show()
+    start = time.perf_counter()
+    view.expandAll()
+    app.processEvents()
+    expand = time.perf_counter() - start
+
+    scrollBar = view.verticalScrollBar()
+    steps = 0
+    start = time.perf_counter()
+    for value in range(0, scrollBar.maximum() + 1, max(scrollBar.pageStep() // 2, 1)):
+        scrollBar.setValue(value)
+        view.viewport().repaint()
+        steps += 1
+    elapsed = time.perf_counter() - start
+    view.close()
+    return expand, steps, elapsed, dataCalls(model, rootIndex)
+
+
+def run():
+    app = QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        makeTree(tmp)
+        print(f"{DIRS * FILES_PER_DIR} files in {DIRS} directories")
+        results = {}
+        for label, modelClass, uniformRowHeights in (('before: uncached data()', OldFileSystemModel, False),
+                                                     ('after: per-node cache', main.CustomFileSystemModel, True)):
+            expand, steps, elapsed, callsPerSecond = scroll(app, modelClass(), tmp, uniformRowHeights)
+            results[label] = expand + elapsed
+            print(f"{label:<26} expand {expand * 1000:8.1f} ms  {steps:>5} repaints  "
+                  f"{elapsed * 1000 / steps:7.3f} ms/repaint  {elapsed:6.2f} s total  "
+                  f"{callsPerSecond / 1000:7.0f}k data() calls/s")
+        before, after = results.values()
+        print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,254 @@
+"""Headless benchmark suite for the IDE's hot paths.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline benchmarks/baseline.json
+
+Every metric records whether lower or higher is better, so --baseline can flag
+results that got worse by more than --tolerance and exit non-zero. The committed
+baseline is a full run; regenerate it with the first command when metrics are
+added or the machine changes. --quick uses smaller inputs, its results are only
+comparable with a baseline made with --quick.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtCore import Qt, QEvent, QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtGui import QKeyEvent
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+MB = 1024 * 1024
+KEYS = {'\n': Qt.Key_Return, '(': Qt.Key_ParenLeft, '[': Qt.Key_BracketLeft, '{': Qt.Key_BraceLeft,
+        '"': Qt.Key_QuoteDbl, "'": Qt.Key_Apostrophe}
+LINE = "    result = compute(value, [item * 2 for item in range(10)])  # comment\n"
+
+
+class Suite:
+    def __init__(self, app, workDir, quick):
+        self.app = app
+        self.workDir = workDir
+        self.quick = quick
+        self.results = {}
+        self.window = main.MainWindow()
+        self.window.show()
+        self.pump(0.5)
+
+    def record(self, name, value, unit, better):
+        self.results[name] = {'value': value, 'unit': unit, 'better': better}
+        print(f"  {name:<40} {value:14.3f} {unit}")
+
+    def pump(self, seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self.app.processEvents()
+
+    def pumpUntil(self, done, timeout=600):
+        # Returns the longest gap between event loop iterations, i.e. how long the UI froze
+        longest = 0
+        last = start = time.perf_counter()
+        while not done():
+            self.app.processEvents()
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+            if now - start > timeout:
+                raise TimeoutError('benchmark did not finish')
+        return longest
+
+    def makeFile(self, name, size):
+        fileName = os.path.join(self.workDir, name)
+        block = LINE * (MB // len(LINE))
+        with open(fileName, 'w') as f:
+            written = 0
+            while written < size:
+                f.write(block)
+                written += len(block)
+        return fileName
+
+    def loadFile(self, fileName):
+        start = time.perf_counter()
+        self.window.loadFile(fileName)
+        stall = self.pumpUntil(lambda: self.window.loader is None)
+        return time.perf_counter() - start, stall
+
+    def benchLoadFile(self):
+        for sizeMB in (1, 50) if self.quick else (1, 50, 500):
+            fileName = self.makeFile(f'load{sizeMB}.py', sizeMB * MB)
+            elapsed, stall = self.loadFile(fileName)
+            self.record(f'loadFile.{sizeMB}MB.seconds', elapsed, 's', 'lower')
+            self.record(f'loadFile.{sizeMB}MB.maxStall', stall * 1000, 'ms', 'lower')
+            self.window.closeBuffer(fileName, force=True)
+            os.remove(fileName)
+
+    def benchConsole(self):
+        lines = 100000 if self.quick else 500000
+        script = f"import sys\nfor i in range({lines}):\n    sys.stdout.write(f'line {{i}} of chatty output\\n')\n"
+        start = time.perf_counter()
+        run = self.window.startProcess(sys.executable, ['-c', script])
+        stall = self.pumpUntil(lambda: not run.isRunning())
+        run.console.flush()
+        elapsed = time.perf_counter() - start
+        self.record('console.linesPerSecond', lines / elapsed, 'lines/s', 'higher')
+        self.record('console.maxStall', stall * 1000, 'ms', 'lower')
+
+    def benchModelData(self):
+        dirs, files = (20, 500) if self.quick else (50, 1000)
+        treeRoot = os.path.join(self.workDir, 'tree')
+        extensions = ('.py', '.cpp', '.js', '.txt', '.png', '.java', '.md', '.rb')
+        for d in range(dirs):
+            os.makedirs(os.path.join(treeRoot, f'dir{d:03}'))
+            for i in range(files):
+                open(os.path.join(treeRoot, f'dir{d:03}', f'file{i:05}{extensions[i % len(extensions)]}'), 'w').close()
+        model = main.CustomFileSystemModel()
+        rootIndex = model.setRootPath(treeRoot)
+        self.pumpUntil(lambda: model.rowCount(rootIndex) == dirs)
+        parents = [model.index(d, 0, rootIndex) for d in range(dirs)]
+        for parent in parents:
+            model.fetchMore(parent)
+        self.pumpUntil(lambda: all(model.rowCount(parent) == files for parent in parents))
+        indexes = [model.index(row, 0, parent) for parent in parents for row in range(files)]
+        samples = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for index in indexes:
+                model.data(index, Qt.DisplayRole)
+                model.data(index, Qt.DecorationRole)
+            samples.append(time.perf_counter() - start)
+        self.record('model.dataCallsPerSecond', 2 * len(indexes) / statistics.median(samples), 'calls/s', 'higher')
+
+    def benchSave(self):
+        for sizeMB in (1, 50):
+            fileName = self.makeFile(f'save{sizeMB}.py', sizeMB * MB)
+            self.loadFile(fileName)
+            self.window.editor.insert('# edited\n')
+            samples = []
+            stalls = []
+            for _ in range(5):
+                start = time.perf_counter()
+                self.window.saveFileDialog()
+                stall = time.perf_counter() - start
+                # The file is written on a worker thread, this waits for it to be on disk
+                stalls.append(max(stall, self.pumpUntil(lambda: not self.window.savers)))
+                samples.append(time.perf_counter() - start)
+            self.record(f'saveFileDialog.{sizeMB}MB.seconds', statistics.median(samples), 's', 'lower')
+            self.record(f'saveFileDialog.{sizeMB}MB.maxStall', max(stalls) * 1000, 'ms', 'lower')
+            self.window.closeBuffer(fileName, force=True)
+            os.remove(fileName)
+
+    def benchKeystrokes(self):
+        fileName = self.makeFile('keys.py', MB)
+        self.loadFile(fileName)
+        editor = self.window.editor
+        editor.setCursorPosition(editor.lines() // 2, 0)
+        text = "value = compute(items[0], {'key': \"text\"})\n" * (10 if self.quick else 50)
+        latencies = []
+        for char in text:
+            # editorKeyPressEvent auto-closes brackets and quotes by key code, plain text needs none
+            event = QKeyEvent(QEvent.KeyPress, KEYS.get(char, 0), Qt.NoModifier, '' if char == '\n' else char)
+            start = time.perf_counter()
+            self.window.editorKeyPressEvent(event)
+            # Includes the repaint the keystroke causes
+            editor.viewport().repaint()
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        self.record('keystroke.p50', latencies[len(latencies) // 2] * 1000, 'ms', 'lower')
+        self.record('keystroke.p99', latencies[int(len(latencies) * 0.99)] * 1000, 'ms', 'lower')
+        self.record('keystroke.max', latencies[-1] * 1000, 'ms', 'lower')
+        self.window.closeBuffer(fileName, force=True)
+
+    def close(self):
+        self.window.close()
+
+
+BENCHMARKS = {
+    'loadFile': Suite.benchLoadFile,
+    'console': Suite.benchConsole,
+    'model': Suite.benchModelData,
+    'save': Suite.benchSave,
+    'keystroke': Suite.benchKeystrokes,
+}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'metric':<40} {'baseline':>14} {'current':>14} {'change':>8}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None or not reference['value']:
+            print(f"{name:<40} {'-':>14} {result['value']:14.3f}")
+            continue
+        change = result['value'] / reference['value'] - 1
+        worse = change > tolerance if result['better'] == 'lower' else change < -tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:<40} {reference['value']:14.3f} {result['value']:14.3f} {change:+8.1%}"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='smaller inputs, skips the 500 MB load')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative change that counts as a regression (default 0.2)')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='scriptbliss-bench-') as workDir:
+        # The window treats the working directory as its project. Inputs live next to it, not
+        # inside it, so the project and symbol indexers do not compete with the measurements.
+        projectDir = os.path.join(workDir, 'project')
+        dataDir = os.path.join(workDir, 'data')
+        os.mkdir(projectDir)
+        os.mkdir(dataDir)
+        os.chdir(projectDir)
+        # Starts without the user's last session and does not replace it
+        os.environ['SCRIPTBLISS_SESSION'] = os.path.join(workDir, 'session.json')
+        suite = Suite(app, dataDir, args.quick)
+        try:
+            for name in args.only or BENCHMARKS:
+                print(name)
+                BENCHMARKS[name](suite)
+        finally:
+            suite.close()
+            os.chdir(ROOT)
+        results = suite.results
+
+    report = {
+        'meta': {'python': platform.python_version(), 'qt': QT_VERSION_STR, 'pyqt': PYQT_VERSION_STR,
+                 'platform': platform.platform(), 'cpus': os.cpu_count(), 'quick': args.quick,
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('quick') != args.quick:
+            print(f"\nwarning: the baseline is {'a --quick' if baseline['meta'].get('quick') else 'a full'} run, "
+                  f"inputs differ from this one")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    run()
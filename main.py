@@ -1,54 +1,3512 @@
 import sys
 import os
-import subprocess
-import webbrowser
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QTreeView, QFileSystemModel, QSplitter, QTextEdit,
-                             QTabWidget, QMenu, QAction, QInputDialog, QMessageBox, QLabel, QFileDialog, QVBoxLayout, QWidget)
-from PyQt5.QtGui import (QIcon, QColor, QPalette, QFont, QFontMetrics, QPixmap, QDesktopServices)
-from PyQt5.QtCore import (Qt, QDir, QProcess, QTimer, QUrl, QPoint)
-from PyQt5.Qsci import (QsciScintilla, QsciLexerPython, QsciLexerJava, QsciLexerHTML, QsciLexerJavaScript,
-                        QsciLexerCSS, QsciLexerCPP, QsciLexerRuby)
+import re
+import json
+import codecs
+import bisect
+import time
+import signal
+import struct
+import threading
+import functools
+from collections import OrderedDict, deque
+try:
+    import pty
+    import fcntl
+    import termios
+except ImportError:
+    pty = None
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QTreeView, QFileSystemModel, QSplitter,
+                             QTabWidget, QMenu, QAction, QInputDialog, QMessageBox, QLabel, QFileDialog, QVBoxLayout, QWidget,
+                             QProgressBar, QToolButton, QTabBar, QPlainTextEdit, QDialog, QLineEdit, QListWidget,
+                             QListWidgetItem, QTreeWidget, QTreeWidgetItem, QCheckBox, QPushButton, QHBoxLayout,
+                             QScrollArea, QStackedWidget)
+from PyQt5.QtGui import (QIcon, QColor, QPalette, QFont, QFontMetrics, QPixmap, QDesktopServices, QTextCursor,
+                         QKeySequence, QImage, QImageReader)
+from PyQt5.QtCore import (Qt, QDir, QProcess, QTimer, QUrl, QPoint, QThread, QSemaphore, QSettings, QObject,
+                          QSocketNotifier, QFileSystemWatcher, QEvent, QSize, QStandardPaths, QSortFilterProxyModel,
+                          pyqtSignal)
+from PyQt5.Qsci import (QsciScintilla, QsciDocument, QsciLexerPython, QsciLexerJava, QsciLexerHTML, QsciLexerJavaScript,
+                        QsciLexerCSS, QsciLexerCPP, QsciLexerRuby, QsciAPIs, QsciAbstractAPIs, QSCINTILLA_VERSION_STR)
+
+def settings():
+    return QSettings('ScriptBliss', 'ScriptBliss')
+
+def stopProcess(process, kill=None):
+    # For a process whose owner is going away. Its signals are blocked first, finished would otherwise
+    # fire while Qt tears the process down. kill defaults to QProcess.kill().
+    process.blockSignals(True)
+    (kill or process.kill)()
+    process.waitForFinished(1000)
+
+class GitStatus:
+    COLORS = {
+        'M': QColor("#e2c08d"),
+        'A': QColor("#73c991"),
+        '?': QColor("#73c991"),
+        'U': QColor("#e06c75"),
+        '!': QColor("#6c6c8c"),
+    }
+
+    def __init__(self, root=None):
+        self.root = root
+        self.files = {}
+        # Untracked and ignored directories are reported once for everything inside them
+        self.dirs = {}
+        self.changedDirs = set()
+
+    @classmethod
+    def parse(cls, root, data):
+        status = cls(root)
+        fields = data.split(b'\0')
+        i = 0
+        while i < len(fields):
+            field = fields[i].decode(errors='surrogateescape')
+            i += 1
+            if not field:
+                continue
+            kind = field[0]
+            if kind == '1':
+                xy, path = field[2:4], field.split(' ', 8)[8]
+            elif kind == '2':
+                # Renames and copies are followed by the original path
+                xy, path = field[2:4], field.split(' ', 9)[9]
+                i += 1
+            elif kind == 'u':
+                xy, path = 'UU', field.split(' ', 10)[10]
+            elif kind in '?!':
+                xy, path = kind, field[2:]
+            else:
+                continue
+            if 'U' in xy:
+                state = 'U'
+            elif kind in '?!':
+                state = kind
+            elif 'A' in xy:
+                state = 'A'
+            else:
+                state = 'M'
+            status.add(path, state)
+        return status
+
+    def add(self, relPath, state):
+        path = os.path.normpath(os.path.join(self.root, relPath))
+        if relPath.endswith('/'):
+            self.dirs[path] = state
+        else:
+            self.files[path] = state
+        if state != '!':
+            parent = os.path.dirname(path)
+            while parent not in self.changedDirs and len(parent) > len(self.root):
+                self.changedDirs.add(parent)
+                parent = os.path.dirname(parent)
+
+    def stateOf(self, path):
+        if self.root is None:
+            return None
+        state = self.files.get(path)
+        if state:
+            return state
+        parent = path
+        while len(parent) >= len(self.root):
+            state = self.dirs.get(parent)
+            if state:
+                return state
+            if parent == self.root:
+                break
+            parent = os.path.dirname(parent)
+        if path in self.changedDirs:
+            return 'M'
+        return None
+
+class GitService(QObject):
+    output = pyqtSignal(str)
+    statusChanged = pyqtSignal()
+    commandFinished = pyqtSignal(list, int)
+
+    REFRESH_DELAY = 300
+    MAX_WATCHED_DIRS = 2000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.workTree = None
+        self.root = None
+        self.status = GitStatus()
+        self._generation = 0
+        self._queue = deque()
+        self._process = None
+        self._statusQueued = False
+        self._refreshTimer = QTimer(self)
+        self._refreshTimer.setSingleShot(True)
+        self._refreshTimer.setInterval(self.REFRESH_DELAY)
+        self._refreshTimer.timeout.connect(self.refreshStatus)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.scheduleRefresh)
+        self._watcher.fileChanged.connect(self.scheduleRefresh)
+
+    def setWorkTree(self, path):
+        # Answers to commands queued for the previous work tree are dropped
+        self._generation += 1
+        generation = self._generation
+        self.workTree = path
+        self.root = None
+        self.status = GitStatus()
+        self.statusChanged.emit()
+        watched = self._watcher.directories() + self._watcher.files()
+        if watched:
+            self._watcher.removePaths(watched)
+        self.run(['rev-parse', '--show-toplevel'],
+                 lambda exitCode, data: self._onTopLevel(generation, exitCode, data), echo=False)
+
+    def _onTopLevel(self, generation, exitCode, data):
+        if generation != self._generation or exitCode != 0:
+            return
+        self.root = os.path.normpath(data.decode(errors='surrogateescape').strip())
+        gitDir = os.path.join(self.root, '.git')
+        self._watcher.addPaths([path for path in (self.root, gitDir, os.path.join(gitDir, 'HEAD')) if os.path.exists(path)])
+        self.refreshStatus()
+
+    def watchDirectory(self, path):
+        if self.root is not None and len(self._watcher.directories()) < self.MAX_WATCHED_DIRS:
+            self._watcher.addPath(path)
+
+    def scheduleRefresh(self, *args):
+        if self.root is not None:
+            self._refreshTimer.start()
+
+    def refreshStatus(self):
+        if self.root is None or self._statusQueued:
+            return
+        self._statusQueued = True
+        generation = self._generation
+        # --no-optional-locks keeps status from rewriting the index, which the watcher would see
+        self.run(['--no-optional-locks', 'status', '--porcelain=v2', '-z', '--ignored'],
+                 lambda exitCode, data: self._onStatus(generation, exitCode, data), echo=False, cwd=self.root)
+
+    def _onStatus(self, generation, exitCode, data):
+        self._statusQueued = False
+        if generation != self._generation:
+            self.refreshStatus()
+        elif exitCode == 0 and self.root is not None:
+            self.status = GitStatus.parse(self.root, data)
+            self.statusChanged.emit()
+
+    def readHead(self, path, callback):
+        # Calls back with the file's contents at HEAD, or None when HEAD does not have it.
+        # Returns False when the work tree is not a repository or not known yet.
+        if self.root is None:
+            return False
+        relPath = os.path.relpath(os.path.realpath(path), self.root)
+        if relPath.startswith(os.pardir):
+            callback(None)
+            return True
+        generation = self._generation
+        self.run(['--no-optional-locks', 'cat-file', 'blob', 'HEAD:' + relPath.replace(os.sep, '/')],
+                 lambda exitCode, data: generation == self._generation and callback(data if exitCode == 0 else None),
+                 echo=False, cwd=self.root)
+        return True
+
+    def close(self):
+        self._queue.clear()
+        self._refreshTimer.stop()
+        process, self._process = self._process, None
+        if process is not None:
+            stopProcess(process)
+
+    def run(self, args, callback=None, echo=True, cwd=None):
+        # Commands run one at a time so that e.g. a status never races a commit on the index
+        self._queue.append((args, callback, echo, cwd or self.workTree))
+        self._next()
+
+    def _next(self):
+        if self._process is not None or not self._queue:
+            return
+        args, callback, echo, cwd = self._queue.popleft()
+        process = QProcess(self)
+        process.setWorkingDirectory(cwd or os.getcwd())
+        if echo:
+            self.output.emit(f"$ git {' '.join(args)}\n")
+            process.setProcessChannelMode(QProcess.MergedChannels)
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            process.readyReadStandardOutput.connect(
+                lambda: self.output.emit(decoder.decode(process.readAllStandardOutput().data())))
+        process.finished.connect(lambda exitCode, exitStatus: self._finish(process, args, callback, exitCode))
+        process.errorOccurred.connect(lambda error: self._failed(process, args, callback, error))
+        self._process = process
+        process.start('git', args)
+        profiler.processStarted(process, 'git', args)
+
+    def _finish(self, process, args, callback, exitCode):
+        data = b'' if process.processChannelMode() == QProcess.MergedChannels else process.readAllStandardOutput().data()
+        self._done(process, args, callback, exitCode, data)
+
+    def _failed(self, process, args, callback, error):
+        if error == QProcess.FailedToStart:
+            self.output.emit("Failed to start git. Is it installed and on the PATH?\n")
+            self._done(process, args, callback, -1, b'')
+
+    def _done(self, process, args, callback, exitCode, data):
+        if self._process is not process:
+            return
+        echo = process.processChannelMode() == QProcess.MergedChannels
+        self._process = None
+        process.deleteLater()
+        if callback is not None:
+            callback(exitCode, data)
+        self.commandFinished.emit(args, exitCode)
+        if echo:
+            self.scheduleRefresh()
+        self._next()
+
+FILE_ICONS = {
+    '.cpp': 'cpp.png',
+    '.css': 'css.png',
+    '.java': 'java.png',
+    '.php': 'php.png',
+    '.html': 'html.png',
+    '.js': 'javascript.png',
+    '.png': 'image.png',
+    '.jpg': 'image.png',
+    '.jpeg': 'image.png',
+    '.bmp': 'image.png',
+    '.gif': 'image.png',
+    '.py': 'python.png',
+    '.rb': 'ruby.png'
+}
+
+_icons = {}
+
+def loadIcon(fileName):
+    # Icons are loaded the first time they are shown and shared afterwards
+    icon = _icons.get(fileName)
+    if icon is None:
+        icon = _icons[fileName] = QIcon(fileName)
+    return icon
 
 class CustomFileSystemModel(QFileSystemModel):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.icon_map = {
-            '.cpp': QIcon('cpp.png'),
-            '.css': QIcon('css.png'),
-            '.java': QIcon('java.png'),
-            '.php': QIcon('php.png'),
-            '.html': QIcon('html.png'),
-            '.js': QIcon('javascript.png'),
-            '.png': QIcon('image.png'),
-            '.jpg': QIcon('image.png'),
-            '.jpeg': QIcon('image.png'),
-            '.bmp': QIcon('image.png'),
-            '.gif': QIcon('image.png'),
-            '.py': QIcon('python.png'),
-            '.rb': QIcon('ruby.png')
-        }
+        self.gitStatus = GitStatus()
+        # Per-node name, icon and path, keyed on the internal node pointer of the index
+        self._nodes = {}
+        self._gitStates = {}
+        self.rowsAboutToBeRemoved.connect(self._forgetRows)
+        self.fileRenamed.connect(self._forgetAll)
+        self.modelReset.connect(self._forgetAll)
+
+    def _forgetRows(self, parent, first, last):
+        for row in range(first, last + 1):
+            index = self.index(row, 0, parent)
+            if self.isDir(index):
+                # The nodes of everything below go away without their own signals
+                self._forgetAll()
+                return
+            self._nodes.pop(index.internalId(), None)
+            self._gitStates.pop(index.internalId(), None)
+
+    def _forgetAll(self, *args):
+        self._nodes.clear()
+        self._gitStates.clear()
+
+    def _node(self, index):
+        node = self._nodes.get(index.internalId())
+        if node is None:
+            name = super().data(index, QFileSystemModel.FileNameRole)
+            iconFile = FILE_ICONS.get(os.path.splitext(name)[1].lower())
+            node = self._nodes[index.internalId()] = (name, loadIcon(iconFile) if iconFile else None)
+        return node
+
+    def setGitStatus(self, status):
+        self.gitStatus = status
+        self._gitStates.clear()
+
+    def _gitState(self, index):
+        key = index.internalId()
+        if key not in self._gitStates:
+            self._gitStates[key] = self.gitStatus.stateOf(os.path.normpath(self.filePath(index)))
+        return self._gitStates[key]
+
+    def data(self, index, role):
+        if index.column() == 0:
+            if role == Qt.DecorationRole:
+                icon = self._node(index)[1]
+                if icon is not None:
+                    return icon
+            elif role == Qt.DisplayRole:
+                return self._node(index)[0]
+            elif role == Qt.ForegroundRole and self.gitStatus.root is not None:
+                state = self._gitState(index)
+                if state:
+                    return GitStatus.COLORS[state]
+        return super().data(index, role)
+
+class ProjectTreeFilter(QSortFilterProxyModel):
+    # Hides the excluded and git ignored entries of the project. The view cannot expand a
+    # hidden directory, so the file system model never lists or watches what is below it.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.excludes = DEFAULT_EXCLUDES
+        self.matcher = IgnoreMatcher(self.excludes)
+
+    def setRoot(self, root):
+        self.root = os.path.normpath(root)
+        self.reload()
+
+    def setExcludes(self, excludes):
+        self.excludes = tuple(excludes)
+        self.reload()
+
+    def reload(self):
+        # .gitignore files are read again as their directories are shown
+        self.matcher = IgnoreMatcher(self.excludes)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        if self.root is None:
+            return True
+        model = self.sourceModel()
+        parentPath = os.path.normpath(model.filePath(sourceParent))
+        if parentPath != self.root and not parentPath.startswith(self.root + os.sep):
+            # Above the project, or beside it
+            return True
+        relDir = '' if parentPath == self.root else os.path.relpath(parentPath, self.root).replace(os.sep, '/')
+        self.matcher.loadParents(self.root, relDir)
+        index = model.index(sourceRow, 0, sourceParent)
+        name = model.fileName(index)
+        return not self.matcher.ignored(f'{relDir}/{name}' if relDir else name, model.isDir(index))
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+def detectEncoding(sample):
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # The sample may end in the middle of a multi-byte sequence, so decode it incrementally
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return 'utf-8'
+
+FALLBACK_ENCODING = 'latin-1'
+
+class FileLoader(QThread):
+    chunkLoaded = pyqtSignal(str)
+    # The text loaded so far is to be dropped, the file is read again from the start
+    restarted = pyqtSignal()
+    progress = pyqtSignal(int)
+    loaded = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    CHUNK_SIZE = 1 << 20
+    MAX_CHUNKS_IN_FLIGHT = 4
+
+    def __init__(self, fileName, parent=None):
+        super().__init__(parent)
+        self.fileName = fileName
+        self.encoding = 'utf-8'
+        self.windowsEol = False
+        # Size and modification time of the file that was read, unsaved edits are journaled against it
+        self.stamp = None
+        self._cancelled = False
+        # Bounds how many decoded chunks can wait in the GUI event queue at once
+        self._slots = QSemaphore(self.MAX_CHUNKS_IN_FLIGHT)
+
+    def cancel(self):
+        self._cancelled = True
+        self._slots.release(self.MAX_CHUNKS_IN_FLIGHT)
+
+    def chunkConsumed(self):
+        self._slots.release()
+
+    def run(self):
+        try:
+            total = os.path.getsize(self.fileName)
+            with open(self.fileName, 'rb') as f:
+                self.stamp = fileStamp(os.fstat(f.fileno()))
+                data = f.read(self.CHUNK_SIZE)
+                self.encoding = detectEncoding(data)
+                self.windowsEol = b'\r\n' in data
+                try:
+                    if not self._read(f, data, total):
+                        return
+                except UnicodeDecodeError:
+                    # Only the first chunk was sniffed. Replacing the bytes that do not decode would
+                    # write U+FFFD back on save, the fallback decodes every byte and round-trips.
+                    self.encoding = FALLBACK_ENCODING
+                    self.restarted.emit()
+                    f.seek(0)
+                    if not self._read(f, f.read(self.CHUNK_SIZE), total):
+                        return
+        except OSError as e:
+            if not self._cancelled:
+                self.failed.emit(str(e))
+            return
+        if not self._cancelled:
+            self.loaded.emit()
+
+    def _read(self, f, data, total):
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        done = 0
+        while data:
+            done += len(data)
+            if not self._emitChunk(decoder.decode(data)):
+                return False
+            self.progress.emit(int(done * 100 / total) if total else 100)
+            data = f.read(self.CHUNK_SIZE)
+        return self._emitChunk(decoder.decode(b'', final=True))
+
+    def _emitChunk(self, text):
+        if text:
+            self._slots.acquire()
+            if self._cancelled:
+                return False
+            self.chunkLoaded.emit(text)
+        return not self._cancelled
+
+def fileStamp(stat):
+    return [stat.st_size, stat.st_mtime_ns]
+
+class FileSaver(QThread):
+    saved = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, fileName, data, encoding, parent=None):
+        super().__init__(parent)
+        self.fileName = fileName
+        # The editor's UTF-8 bytes, copied on the GUI thread so editing can go on during the save
+        self.data = data
+        self.encoding = encoding
+        self.stamp = None
+
+    def run(self):
+        # Written next to the file and renamed over it, so a crash or a full disk never leaves
+        # a truncated file behind
+        target = os.path.realpath(self.fileName)
+        directory, name = os.path.split(target)
+        tempName = os.path.join(directory, f".{name}.{os.getpid()}.saving")
+        try:
+            with open(tempName, 'wb') as f:
+                view = memoryview(self.data)
+                if codecs.lookup(self.encoding).name == 'utf-8':
+                    for offset in range(0, len(view), self.CHUNK_SIZE):
+                        f.write(view[offset:offset + self.CHUNK_SIZE])
+                else:
+                    decoder = codecs.getincrementaldecoder('utf-8')()
+                    encoder = codecs.getincrementalencoder(self.encoding)()
+                    for offset in range(0, len(view), self.CHUNK_SIZE):
+                        f.write(encoder.encode(decoder.decode(view[offset:offset + self.CHUNK_SIZE])))
+                    f.write(encoder.encode(decoder.decode(b'', final=True), final=True))
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(target):
+                import shutil
+                shutil.copymode(target, tempName)
+            os.replace(tempName, target)
+            self.stamp = fileStamp(os.stat(target))
+            if hasattr(os, 'O_DIRECTORY'):
+                # Makes the rename itself durable
+                fd = os.open(directory or '.', os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        except (OSError, UnicodeError) as e:
+            try:
+                os.remove(tempName)
+            except OSError:
+                pass
+            if self.stamp is None:
+                self.failed.emit(str(e))
+                return
+        self.saved.emit()
+
+def diffFile(fileName, text):
+    # Runs in the process pool. Returns the hunks that turn text, the editor's UTF-8 bytes, into
+    # the file's current contents as (first line, end line, replacement, replacement line count),
+    # with line numbers into text.
+    with open(fileName, 'rb') as f:
+        stamp = fileStamp(os.fstat(f.fileno()))
+        data = f.read()
+    # Decoded the way FileLoader would read it
+    sample = data[:FileLoader.CHUNK_SIZE]
+    encoding = detectEncoding(sample)
+    try:
+        new = data.decode(encoding)
+    except UnicodeDecodeError:
+        encoding = FALLBACK_ENCODING
+        new = data.decode(encoding)
+    new = new.encode('utf-8').splitlines(keepends=True)
+    old = text.splitlines(keepends=True)
+    hunks = [(i1, i2, b''.join(new[j1:j2]), j2 - j1) for tag, i1, i2, j1, j2 in diffLines(old, new)]
+    return {'stamp': stamp, 'encoding': encoding, 'windowsEol': b'\r\n' in sample,
+            'lines': len(old), 'hunks': hunks}
+
+def diffLines(old, new):
+    # The opcodes of difflib that are not 'equal'. Most changes touch a small part of the file,
+    # so the common ends are skipped before diffing.
+    import difflib
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[len(old) - 1 - end] == new[len(new) - 1 - end]:
+        end += 1
+    matcher = difflib.SequenceMatcher(None, old[start:len(old) - end], new[start:len(new) - end])
+    return [(tag, start + i1, start + i2, start + j1, start + j2)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+GIT_ADDED, GIT_MODIFIED, GIT_DELETED = range(3)
+GIT_MARKER_MASK = (1 << GIT_ADDED) | (1 << GIT_MODIFIED) | (1 << GIT_DELETED)
+
+class GitDiffer(QThread):
+    # Diffs a buffer, the editor's UTF-8 bytes, against the file at git HEAD. The result maps
+    # lines of the buffer to their gutter marker.
+    def __init__(self, head, text, encoding, parent=None):
+        super().__init__(parent)
+        self.head = head
+        self.text = text
+        self.encoding = encoding
+        self.markers = None
+
+    def run(self):
+        old = self.head.decode(self.encoding, errors='replace').encode('utf-8').splitlines()
+        new = self.text.splitlines()
+        self.text = None
+        markers = {}
+        for tag, i1, i2, j1, j2 in diffLines(old, new):
+            if tag == 'delete':
+                # Shown on the line that follows the removed ones
+                markers.setdefault(min(j1, max(len(new) - 1, 0)), GIT_DELETED)
+            else:
+                marker = GIT_ADDED if tag == 'insert' else GIT_MODIFIED
+                markers.update(dict.fromkeys(range(j1, j2), marker))
+        self.markers = markers
+
+class PoolJob(QThread):
+    # Runs one function in the process pool and keeps its result for the finished signal
+    def __init__(self, function, args, parent=None):
+        super().__init__(parent)
+        self.function = function
+        self.args = args
+        self.result = None
+        self.error = None
+        self.brokenPool = False
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        import concurrent.futures
+        future = None
+        try:
+            # Creating the pool imports multiprocessing, which the first job keeps off the GUI thread
+            future = processPool().submit(self.function, *self.args)
+            self.args = None
+            while not self._cancelled:
+                try:
+                    self.result = future.result(timeout=0.1)
+                    return
+                except concurrent.futures.TimeoutError:
+                    pass
+        except concurrent.futures.BrokenExecutor as e:
+            self.error = str(e) or type(e).__name__
+            self.brokenPool = True
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            if future is not None:
+                future.cancel()
+
+class FileWatcher(QObject):
+    # Watches the files of open buffers. Saving through a temporary file and a rename, as
+    # editors and formatters do, replaces the watched file and Qt stops watching it, so the
+    # directories are watched too and files are added back once they reappear.
+    changed = pyqtSignal(str)
+
+    DELAY = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._files = set()
+        self._pending = set()
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._onFileChanged)
+        self._watcher.directoryChanged.connect(self._onDirectoryChanged)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.DELAY)
+        self._timer.timeout.connect(self._emitPending)
+
+    def watch(self, fileName):
+        self._files.add(fileName)
+        self._addPaths(fileName)
+
+    def unwatch(self, fileName):
+        self._files.discard(fileName)
+        self._pending.discard(fileName)
+        directory = os.path.dirname(fileName)
+        paths = [path for path in (fileName, directory) if path in self._watcher.files() + self._watcher.directories()]
+        if directory in paths and any(os.path.dirname(other) == directory for other in self._files):
+            paths.remove(directory)
+        if paths:
+            self._watcher.removePaths(paths)
+
+    def _addPaths(self, fileName):
+        watched = self._watcher.files() + self._watcher.directories()
+        paths = [path for path in (fileName, os.path.dirname(fileName)) if path not in watched and os.path.exists(path)]
+        if paths:
+            self._watcher.addPaths(paths)
+
+    def _onFileChanged(self, path):
+        if path in self._files:
+            self._pending.add(path)
+            self._timer.start()
+
+    def _onDirectoryChanged(self, directory):
+        for fileName in self._files:
+            if os.path.dirname(fileName) == directory:
+                self._pending.add(fileName)
+                self._timer.start()
+
+    def _emitPending(self):
+        pending, self._pending = self._pending, set()
+        for fileName in sorted(pending):
+            if fileName in self._files:
+                self._addPaths(fileName)
+                self.changed.emit(fileName)
+
+LEXERS = (
+    ('python', QsciLexerPython, ('.py', '.pyw')),
+    ('java', QsciLexerJava, ('.java',)),
+    ('html', QsciLexerHTML, ('.html', '.htm')),
+    # The HTML lexer also highlights embedded PHP
+    ('php', QsciLexerHTML, ('.php',)),
+    ('javascript', QsciLexerJavaScript, ('.js', '.mjs', '.cjs')),
+    ('css', QsciLexerCSS, ('.css',)),
+    ('cpp', QsciLexerCPP, ('.cpp', '.cc', '.cxx', '.c', '.h', '.hpp')),
+    ('ruby', QsciLexerRuby, ('.rb',)),
+)
+SOURCE_EXTENSIONS = {ext for _, _, extensions in LEXERS for ext in extensions}
+# Identifiers offered for completion, shorter ones are quicker to type than to pick
+WORD_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]{2,}')
+
+def collectWords(fileName):
+    # Runs in the process pool
+    with open(fileName, 'rb') as f:
+        return sorted(set(WORD_PATTERN.findall(f.read().decode('utf-8', errors='replace'))))
+
+def sessionPath():
+    # SCRIPTBLISS_SESSION moves it, so that benchmarks and tests leave the user's session alone
+    return os.environ.get('SCRIPTBLISS_SESSION') or os.path.join(
+        QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation), 'scriptbliss', 'session.json')
+
+def apiCacheDir():
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation), 'scriptbliss', 'apis')
+
+class CompletionAPIs(QsciAbstractAPIs):
+    # Completion lists for a lexer. The language's API files come from QScintilla, preparing
+    # them takes a second or more, so the prepared data is cached on disk. Identifiers from the
+    # project and the open buffer are added by wordSource.
+    MAX_WORDS = 200
+
+    def __init__(self, lexer, language, wordSource):
+        super().__init__(lexer)
+        self.wordSource = wordSource
+        self.prepared = QsciAPIs(lexer)
+        # Creating the QsciAPIs made it the lexer's APIs
+        lexer.setAPIs(self)
+        self.cacheFile = None
+        self.load(lexer, language)
+
+    def apiFiles(self):
+        # Python's files come one per version, only the newest one up to the running interpreter is used
+        files = []
+        versions = {}
+        for path in self.prepared.installedAPIFiles():
+            match = re.match(r'Python-(\d+)\.(\d+)\.api$', os.path.basename(path))
+            if match is None:
+                files.append(path)
+            elif (int(match.group(1)), int(match.group(2))) <= sys.version_info[:2]:
+                versions[int(match.group(1)), int(match.group(2))] = path
+        if versions:
+            files.append(versions[max(versions)])
+        return files
+
+    def load(self, lexer, language):
+        import hashlib
+        files = self.apiFiles()
+        keywords = sorted({word for keywordSet in range(1, 10) for word in (lexer.keywords(keywordSet) or '').split()})
+        digest = hashlib.sha1(QSCINTILLA_VERSION_STR.encode() + b'\0' + ' '.join(keywords).encode())
+        for path in files:
+            st = os.stat(path)
+            digest.update(f'{path}\0{st.st_size}\0{st.st_mtime_ns}\0'.encode())
+        self.cacheFile = os.path.join(apiCacheDir(), f'{language}-{digest.hexdigest()[:16]}.prepared')
+        if self.prepared.isPrepared(self.cacheFile) and self.prepared.loadPrepared(self.cacheFile):
+            return
+        for path in files:
+            self.prepared.load(path)
+        for keyword in keywords:
+            self.prepared.add(keyword)
+        self.prepared.apiPreparationFinished.connect(self.savePrepared)
+        # Runs on a QScintilla thread
+        self.prepared.prepare()
+
+    def savePrepared(self):
+        os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+        self.prepared.savePrepared(self.cacheFile)
+
+    def updateAutoCompletionList(self, context, entries):
+        entries = self.prepared.updateAutoCompletionList(context, entries)
+        prefix = context[-1] if context else ''
+        if prefix:
+            # API entries look like "name (module)?1"
+            known = {entry.split(' ', 1)[0].split('?', 1)[0] for entry in entries}
+            entries += [word for word in self.wordSource(prefix, self.MAX_WORDS) if word not in known]
+        return entries
+
+    def autoCompletionSelected(self, selection):
+        self.prepared.autoCompletionSelected(selection)
+
+    def callTips(self, context, commas, style, shifts):
+        return self.prepared.callTips(context, commas, style, shifts)
+
+class LexerRegistry:
+    def __init__(self, font, wordSource=None):
+        self.font = font
+        self.wordSource = wordSource
+        self._languages = {}
+        self._extensions = {}
+        self._lexers = {}
+        self._apis = {}
+
+    def register(self, language, lexerClass, extensions):
+        self._languages[language] = lexerClass
+        self._lexers.pop(language, None)
+        for ext in extensions:
+            self._extensions[ext] = language
+
+    def languageFor(self, fileName):
+        return self._extensions.get(os.path.splitext(fileName)[1].lower())
+
+    def lexer(self, language):
+        lexer = self._lexers.get(language)
+        if lexer is None and language in self._languages:
+            lexer = self._languages[language]()
+            self.configure(lexer, language)
+            self._lexers[language] = lexer
+        return lexer
+
+    def lexerFor(self, fileName):
+        return self.lexer(self.languageFor(fileName))
+
+    def configure(self, lexer, language):
+        lexer.setDefaultFont(self.font)
+        if self.wordSource is not None:
+            self._apis[language] = CompletionAPIs(lexer, language, self.wordSource)
+
+class OutputConsole(QPlainTextEdit):
+    openFileRequested = pyqtSignal(str)
+
+    FLUSH_INTERVAL = 16
+
+    def __init__(self, maxLines=10000, spillToFile=False, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        # The document drops its oldest lines past this, which makes it the ring buffer
+        self.setMaximumBlockCount(maxLines)
+        self.maxLines = maxLines
+        self.spillToFile = spillToFile
+        self.spillFile = None
+        self._pending = deque()
+        self._pendingLines = 0
+        self._atLineStart = True
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._flushTimer = QTimer(self)
+        self._flushTimer.setSingleShot(True)
+        self._flushTimer.setInterval(self.FLUSH_INTERVAL)
+        self._flushTimer.timeout.connect(self.flush)
+
+    def feed(self, data):
+        # Raw process output, a multi-byte character may be split across two reads
+        if data:
+            profiler.count('console.bytes', len(data))
+            self.write(self._decoder.decode(data))
+
+    def write(self, text):
+        if not text:
+            return
+        if self.spillToFile:
+            if self.spillFile is None:
+                import tempfile
+                self.spillFile = tempfile.NamedTemporaryFile('w', encoding='utf-8', prefix='scriptbliss-output-',
+                                                             suffix='.log', delete=False)
+            self.spillFile.write(text)
+        self._pending.append(text)
+        self._pendingLines += text.count('\n')
+        self._atLineStart = text.endswith('\n')
+        if self._pendingLines > 2 * self.maxLines:
+            # Lines older than the ring buffer would be dropped right after being inserted
+            lines = ''.join(self._pending).split('\n')[-self.maxLines - 1:]
+            self._pending = deque(['\n'.join(lines)])
+            self._pendingLines = len(lines) - 1
+        if not self._flushTimer.isActive():
+            self._flushTimer.start()
+
+    def append(self, text):
+        self.write(('' if self._atLineStart else '\n') + text + '\n')
+
+    def flush(self):
+        if not self._pending:
+            return
+        started = time.perf_counter()
+        text = ''.join(self._pending)
+        replace = self._pendingLines >= self.maxLines
+        self._pending.clear()
+        self._pendingLines = 0
+        scrollBar = self.verticalScrollBar()
+        following = replace or scrollBar.value() == scrollBar.maximum()
+        if replace:
+            # Everything currently shown would be pushed out, which is slower than starting over
+            self.setPlainText('\n'.join(text.split('\n')[-self.maxLines - 1:]))
+        else:
+            cursor = QTextCursor(self.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+        if following:
+            scrollBar.setValue(scrollBar.maximum())
+        if self.spillFile is not None:
+            self.spillFile.flush()
+        # Under a flood of output, back off so that repainting never takes more than about a
+        # quarter of the GUI thread; the ring buffer keeps what is pending bounded meanwhile.
+        elapsed = int((time.perf_counter() - started) * 1000)
+        self._flushTimer.setInterval(max(self.FLUSH_INTERVAL, 4 * elapsed))
+
+    def clear(self):
+        self._flushTimer.stop()
+        self._pending.clear()
+        self._pendingLines = 0
+        self._atLineStart = True
+        self._decoder.reset()
+        if self.spillFile is not None:
+            self.spillFile.close()
+            os.remove(self.spillFile.name)
+            self.spillFile = None
+        super().clear()
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        if self.spillFile is not None:
+            menu.addSeparator()
+            openFull = menu.addAction("Open Full Output")
+            openFull.triggered.connect(lambda: self.openFileRequested.emit(self.spillFile.name))
+        menu.exec_(event.globalPos())
+
+class TerminalWidget(OutputConsole):
+    resized = pyqtSignal(int, int)
+    interruptRequested = pyqtSignal()
+    restartRequested = pyqtSignal()
+
+    # Escape sequences and control characters a plain text view cannot render
+    CONTROL = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-_]?'
+                         r'|[\x00-\x07\x0b\x0c\x0e-\x1f\x7f]')
+    EDITS = re.compile(r'([\b\r])')
+
+    def __init__(self, maxLines=5000, parent=None):
+        super().__init__(maxLines, parent=parent)
+        self._held = ''
+
+    def write(self, text):
+        text = self._held + text
+        # A carriage return may be the first half of a CRLF split across two reads
+        self._held = '\r' if text.endswith('\r') else ''
+        text = self.CONTROL.sub('', text[:-1] if self._held else text).replace('\r\n', '\n')
+        for piece in self.EDITS.split(text):
+            if piece == '\b':
+                self.flush()
+                cursor = QTextCursor(self.document())
+                cursor.movePosition(QTextCursor.End)
+                if not cursor.atBlockStart():
+                    cursor.deletePreviousChar()
+            elif piece == '\r':
+                self.flush()
+                cursor = QTextCursor(self.document())
+                cursor.movePosition(QTextCursor.End)
+                cursor.movePosition(QTextCursor.StartOfBlock, QTextCursor.KeepAnchor)
+                cursor.removeSelectedText()
+            elif piece:
+                super().write(piece)
+
+    def clear(self):
+        self._held = ''
+        super().clear()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        metrics = self.fontMetrics()
+        self.resized.emit(max(self.viewport().width() // max(metrics.horizontalAdvance(' '), 1), 1),
+                          max(self.viewport().height() // max(metrics.lineSpacing(), 1), 1))
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        menu.addSeparator()
+        menu.addAction("Interrupt (Ctrl+C)").triggered.connect(self.interruptRequested)
+        menu.addAction("Clear").triggered.connect(self.clear)
+        menu.addAction("Restart Shell").triggered.connect(self.restartRequested)
+        menu.exec_(event.globalPos())
+
+TERMINAL_KEYS = {
+    Qt.Key_Return: b'\r',
+    Qt.Key_Enter: b'\r',
+    Qt.Key_Backspace: b'\x7f',
+    Qt.Key_Tab: b'\t',
+    Qt.Key_Escape: b'\x1b',
+    Qt.Key_Up: b'\x1b[A',
+    Qt.Key_Down: b'\x1b[B',
+    Qt.Key_Right: b'\x1b[C',
+    Qt.Key_Left: b'\x1b[D',
+    Qt.Key_Home: b'\x1b[H',
+    Qt.Key_End: b'\x1b[F',
+    Qt.Key_Delete: b'\x1b[3~',
+}
+
+class TerminalSession(QObject):
+    output = pyqtSignal(bytes)
+    exited = pyqtSignal()
+
+    def __init__(self, cwd, parent=None):
+        super().__init__(parent)
+        self.cwd = cwd
+        # Without a pseudo-terminal (Windows) the shell runs on pipes and does not echo input
+        self.hasPty = pty is not None
+        self.size = (80, 24)
+        self.pid = None
+        self.fd = None
+        self.notifier = None
+        self.process = None
+
+    def isRunning(self):
+        if self.hasPty:
+            return self.fd is not None
+        return self.process is not None and self.process.state() != QProcess.NotRunning
+
+    def start(self):
+        if self.isRunning():
+            return
+        if not self.hasPty:
+            self.process = QProcess(self)
+            self.process.setProcessChannelMode(QProcess.MergedChannels)
+            self.process.setWorkingDirectory(self.cwd)
+            self.process.readyReadStandardOutput.connect(
+                lambda: self.output.emit(self.process.readAllStandardOutput().data()))
+            self.process.finished.connect(self.exited)
+            self.process.start(os.environ.get('COMSPEC', 'cmd.exe'), [])
+            return
+
+        shell = os.environ.get('SHELL') or '/bin/sh'
+        env = dict(os.environ, TERM='dumb', PAGER='cat', GIT_PAGER='cat')
+        pid, fd = pty.fork()
+        if pid == 0:
+            try:
+                os.chdir(self.cwd)
+                os.execvpe(shell, [shell, '-i'], env)
+            finally:
+                os._exit(127)
+        self.pid, self.fd = pid, fd
+        os.set_blocking(fd, False)
+        self.resize(*self.size)
+        self.notifier = QSocketNotifier(fd, QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self._read)
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO once the shell has exited and the slave side is closed
+            data = b''
+        if data:
+            self.output.emit(data)
+        else:
+            self.close()
+            self.exited.emit()
+
+    def write(self, data):
+        if not self.isRunning():
+            return
+        if not self.hasPty:
+            self.process.write(data)
+            return
+        while data:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                QThread.msleep(1)
+            except OSError:
+                return
+
+    def interrupt(self):
+        self.write(b'\x03')
+
+    def setCwd(self, cwd):
+        self.cwd = cwd
+        if not self.hasPty or self.fd is None:
+            # Applies from the next start; a shell on pipes cannot tell whether a command is running
+            return
+        try:
+            idle = os.tcgetpgrp(self.fd) == self.pid
+        except OSError:
+            return
+        # A shell waiting at its prompt follows, Ctrl-U drops whatever was typed there.
+        # One running a command is left where it is.
+        if idle:
+            import shlex
+            self.write(b'\x15cd -- ' + shlex.quote(cwd).encode() + b'\n')
+
+    def resize(self, cols, rows):
+        self.size = (cols, rows)
+        if self.hasPty and self.fd is not None:
+            fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+    def close(self):
+        if not self.hasPty:
+            if self.process is not None:
+                stopProcess(self.process)
+                self.process = None
+            return
+        if self.fd is None:
+            return
+        self.notifier.setEnabled(False)
+        self.notifier.deleteLater()
+        self.notifier = None
+        os.close(self.fd)
+        self.fd = None
+        try:
+            os.killpg(self.pid, signal.SIGHUP)
+        except OSError:
+            pass
+        try:
+            if os.waitpid(self.pid, os.WNOHANG) == (0, 0):
+                QTimer.singleShot(1000, lambda pid=self.pid: self._reap(pid))
+        except ChildProcessError:
+            pass
+        self.pid = None
+
+    def _reap(self, pid):
+        try:
+            if os.waitpid(pid, os.WNOHANG) == (0, 0):
+                os.killpg(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        except OSError:
+            pass
+
+    def restart(self):
+        self.close()
+        self.start()
+
+# Runs the program as its child and reports what os.wait4() says about it on its own stderr. The
+# program's stderr is joined to its stdout, and both lead a new process group so that stopping
+# a run also reaches anything the program started.
+RUN_WRAPPER = r'''
+import json, os, signal, sys, time
+os.setpgid(0, 0)
+for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+    # These are sent to the whole group, the program decides what to do about them
+    signal.signal(signum, lambda signum, frame: None)
+start = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    os.dup2(1, 2)
+    # Python ignores these, the program would inherit that through exec
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+    try:
+        os.execvp(sys.argv[1], sys.argv[1:])
+    except OSError as e:
+        os.write(1, f"Failed to start {sys.argv[1]}: {e.strerror}. Is it installed and on the PATH?\n".encode())
+        os._exit(127)
+_, status, usage = os.wait4(pid, 0)
+wall = time.perf_counter() - start
+signalled = os.WIFSIGNALED(status)
+os.write(2, json.dumps({
+    'wall': wall, 'cpu': usage.ru_utime + usage.ru_stime,
+    'maxRss': usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024),
+    'exitCode': None if signalled else os.WEXITSTATUS(status),
+    'signal': os.WTERMSIG(status) if signalled else None}).encode())
+os._exit(128 + os.WTERMSIG(status) if signalled else os.WEXITSTATUS(status))
+'''
+
+def readRunReport(report):
+    # The stats RUN_WRAPPER, or the warm runner, writes on stderr. None when there was no wrapper or it
+    # was killed before it could report, the caller then only has the exit status to go by.
+    try:
+        stats = json.loads(report)
+    except (TypeError, ValueError):
+        return None
+    return stats if isinstance(stats, dict) else None
+
+class Run(QObject):
+    changed = pyqtSignal()
+    finished = pyqtSignal()
+
+    STOP_TIMEOUT = 2000
+
+    def __init__(self, label, program, arguments, console, parent=None):
+        super().__init__(parent)
+        self.label = label
+        self.program = program
+        self.arguments = list(arguments)
+        self.console = console
+        self.restartable = True
+        self.warmRunner = None
+        self.process = None
+        self.status = ''
+        self.exitCode = None
+        self.stats = {}
+        self._startTime = None
+        self._restartPending = False
+
+    def isRunning(self):
+        return self.process is not None
+
+    def start(self):
+        command = self.warmRunner.command(self.arguments) if self.warmRunner is not None else None
+        self.console.clear()
+        self.console.append(f"$ {' '.join([self.program] + self.arguments)}{'  [warm]' if command else ''}")
+        self.exitCode = None
+        self.stats = {}
+        process = QProcess(self)
+        if command is not None:
+            # Reports the same way as the wrapper
+            program, arguments = command
+        elif hasattr(os, 'wait4'):
+            program, arguments = sys.executable, ['-I', '-S', '-c', RUN_WRAPPER, self.program] + self.arguments
+        else:
+            process.setProcessChannelMode(QProcess.MergedChannels)
+            program, arguments = self.program, self.arguments
+        process.readyReadStandardOutput.connect(lambda: self.console.feed(process.readAllStandardOutput().data()))
+        process.finished.connect(lambda exitCode, exitStatus: self._onFinished(process, exitCode, exitStatus))
+        process.errorOccurred.connect(lambda error: self._onError(process, error))
+        self.process = process
+        self.status = 'running'
+        self._startTime = time.perf_counter()
+        process.start(program, arguments)
+        profiler.processStarted(process, self.program, self.arguments)
+        self.changed.emit()
+
+    def _onFinished(self, process, exitCode, exitStatus):
+        if process is not self.process:
+            return
+        self.console.feed(process.readAllStandardOutput().data())
+        report = process.readAllStandardError().data()
+        self.stats = {'wall': time.perf_counter() - self._startTime}
+        stats = readRunReport(report)
+        if stats is None:
+            self.console.feed(report)
+            stats = {'exitCode': exitCode if exitStatus == QProcess.NormalExit else None}
+        self.stats.update(stats)
+        self.exitCode = self.stats.get('exitCode')
+        if self.stats.get('signal'):
+            try:
+                name = signal.Signals(self.stats['signal']).name
+            except ValueError:
+                name = str(self.stats['signal'])
+            self.status = f"killed by {name}"
+        elif self.exitCode is None:
+            self.status = 'killed'
+        else:
+            self.status = f"exit {self.exitCode}"
+        self.console.append(f"[{self.status} after {self.stats['wall']:.2f} s]")
+        self._end(process)
+
+    def _onError(self, process, error):
+        if error != QProcess.FailedToStart or process is not self.process:
+            return
+        self.console.append(f"Failed to start {process.program()}. Is it installed and on the PATH?")
+        self.status = 'failed to start'
+        self._end(process)
+
+    def _end(self, process):
+        self.process = None
+        process.deleteLater()
+        self.finished.emit()
+        self.changed.emit()
+        if self._restartPending:
+            self._restartPending = False
+            self.start()
+
+    def sendSignal(self, signum):
+        pid = self.process.processId()
+        if not hasattr(os, 'wait4') or not pid:
+            self.process.kill()
+            return
+        try:
+            os.killpg(pid, signum)
+        except ProcessLookupError:
+            # The wrapper has not made its process group yet
+            os.kill(pid, signum)
+
+    def interrupt(self):
+        if self.process is not None:
+            self.sendSignal(signal.SIGINT)
+
+    def stop(self):
+        process = self.process
+        if process is None:
+            return
+        if not hasattr(os, 'wait4'):
+            process.kill()
+            return
+        self.sendSignal(signal.SIGTERM)
+        QTimer.singleShot(self.STOP_TIMEOUT,
+                          lambda: process is self.process and self.sendSignal(signal.SIGKILL))
+
+    def restart(self):
+        if self.process is None:
+            self.start()
+        else:
+            self._restartPending = True
+            self.stop()
+
+    def kill(self):
+        process = self.process
+        if process is None:
+            return
+        stopProcess(process, lambda: self.sendSignal(getattr(signal, 'SIGKILL', signal.SIGTERM)))
+        self.process = None
+
+class RunPanel(QWidget):
+    # The Output tab: general messages plus one output pane per run
+    MAX_FINISHED = 20
+
+    def __init__(self, messages, parent=None):
+        super().__init__(parent)
+        self.runs = []
+        self.list = QTreeWidget()
+        self.list.setHeaderLabels(["Run", "Status", "Wall", "CPU", "Peak RSS"])
+        self.list.setRootIsDecorated(False)
+        self.list.setUniformRowHeights(True)
+        self.list.setColumnWidth(0, 160)
+        self.messagesItem = QTreeWidgetItem(self.list, ["Messages"])
+        self.list.currentItemChanged.connect(self.onCurrentChanged)
+        self.stack = QStackedWidget()
+        self.stack.addWidget(messages)
+
+        self.stopButton = QPushButton("Stop")
+        self.stopButton.clicked.connect(lambda: self.currentRun().stop())
+        self.restartButton = QPushButton("Restart")
+        self.restartButton.clicked.connect(lambda: self.currentRun().restart())
+        self.removeButton = QPushButton("Remove")
+        self.removeButton.clicked.connect(lambda: self.removeRun(self.currentRun()))
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.stopButton)
+        buttons.addWidget(self.restartButton)
+        buttons.addWidget(self.removeButton)
+        runs = QWidget()
+        runsLayout = QVBoxLayout(runs)
+        runsLayout.setContentsMargins(0, 0, 0, 0)
+        runsLayout.addWidget(self.list)
+        runsLayout.addLayout(buttons)
+
+        splitter = QSplitter(Qt.Horizontal)
+        splitter.addWidget(runs)
+        splitter.addWidget(self.stack)
+        splitter.setSizes([420, 600])
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(splitter)
+        self.list.setCurrentItem(self.messagesItem)
+
+    def addRun(self, run):
+        item = QTreeWidgetItem([run.label])
+        item.setData(0, Qt.UserRole, run)
+        # Newest first, under Messages
+        self.list.insertTopLevelItem(1, item)
+        self.stack.addWidget(run.console)
+        run.changed.connect(lambda: self.updateItem(run))
+        self.runs.append(run)
+        self.list.setCurrentItem(item)
+        self.prune()
+
+    def itemFor(self, run):
+        for i in range(1, self.list.topLevelItemCount()):
+            item = self.list.topLevelItem(i)
+            if item.data(0, Qt.UserRole) is run:
+                return item
+        return None
+
+    def updateItem(self, run):
+        item = self.itemFor(run)
+        if item is None:
+            return
+        stats = run.stats
+        item.setText(1, run.status)
+        item.setText(2, f"{stats['wall']:.2f} s" if 'wall' in stats else '')
+        item.setText(3, f"{stats['cpu']:.2f} s" if 'cpu' in stats else '')
+        item.setText(4, f"{stats['maxRss'] / (1024 * 1024):.1f} MB" if 'maxRss' in stats else '')
+        if run.isRunning():
+            color = QColor("#e2c08d")
+        else:
+            color = QColor("#73c991") if run.exitCode == 0 else QColor("#e06c75")
+        item.setForeground(1, color)
+        if item is self.list.currentItem():
+            self.updateButtons()
+
+    def currentRun(self):
+        item = self.list.currentItem()
+        return item.data(0, Qt.UserRole) if item is not None else None
+
+    def activeRun(self):
+        # Standard input and interrupts go to the selected run, or else the newest one still running
+        run = self.currentRun()
+        if run is not None and run.isRunning():
+            return run
+        return next((run for run in reversed(self.runs) if run.isRunning()), None)
+
+    def onCurrentChanged(self, item):
+        run = self.currentRun()
+        self.stack.setCurrentWidget(run.console if run is not None else self.stack.widget(0))
+        self.updateButtons()
+
+    def updateButtons(self):
+        run = self.currentRun()
+        self.stopButton.setEnabled(run is not None and run.isRunning())
+        self.restartButton.setEnabled(run is not None and run.restartable)
+        self.removeButton.setEnabled(run is not None and not run.isRunning())
+
+    def showMessages(self):
+        self.list.setCurrentItem(self.messagesItem)
+
+    def removeRun(self, run):
+        item = self.itemFor(run)
+        self.list.takeTopLevelItem(self.list.indexOfTopLevelItem(item))
+        self.runs.remove(run)
+        self.stack.removeWidget(run.console)
+        # Also deletes a spill file
+        run.console.clear()
+        run.console.deleteLater()
+        run.deleteLater()
+
+    def prune(self):
+        finished = [run for run in self.runs if not run.isRunning()]
+        for run in finished[:max(0, len(finished) - self.MAX_FINISHED)]:
+            self.removeRun(run)
+
+    def close(self):
+        for run in self.runs:
+            run.kill()
+
+WARM_MODULES = ['numpy', 'pandas']
+
+class WarmRunner(QObject):
+    # Optional fast path for Python runs: a server with the configured modules imported forks
+    # every run instead of starting a new interpreter, see warmserver.py
+    message = pyqtSignal(str)
+
+    SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warmserver.py')
+
+    def __init__(self, interpreter, modules, parent=None):
+        super().__init__(parent)
+        self.interpreter = interpreter
+        self.modules = list(modules)
+        self.ready = False
+        self.process = None
+        self.socketDir = None
+        self.socketPath = None
+
+    @staticmethod
+    def supported():
+        return hasattr(os, 'fork')
+
+    def start(self):
+        import tempfile
+        self.socketDir = tempfile.mkdtemp(prefix='scriptbliss-warm-')
+        self.socketPath = os.path.join(self.socketDir, 'server.sock')
+        process = QProcess(self)
+        process.readyReadStandardOutput.connect(lambda: self._onOutput(process))
+        process.readyReadStandardError.connect(
+            lambda: self.message.emit(process.readAllStandardError().data().decode(errors='replace')))
+        process.finished.connect(lambda exitCode, exitStatus: self._onFinished(process))
+        process.errorOccurred.connect(
+            lambda error: error == QProcess.FailedToStart and self._onFinished(process))
+        self.process = process
+        process.start(self.interpreter, [self.SCRIPT, 'serve', self.socketPath] + self.modules)
+
+    def _onOutput(self, process):
+        line = process.readAllStandardOutput().data().decode(errors='replace')
+        if line.startswith('ready') and process is self.process:
+            self.ready = True
+            imported = line[len('ready'):].strip().replace(',', ', ')
+            self.message.emit(f"Warm Python runner ready ({imported or 'no modules'} imported)\n")
+
+    def _onFinished(self, process):
+        if process is not self.process:
+            return
+        self.ready = False
+        self.process = None
+        process.deleteLater()
+        self.message.emit("Warm Python runner stopped, Python runs start a new interpreter\n")
+
+    def restart(self):
+        self.close()
+        self.start()
+
+    def command(self, arguments):
+        # Until the server is ready runs take the cold path
+        if not self.ready:
+            return None
+        return self.interpreter, ['-I', '-S', self.SCRIPT, 'run', self.socketPath] + list(arguments)
+
+    def close(self):
+        import shutil
+        process, self.process = self.process, None
+        self.ready = False
+        if process is not None:
+            stopProcess(process)
+        if self.socketDir is not None:
+            shutil.rmtree(self.socketDir, ignore_errors=True)
+            self.socketDir = None
+
+PROJECT_CACHE_DIR = '.scriptbliss'
+
+def projectCacheDir(projectPath, *parts):
+    return os.path.join(projectPath, PROJECT_CACHE_DIR, *parts)
+
+class CompiledLanguage:
+    # Subclasses provide compileCommand(source, outDir) and runCommand(source, outDir), each returning
+    # a program and its arguments
+    def __init__(self, compiler, flags=()):
+        self.compiler = compiler
+        self.flags = list(flags)
+
+    def identity(self):
+        import shutil
+        compilerPath = shutil.which(self.compiler) or self.compiler
+        try:
+            compilerStamp = str(os.stat(compilerPath).st_mtime_ns)
+        except OSError:
+            compilerStamp = ''
+        return [self.compiler, compilerPath, compilerStamp] + self.flags
+
+    def inputs(self, source):
+        return [source]
+
+class CppLanguage(CompiledLanguage):
+    INCLUDE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*"([^"]+)"', re.M)
+
+    def inputs(self, source):
+        # Local headers are part of the build, so changing one must miss the cache
+        found = set()
+        pending = [os.path.abspath(source)]
+        while pending:
+            path = pending.pop()
+            if path in found or not os.path.isfile(path):
+                continue
+            found.add(path)
+            with open(path, 'rb') as f:
+                for match in self.INCLUDE.finditer(f.read()):
+                    include = match.group(1).decode(errors='replace')
+                    pending.append(os.path.normpath(os.path.join(os.path.dirname(path), include)))
+        return sorted(found)
+
+    def executable(self, source, outDir):
+        name = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(outDir, name + ('.exe' if os.name == 'nt' else ''))
+
+    def compileCommand(self, source, outDir):
+        return self.compiler, self.flags + [source, '-o', self.executable(source, outDir)]
+
+    def runCommand(self, source, outDir):
+        return self.executable(source, outDir), []
+
+class JavaLanguage(CompiledLanguage):
+    def inputs(self, source):
+        # javac picks up the other classes of the directory through -sourcepath
+        sourceDir = os.path.dirname(os.path.abspath(source))
+        return sorted(os.path.join(sourceDir, name) for name in os.listdir(sourceDir) if name.endswith('.java'))
+
+    def compileCommand(self, source, outDir):
+        return self.compiler, self.flags + ['-d', outDir, '-sourcepath', os.path.dirname(os.path.abspath(source)), source]
+
+    def runCommand(self, source, outDir):
+        return 'java', ['-cp', outDir, os.path.splitext(os.path.basename(source))[0]]
+
+INTERPRETERS = {
+    '.py': 'python',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.js': 'node',
+}
+
+COMPILERS = {
+    '.cpp': CppLanguage('g++'),
+    '.java': JavaLanguage('javac'),
+}
+
+class BuildCache:
+    MAX_ENTRIES = 50
+
+    def __init__(self, root):
+        self.root = root
+
+    def key(self, language, source):
+        import hashlib
+        digest = hashlib.sha256()
+        for part in language.identity():
+            digest.update(part.encode() + b'\0')
+        sourceDir = os.path.dirname(os.path.abspath(source))
+        for path in language.inputs(source):
+            digest.update(os.path.relpath(path, sourceDir).encode() + b'\0')
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def contains(self, key):
+        if os.path.isdir(self.path(key)):
+            os.utime(self.path(key))
+            return True
+        return False
+
+    def reserve(self, key):
+        import tempfile
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix=key[:16] + '.', suffix='.tmp', dir=self.root)
+
+    def commit(self, buildDir, key):
+        import shutil
+        try:
+            os.rename(buildDir, self.path(key))
+        except OSError:
+            # Another build of the same sources got there first
+            shutil.rmtree(buildDir, ignore_errors=True)
+        self.prune()
+
+    def discard(self, buildDir):
+        import shutil
+        shutil.rmtree(buildDir, ignore_errors=True)
+
+    def prune(self):
+        import shutil
+        entries = [entry for entry in os.scandir(self.root) if entry.is_dir() and not entry.name.endswith('.tmp')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[self.MAX_ENTRIES:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+class RunPlan:
+    # What Run Code does with a file: compiled languages are built into the build cache first,
+    # interpreted ones and cached builds run straight away
+    def __init__(self, source, cache):
+        ext = os.path.splitext(source)[1]
+        self.source = source
+        self.interpreter = INTERPRETERS.get(ext)
+        self.language = COMPILERS.get(ext)
+        self.cache = cache
+        self.key = None
+        self.buildDir = None
+
+    @staticmethod
+    def supports(source):
+        ext = os.path.splitext(source)[1]
+        return ext in INTERPRETERS or ext in COMPILERS
+
+    def buildCommand(self):
+        # None when there is nothing to build. Raises OSError when the sources cannot be read.
+        if self.language is None:
+            return None
+        self.key = self.cache.key(self.language, self.source)
+        if self.cache.contains(self.key):
+            return None
+        self.buildDir = self.cache.reserve(self.key)
+        return self.language.compileCommand(self.source, self.buildDir)
+
+    def buildFinished(self, succeeded):
+        buildDir, self.buildDir = self.buildDir, None
+        if succeeded:
+            self.cache.commit(buildDir, self.key)
+        else:
+            self.cache.discard(buildDir)
+
+    def runCommand(self):
+        if self.language is None:
+            return self.interpreter, [self.source]
+        return self.language.runCommand(self.source, self.cache.path(self.key))
+
+class BatchRunner:
+    # Runs files the way Run Code does, without a display and a bounded number at a time.
+    # Every command gets the timeout and goes through RUN_WRAPPER for its resource usage.
+    MAX_OUTPUT = 1024 * 1024
+
+    def __init__(self, cache, jobs, timeout):
+        self.cache = cache
+        self.jobs = jobs
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._stopped = False
+
+    def run(self, scripts, progress=None):
+        import concurrent.futures
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(self.runScript, script) for script in scripts]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    result = future.result()
+                    results[result['script']] = result
+                    if progress is not None:
+                        progress(result)
+            except BaseException:
+                self.stop()
+                raise
+        return [results[script] for script in scripts]
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            processes = list(self._processes)
+        for process in processes:
+            self._kill(process)
+
+    def runScript(self, source):
+        result = {'script': source}
+        plan = RunPlan(source, self.cache)
+        try:
+            command = plan.buildCommand()
+        except OSError as e:
+            result.update(passed=False, exitCode=None, output=f"Failed to read sources: {e}\n")
+            return result
+        if command is not None:
+            result['build'] = build = self.runCommand(*command)
+            # Pruning the cache while another build commits races on its entries
+            with self._lock:
+                plan.buildFinished(build['exitCode'] == 0)
+            if build['exitCode'] != 0:
+                result.update(passed=False, exitCode=None, output='')
+                return result
+        result.update(self.runCommand(*plan.runCommand()))
+        result['passed'] = result['exitCode'] == 0
+        return result
+
+    def runCommand(self, program, arguments):
+        import subprocess
+        wrapped = hasattr(os, 'wait4')
+        command = ([sys.executable, '-I', '-S', '-c', RUN_WRAPPER, program] if wrapped else [program]) + list(arguments)
+        start = time.perf_counter()
+        with self._lock:
+            if self._stopped:
+                return {'command': [program] + list(arguments), 'exitCode': None, 'output': ''}
+            try:
+                process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE if wrapped else subprocess.STDOUT)
+            except OSError as e:
+                return {'command': [program] + list(arguments), 'exitCode': None,
+                        'output': f"Failed to start {program}: {e.strerror}\n"}
+            self._processes.add(process)
+        timedOut = False
+        try:
+            output, report = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            timedOut = True
+            self._kill(process)
+            output, report = process.communicate()
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+        stats = {'command': [program] + list(arguments), 'wall': time.perf_counter() - start, 'timedOut': timedOut}
+        report = readRunReport(report)
+        if report is None:
+            report = {'exitCode': process.returncode if process.returncode >= 0 else None,
+                      'signal': -process.returncode if process.returncode < 0 else None}
+        stats.update(report)
+        if timedOut:
+            stats['exitCode'] = None
+        if len(output) > self.MAX_OUTPUT:
+            # The end of the output is where the errors are
+            output = b'[output truncated]\n' + output[-self.MAX_OUTPUT:]
+        stats['output'] = output.decode('utf-8', errors='replace')
+        return stats
+
+    def _kill(self, process):
+        if hasattr(os, 'killpg'):
+            # The wrapper leads the program's process group
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        try:
+            process.kill()
+        except OSError:
+            pass
+
+def batchScripts(patterns):
+    # Directories are searched for every file Run Code knows how to run
+    import glob
+    scripts = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirPath, dirNames, fileNames in os.walk(pattern):
+                dirNames[:] = sorted(name for name in dirNames if name not in DEFAULT_EXCLUDES and name != PROJECT_CACHE_DIR)
+                scripts += [os.path.join(dirPath, name) for name in sorted(fileNames) if RunPlan.supports(name)]
+        else:
+            scripts += sorted(path for path in glob.glob(pattern, recursive=True)
+                              if os.path.isfile(path) and RunPlan.supports(path))
+    return list(dict.fromkeys(scripts))
+
+DEFAULT_EXCLUDES = ('.git', 'node_modules', '__pycache__')
+
+class IgnoreRules:
+    def __init__(self, lines=()):
+        self.rules = []
+        for line in lines:
+            self.add(line)
+
+    @classmethod
+    def fromFile(cls, path):
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return cls(f.read().splitlines())
+        except OSError:
+            return cls()
+
+    def add(self, line):
+        line = self.stripTrailingSpace(line)
+        if not line or line.startswith('#'):
+            return
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+        dirOnly = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return
+        # Patterns without an inner slash match a name at any depth
+        anchored = '/' in line
+        pattern = self.translate(line.lstrip('/'))
+        if not anchored:
+            pattern = '(?:.*/)?' + pattern
+        self.rules.append((re.compile(pattern + '(?:/.*)?$', re.S), negate, dirOnly))
+
+    @staticmethod
+    def stripTrailingSpace(line):
+        # Trailing whitespace is dropped, except a space escaped with a backslash ("foo\ ")
+        end = len(line)
+        while end and line[end - 1].isspace():
+            before = line[:end - 1]
+            if line[end - 1] == ' ' and (len(before) - len(before.rstrip('\\'))) % 2:
+                break
+            end -= 1
+        return line[:end]
+
+    @staticmethod
+    def translate(glob):
+        parts = []
+        i = 0
+        while i < len(glob):
+            char = glob[i]
+            if char == '\\' and i + 1 < len(glob):
+                # An escaped character matches itself
+                parts.append(re.escape(glob[i + 1]))
+                i += 2
+                continue
+            if glob.startswith('**/', i):
+                parts.append('(?:.*/)?')
+                i += 3
+                continue
+            if glob.startswith('**', i):
+                parts.append('.*')
+                i += 2
+                continue
+            if char == '*':
+                parts.append('[^/]*')
+            elif char == '?':
+                parts.append('[^/]')
+            elif char == '[' and ']' in glob[i + 1:]:
+                end = glob.index(']', i + 1)
+                body = glob[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+            else:
+                parts.append(re.escape(char))
+            i += 1
+        return ''.join(parts)
+
+    def match(self, relPath, isDir):
+        # None when no rule applies, otherwise whether the last matching rule ignores the path
+        result = None
+        for regex, negate, dirOnly in self.rules:
+            target = relPath
+            if dirOnly and not isDir:
+                # A directory rule reaches a file only through one of its parent directories
+                target = relPath.rpartition('/')[0]
+                if not target:
+                    continue
+            if regex.match(target):
+                result = not negate
+        return result
+
+class IgnoreMatcher:
+    # Excludes are plain names, or patterns in .gitignore syntax that apply below every directory
+    def __init__(self, excludes=DEFAULT_EXCLUDES):
+        self.excludes = {exclude for exclude in excludes if not re.search(r'[*?\[/!\\]', exclude)}
+        self.excludeRules = IgnoreRules(exclude for exclude in excludes if exclude not in self.excludes)
+        self._rules = {}
+
+    def load(self, relDir, gitignorePath):
+        self._rules[relDir] = IgnoreRules.fromFile(gitignorePath)
+
+    def loadParents(self, root, relDir):
+        # Loads the .gitignore files of relDir and the directories above it that are not loaded yet
+        parts = relDir.split('/') if relDir else []
+        for depth in range(len(parts) + 1):
+            rel = '/'.join(parts[:depth])
+            if rel not in self._rules:
+                self.load(rel, os.path.join(root, rel, '.gitignore'))
+
+    def ignored(self, relPath, isDir):
+        name = relPath.rpartition('/')[2]
+        # The IDE's own cache is left out whatever the excludes say, indexing its writes would never settle
+        if name == PROJECT_CACHE_DIR and isDir:
+            return True
+        if name in self.excludes or self.excludeRules.match(relPath, isDir):
+            return True
+        # Deeper .gitignore files take precedence over the ones above them
+        result = None
+        base = ''
+        parts = relPath.split('/')
+        for depth in range(len(parts)):
+            rules = self._rules.get(base)
+            if rules is not None:
+                match = rules.match('/'.join(parts[depth:]), isDir)
+                if match is not None:
+                    result = match
+            base = '/'.join(parts[:depth + 1])
+        return bool(result)
+
+class FileSearchData:
+    def __init__(self, paths):
+        self.paths = paths
+        self.pathCorpus = '\n'.join(paths).lower()
+        self.nameCorpus = '\n'.join(path.rpartition('/')[2] for path in paths).lower()
+        self.pathStarts = self._lineStarts(len(path) for path in paths)
+        self.nameStarts = self._lineStarts(len(path.rpartition('/')[2]) for path in paths)
+
+    @staticmethod
+    def _lineStarts(lengths):
+        starts = [0]
+        for length in lengths:
+            starts.append(starts[-1] + length + 1)
+        starts.pop()
+        return starts
+
+def fuzzyPattern(query):
+    # 'abc' becomes 'a[^\nb]*b[^\nc]*c', which cannot backtrack
+    parts = [re.escape(query[0])]
+    for char in query[1:]:
+        parts.append('[^\n%s]*%s' % (re.escape(char) if char not in '^]' else '\\' + char, re.escape(char)))
+    return re.compile(''.join(parts))
+
+class FileSearch:
+    # One query's scan of the corpora, which ProjectIndex.search resumes across calls
+    SLICE = 32768
+
+    def __init__(self, query, source, data):
+        self.query = query
+        self.source = source
+        self.data = data
+        pattern = fuzzyPattern(query)
+        self.phases = ((data.nameCorpus, data.nameStarts, re.compile(re.escape(query))),
+                       (data.nameCorpus, data.nameStarts, pattern),
+                       (data.pathCorpus, data.pathStarts, pattern))
+        self.phase = 2 if '/' in query else 0
+        self.pos = 0
+        self.hits = {}
+        self.done = False
+        # Whether hits holds every match, so a longer query can search only those paths
+        self.complete = True
+
+    def run(self, budget, limit, maxHits):
+        deadline = time.perf_counter() + budget
+        hits = self.hits
+        while not self.done:
+            corpus, starts, regex = self.phases[self.phase]
+            # Matches never span lines, so a line-aligned slice finds the same ones
+            end = corpus.find('\n', self.pos + self.SLICE)
+            if end < 0:
+                end = len(corpus)
+            for match in regex.finditer(corpus, self.pos, end):
+                line = bisect.bisect_right(starts, match.start()) - 1
+                if line in hits:
+                    continue
+                # Name matches first, then tighter, earlier and shorter ones
+                hits[line] = (self.phase, match.end() - match.start(), match.start() - starts[line],
+                              len(self.data.paths[line]))
+                if len(hits) >= maxHits:
+                    break
+            self.pos = end + 1
+            if len(hits) >= maxHits:
+                self.done = True
+                self.complete = False
+            elif self.pos > len(corpus):
+                self.phase += 1
+                self.pos = 0
+                if self.phase == len(self.phases):
+                    self.done = True
+                elif len(hits) >= limit:
+                    # Later phases only rank below what is already enough to fill the list
+                    self.done = True
+                    self.complete = False
+            if not self.done and time.perf_counter() > deadline:
+                if len(hits) >= limit:
+                    # The list is full; scanning on would only reorder it and stall typing
+                    self.done = True
+                    self.complete = False
+                break
+
+    def paths(self, limit=None):
+        return [self.data.paths[line] for line in sorted(self.hits, key=self.hits.get)[:limit]]
+
+class ProjectIndexer(QThread):
+    indexed = pyqtSignal(object, object)
+
+    def __init__(self, root, dirs, snapshotPath, excludes=DEFAULT_EXCLUDES, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.dirs = dirs
+        self.snapshotPath = snapshotPath
+        self.excludes = excludes
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        dirs = self.dirs
+        if dirs is None:
+            dirs = self.loadSnapshot()
+            if dirs:
+                # A warm start serves the snapshot while it is checked against the disk
+                self.indexed.emit(dirs, FileSearchData(self.paths(dirs)))
+        newDirs = self.walk(dirs or {})
+        if newDirs is None or newDirs == dirs:
+            return
+        self.indexed.emit(newDirs, FileSearchData(self.paths(newDirs)))
+        self.saveSnapshot(newDirs)
+
+    def walk(self, previous):
+        # Directories whose mtime and .gitignore are unchanged are not listed again
+        matcher = IgnoreMatcher(self.excludes)
+        dirs = {}
+        stack = [('', False)]
+        while stack:
+            if self._cancelled:
+                return None
+            rel, force = stack.pop()
+            path = os.path.join(self.root, rel)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            gitignore = os.path.join(path, '.gitignore')
+            try:
+                ignoreMtime = os.stat(gitignore).st_mtime_ns
+                matcher.load(rel, gitignore)
+            except OSError:
+                ignoreMtime = 0
+            old = previous.get(rel)
+            if old is not None and old[1] != ignoreMtime:
+                force = True
+            if old is not None and not force and old[0] == mtime:
+                files, subdirs = old[2], old[3]
+            else:
+                files, subdirs = [], []
+                try:
+                    entries = list(os.scandir(path))
+                except OSError:
+                    entries = []
+                for entry in entries:
+                    try:
+                        isDir = entry.is_dir(follow_symlinks=False)
+                        if not isDir and not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if not matcher.ignored(f'{rel}/{entry.name}' if rel else entry.name, isDir):
+                        (subdirs if isDir else files).append(entry.name)
+                files.sort()
+                subdirs.sort()
+            dirs[rel] = (mtime, ignoreMtime, files, subdirs)
+            for name in reversed(subdirs):
+                stack.append((f'{rel}/{name}' if rel else name, force))
+        return dirs
+
+    @staticmethod
+    def paths(dirs):
+        paths = []
+        for rel, (_, _, files, _) in sorted(dirs.items()):
+            prefix = rel + '/' if rel else ''
+            paths.extend(prefix + name for name in files)
+        return paths
+
+    def loadSnapshot(self):
+        try:
+            with open(self.snapshotPath, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (snapshot.get('version') != 1 or snapshot.get('root') != self.root or
+                snapshot.get('excludes', list(DEFAULT_EXCLUDES)) != list(self.excludes)):
+            return None
+        return {rel: tuple(entry) for rel, entry in snapshot['dirs'].items()}
+
+    def saveSnapshot(self, dirs):
+        try:
+            os.makedirs(os.path.dirname(self.snapshotPath), exist_ok=True)
+            temp = self.snapshotPath + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'root': self.root, 'excludes': list(self.excludes), 'dirs': dirs}, f,
+                          separators=(',', ':'))
+            os.replace(temp, self.snapshotPath)
+        except OSError:
+            pass
+
+class ProjectIndex(QObject):
+    updated = pyqtSignal()
+
+    MAX_CANDIDATES = 1000
+    # Seconds one search call may scan before returning what it has found so far
+    SEARCH_BUDGET = 0.006
+    MAX_WATCHED_DIRS = 4000
+    REFRESH_DELAY = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.excludes = DEFAULT_EXCLUDES
+        self.dirs = None
+        self.searchData = FileSearchData([])
+        self._indexer = None
+        self._pending = False
+        self._lastSearch = None
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.scheduleRefresh)
+        self._watcher.fileChanged.connect(self.scheduleRefresh)
+        self._refreshTimer = QTimer(self)
+        self._refreshTimer.setSingleShot(True)
+        self._refreshTimer.setInterval(self.REFRESH_DELAY)
+        self._refreshTimer.timeout.connect(self.refresh)
+
+    def setRoot(self, root):
+        if self._indexer is not None:
+            self._indexer.cancel()
+            self._indexer = None
+        watched = self._watcher.directories() + self._watcher.files()
+        if watched:
+            self._watcher.removePaths(watched)
+        self.root = os.path.normpath(root)
+        self.dirs = None
+        self.searchData = FileSearchData([])
+        self._lastSearch = None
+        self.updated.emit()
+        self.refresh()
+
+    def setExcludes(self, excludes):
+        self.excludes = tuple(excludes)
+        if self.root is not None:
+            # Every directory is listed again
+            self.setRoot(self.root)
+
+    def files(self):
+        return self.searchData.paths
+
+    def close(self):
+        self._refreshTimer.stop()
+        self._pending = False
+        if self._indexer is not None:
+            self._indexer.cancel()
+            self._indexer.wait()
+            self._indexer = None
+
+    def scheduleRefresh(self, *args):
+        self._refreshTimer.start()
+
+    def refresh(self):
+        if self.root is None:
+            return
+        if self._indexer is not None:
+            self._pending = True
+            return
+        self._indexer = ProjectIndexer(self.root, self.dirs, projectCacheDir(self.root, 'file-index.json'),
+                                       self.excludes, self)
+        self._indexer.indexed.connect(self._onIndexed)
+        self._indexer.finished.connect(self._onIndexerFinished)
+        self._indexer.start()
+
+    def _onIndexed(self, dirs, searchData):
+        if self.sender() is not self._indexer:
+            return
+        self.dirs = dirs
+        self.searchData = searchData
+        self._lastSearch = None
+        watched = set(self._watcher.directories())
+        missing = [os.path.join(self.root, rel) for rel in dirs if os.path.join(self.root, rel) not in watched]
+        room = self.MAX_WATCHED_DIRS - len(watched)
+        if missing and room > 0:
+            self._watcher.addPaths(missing[:room])
+        gitignore = os.path.join(self.root, '.gitignore')
+        if os.path.exists(gitignore) and gitignore not in self._watcher.files():
+            self._watcher.addPath(gitignore)
+        self.updated.emit()
+
+    def _onIndexerFinished(self):
+        indexer = self.sender()
+        indexer.deleteLater()
+        if indexer is not self._indexer:
+            return
+        self._indexer = None
+        if self._pending:
+            self._pending = False
+            self.refresh()
+
+    def search(self, query, limit=50):
+        query = query.strip().lower().replace('\\', '/').replace(' ', '')
+        data = self.searchData
+        if not query:
+            return data.paths[:limit]
+        last = self._lastSearch
+        # The same query again carries on where the time budget cut it short
+        if last is None or last.source is not data or last.query != query:
+            # Typing narrows a query, so a complete earlier match set bounds the next one
+            if last is not None and last.source is data and query.startswith(last.query) and last.done \
+                    and last.complete:
+                data = FileSearchData(last.paths())
+            last = self._lastSearch = FileSearch(query, self.searchData, data)
+        last.run(self.SEARCH_BUDGET, limit, self.MAX_CANDIDATES)
+        return last.paths(limit)
+
+    def searching(self):
+        return self._lastSearch is not None and not self._lastSearch.done
+
+class QuickOpenDialog(QDialog):
+    def __init__(self, title, search, parent=None, searching=None):
+        super().__init__(parent)
+        # search(text) returns (label, tooltip, value) tuples; while searching() is true,
+        # calling it again with the same text finds more
+        self.search = search
+        self.searching = searching
+        self._resumeTimer = QTimer(self)
+        self._resumeTimer.setSingleShot(True)
+        self._resumeTimer.timeout.connect(self.resume)
+        self.value = None
+        self.setWindowTitle(title)
+        self.resize(640, 420)
+        self.input = QLineEdit()
+        self.results = QListWidget()
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.input)
+        layout.addWidget(self.results)
+        self.input.textChanged.connect(self.refresh)
+        self.input.returnPressed.connect(self.acceptCurrent)
+        self.input.installEventFilter(self)
+        self.results.itemActivated.connect(self.acceptCurrent)
+        self.refresh('')
+
+    def refresh(self, text):
+        self.results.clear()
+        for label, toolTip, value in self.search(text):
+            item = QListWidgetItem(label)
+            item.setToolTip(toolTip)
+            item.setData(Qt.UserRole, value)
+            self.results.addItem(item)
+        self.results.setCurrentRow(0)
+        if self.searching is not None and self.searching():
+            self._resumeTimer.start()
+
+    def resume(self):
+        row = self.results.currentRow()
+        self.refresh(self.input.text())
+        self.results.setCurrentRow(min(max(row, 0), self.results.count() - 1))
+
+    def eventFilter(self, watched, event):
+        if watched is self.input and event.type() == QEvent.KeyPress and event.key() in (Qt.Key_Up, Qt.Key_Down,
+                                                                                      Qt.Key_PageUp, Qt.Key_PageDown):
+            QApplication.sendEvent(self.results, event)
+            return True
+        return super().eventFilter(watched, event)
+
+    def acceptCurrent(self, *args):
+        item = self.results.currentItem()
+        if item is not None:
+            self.value = item.data(Qt.UserRole)
+            self.accept()
+
+_processPool = None
+# Worker threads create the pool as well as the GUI thread
+_processPoolLock = threading.Lock()
+
+def processPool():
+    # Shared by background jobs; spawned workers keep no Qt state from this process
+    global _processPool
+    with _processPoolLock:
+        if _processPool is None:
+            import multiprocessing
+            import concurrent.futures
+            _processPool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                                  mp_context=multiprocessing.get_context('spawn'))
+        return _processPool
+
+def shutdownProcessPool():
+    global _processPool
+    with _processPoolLock:
+        if _processPool is not None:
+            _processPool.shutdown(wait=False, cancel_futures=True)
+            _processPool = None
+
+BINARY_SNIFF = 8192
+MMAP_THRESHOLD = 64 * 1024 * 1024
+MAX_HIT_TEXT = 300
+
+class LiteralSearch:
+    # bytes.find is much faster than an IGNORECASE regex, so case-insensitive literals search a lowered copy.
+    # Mapped files are too big to copy and have no lower(), those use the regex.
+    def __init__(self, literal, caseSensitive):
+        self.literal = literal if caseSensitive else literal.lower()
+        self.caseSensitive = caseSensitive
+        self.regex = None if caseSensitive else re.compile(re.escape(literal), re.IGNORECASE)
+
+    def prepare(self, data):
+        return data if self.caseSensitive or not isinstance(data, bytes) else data.lower()
+
+    def search(self, haystack, pos=0):
+        if self.regex is not None and not isinstance(haystack, bytes):
+            match = self.regex.search(haystack, pos)
+            return None if match is None else match.start()
+        start = haystack.find(self.literal, pos)
+        return None if start < 0 else start
+
+class RegexSearch:
+    def __init__(self, pattern, flags):
+        self.regex = re.compile(pattern, flags)
+
+    def prepare(self, data):
+        return data
+
+    def search(self, haystack, pos=0):
+        match = self.regex.search(haystack, pos)
+        return None if match is None else match.start()
+
+def searchFiles(root, relPaths, matcher, maxHits):
+    # Runs in a worker process and returns (relPath, line, column, text) tuples, one per matching line
+    import mmap
+    hits = []
+    for relPath in relPaths:
+        try:
+            with open(os.path.join(root, relPath), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    continue
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > MMAP_THRESHOLD else f.read()
+        except (OSError, ValueError):
+            continue
+        # A file that cannot be searched is skipped, the rest of the batch still is
+        found = []
+        try:
+            if b'\0' not in data[:BINARY_SNIFF]:
+                searchData(relPath, data, matcher, maxHits - len(hits), found)
+        except Exception:
+            found = []
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        hits += found
+        if len(hits) >= maxHits:
+            break
+    return hits
+
+def searchData(relPath, data, matcher, maxHits, hits):
+    import mmap
+    haystack = matcher.prepare(data)
+    line = 0
+    counted = 0
+    start = matcher.search(haystack)
+    while start is not None and len(hits) < maxHits:
+        lineStart = data.rfind(b'\n', 0, start) + 1
+        lineEnd = data.find(b'\n', start)
+        if lineEnd < 0:
+            lineEnd = len(data)
+        # mmap has no count(), so the gap is copied there; plain reads count in place
+        line += data[counted:lineStart].count(b'\n') if isinstance(data, mmap.mmap) else data.count(b'\n', counted, lineStart)
+        counted = lineStart
+        column = len(data[lineStart:start].decode('utf-8', 'replace'))
+        text = data[lineStart:min(lineEnd, lineStart + MAX_HIT_TEXT)].decode('utf-8', 'replace').rstrip('\r')
+        hits.append((relPath, line, column, text))
+        # Only the first match on a line is reported
+        start = matcher.search(haystack, lineEnd + 1)
+
+class FindInFilesSearch(QThread):
+    found = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+
+    BATCH_FILES = 64
+
+    def __init__(self, executor, root, files, matcher, maxHits, parent=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.root = root
+        self.files = files
+        self.matcher = matcher
+        self.maxHits = maxHits
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        import concurrent.futures
+        futures = [self.executor.submit(searchFiles, self.root, self.files[i:i + self.BATCH_FILES],
+                                        self.matcher, self.maxHits)
+                   for i in range(0, len(self.files), self.BATCH_FILES)]
+        pending = set(futures)
+        total = 0
+        try:
+            while pending and not self._cancelled and total < self.maxHits:
+                # Short waits keep cancellation responsive while batches are still running
+                done, pending = concurrent.futures.wait(pending, timeout=0.1,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    hits = future.result()[:self.maxHits - total]
+                    if hits:
+                        total += len(hits)
+                        self.found.emit(hits)
+                self.progress.emit(len(futures) - len(pending), len(futures))
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            for future in futures:
+                future.cancel()
+
+class FindInFiles(QObject):
+    found = pyqtSignal(list)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(bool)
+
+    MAX_HITS = 10000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._search = None
+        self.error = None
+
+    def compile(self, query, regex=False, caseSensitive=False):
+        # Files are matched as bytes, so the pattern is too; raises re.error for a bad regex
+        if not regex:
+            return LiteralSearch(query.encode('utf-8'), caseSensitive)
+        return RegexSearch(query.encode('utf-8'), 0 if caseSensitive else re.IGNORECASE)
+
+    def start(self, root, files, matcher):
+        self.cancel()
+        self.error = None
+        self._search = FindInFilesSearch(processPool(), root, files, matcher, self.MAX_HITS, self)
+        self._search.found.connect(self._onFound)
+        self._search.progress.connect(self._onProgress)
+        self._search.finished.connect(self._onFinished)
+        self._search.start()
+
+    def isRunning(self):
+        return self._search is not None
+
+    def cancel(self):
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
+            self.finished.emit(True)
+
+    def close(self):
+        self.cancel()
+        for search in self.findChildren(FindInFilesSearch):
+            search.wait()
+
+    def _onFound(self, hits):
+        if self.sender() is self._search:
+            self.found.emit(hits)
+
+    def _onProgress(self, done, total):
+        if self.sender() is self._search:
+            self.progress.emit(done, total)
+
+    def _onFinished(self):
+        search = self.sender()
+        search.deleteLater()
+        if search is not self._search:
+            return
+        self._search = None
+        self.error = search.error
+        if search.error is not None:
+            # A crashed worker breaks the whole pool, the next job starts a new one
+            shutdownProcessPool()
+        self.finished.emit(False)
+
+class FindInFilesPanel(QWidget):
+    openRequested = pyqtSignal(str, int)
+
+    def __init__(self, finder, parent=None):
+        super().__init__(parent)
+        self.finder = finder
+        self.root = None
+        self.files = None
+        self._fileItems = {}
+        self._hitCount = 0
+
+        self.input = QLineEdit()
+        self.input.setPlaceholderText("Find in files")
+        self.input.returnPressed.connect(self.search)
+        self.regexBox = QCheckBox("Regex")
+        self.caseBox = QCheckBox("Match Case")
+        self.searchButton = QPushButton("Search")
+        self.searchButton.clicked.connect(self.toggleSearch)
+        self.status = QLabel()
+        self.results = QTreeWidget()
+        self.results.setHeaderHidden(True)
+        self.results.setUniformRowHeights(True)
+        self.results.itemActivated.connect(self.openItem)
+        self.results.itemClicked.connect(self.openItem)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.input)
+        controls.addWidget(self.regexBox)
+        controls.addWidget(self.caseBox)
+        controls.addWidget(self.searchButton)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(controls)
+        layout.addWidget(self.results)
+        layout.addWidget(self.status)
+
+        finder.found.connect(self.addHits)
+        finder.progress.connect(self.showProgress)
+        finder.finished.connect(self.onFinished)
+
+    def setFiles(self, root, files):
+        self.root = root
+        self.files = files
+
+    def toggleSearch(self):
+        if self.finder.isRunning():
+            self.finder.cancel()
+        else:
+            self.search()
+
+    def search(self):
+        query = self.input.text()
+        if not query or self.root is None:
+            return
+        try:
+            matcher = self.finder.compile(query, self.regexBox.isChecked(), self.caseBox.isChecked())
+        except re.error as e:
+            self.status.setText(f"Invalid regular expression: {e}")
+            return
+        self.finder.cancel()
+        self.results.clear()
+        self._fileItems = {}
+        self._hitCount = 0
+        self.status.setText(f"Searching {len(self.files)} files...")
+        self.searchButton.setText("Stop")
+        self.finder.start(self.root, self.files, matcher)
+
+    def addHits(self, hits):
+        self.results.setUpdatesEnabled(False)
+        for relPath, line, column, text in hits:
+            fileItem = self._fileItems.get(relPath)
+            if fileItem is None:
+                fileItem = QTreeWidgetItem(self.results, [relPath])
+                fileItem.setData(0, Qt.UserRole, (os.path.join(self.root, relPath), 0))
+                fileItem.setExpanded(True)
+                self._fileItems[relPath] = fileItem
+            item = QTreeWidgetItem(fileItem, [f"{line + 1}: {text.strip()}"])
+            item.setData(0, Qt.UserRole, (os.path.join(self.root, relPath), line))
+        self.results.setUpdatesEnabled(True)
+        self._hitCount += len(hits)
+
+    def showProgress(self, done, total):
+        self.status.setText(f"{self._hitCount} matches in {len(self._fileItems)} files, "
+                            f"searched {done * 100 // max(total, 1)}%")
+
+    def onFinished(self, cancelled):
+        self.searchButton.setText("Search")
+        summary = f"{self._hitCount} matches in {len(self._fileItems)} files"
+        if self.finder.error is not None:
+            summary += f" (search failed: {self.finder.error})"
+        elif cancelled:
+            summary += " (stopped)"
+        elif self._hitCount >= self.finder.MAX_HITS:
+            summary += f" (stopped at {self.finder.MAX_HITS})"
+        self.status.setText(summary)
+
+    def openItem(self, item, column=0):
+        fileName, line = item.data(0, Qt.UserRole)
+        self.openRequested.emit(fileName, line)
+
+def collectSymbols(body, container, inFunction, symbols):
+    import ast
+    for node in body:
+        if isinstance(node, ast.ClassDef):
+            kind = 'class'
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = 'function'
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            # Locals are not worth indexing
+            if not inFunction:
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    for name in ast.walk(target):
+                        if isinstance(name, ast.Name):
+                            symbols.append((name.id, 'variable', name.lineno - 1, name.col_offset, container))
+            continue
+        else:
+            # Definitions under if/try/with/for blocks still belong to the enclosing scope
+            for field in ('body', 'orelse', 'finalbody', 'handlers'):
+                children = getattr(node, field, None)
+                if isinstance(children, list):
+                    collectSymbols(children, container, inFunction, symbols)
+            continue
+        symbols.append((node.name, kind, node.lineno - 1, node.col_offset, container))
+        collectSymbols(node.body, f"{container}.{node.name}" if container else node.name,
+                       inFunction or kind == 'function', symbols)
+
+def parseSymbols(root, entries):
+    # Runs in a worker process; entries are (relPath, mtime, size) and symbols are
+    # (name, kind, line, column, container) tuples. Only Python files have symbols, files that
+    # fail to parse get none. Every file gets its identifiers for completion.
+    import ast
+    results = []
+    for relPath, mtime, size in entries:
+        symbols = []
+        words = []
+        try:
+            with open(os.path.join(root, relPath), 'rb') as f:
+                data = f.read()
+            if size <= MAX_WORDS_FILE:
+                words = list(set(WORD_PATTERN.findall(data.decode('utf-8', errors='replace'))))
+            if relPath.endswith('.py'):
+                tree = ast.parse(data, relPath)
+                collectSymbols(tree.body, '', False, symbols)
+        except (OSError, SyntaxError, ValueError, RecursionError):
+            pass
+        results.append((relPath, mtime, size, symbols, words))
+    return results
+
+# Generated and minified files add thousands of identifiers nobody types
+MAX_WORDS_FILE = 1024 * 1024
+SYMBOL_SCHEMA = 2
+
+def openSymbolDatabase(path):
+    import sqlite3
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30)
+    # WAL lets the UI read while the indexer writes
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER)")
+    db.execute("CREATE TABLE IF NOT EXISTS symbols (path TEXT, name TEXT COLLATE NOCASE, kind TEXT, "
+               "line INTEGER, column INTEGER, container TEXT)")
+    db.execute("CREATE INDEX IF NOT EXISTS symbolsByName ON symbols (name)")
+    db.execute("CREATE INDEX IF NOT EXISTS symbolsByPath ON symbols (path)")
+    db.execute("CREATE TABLE IF NOT EXISTS words (path TEXT, word TEXT)")
+    db.execute("CREATE INDEX IF NOT EXISTS wordsByWord ON words (word)")
+    db.execute("CREATE INDEX IF NOT EXISTS wordsByPath ON words (path)")
+    if db.execute("PRAGMA user_version").fetchone()[0] < SYMBOL_SCHEMA:
+        # Files indexed before identifiers were collected are indexed again
+        db.execute("DELETE FROM files")
+        db.execute(f"PRAGMA user_version = {SYMBOL_SCHEMA}")
+    db.commit()
+    return db
+
+class SymbolIndexer(QThread):
+    indexed = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+
+    BATCH_FILES = 32
+
+    def __init__(self, root, files, databasePath, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.files = files
+        self.databasePath = databasePath
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        import sqlite3
+        import concurrent.futures
+        try:
+            db = openSymbolDatabase(self.databasePath)
+        except sqlite3.Error as e:
+            self.error = str(e)
+            return
+        try:
+            self.update(db)
+        except (sqlite3.Error, concurrent.futures.BrokenExecutor) as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            db.close()
+
+    def update(self, db):
+        import concurrent.futures
+        known = {path: (mtime, size) for path, mtime, size in db.execute("SELECT path, mtime, size FROM files")}
+        stale = []
+        for relPath in self.files:
+            if self._cancelled:
+                return
+            try:
+                st = os.stat(os.path.join(self.root, relPath))
+            except OSError:
+                continue
+            if known.pop(relPath, None) != (st.st_mtime, st.st_size):
+                stale.append((relPath, st.st_mtime, st.st_size))
+
+        if known:
+            with db:
+                db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known])
+                db.executemany("DELETE FROM symbols WHERE path = ?", [(path,) for path in known])
+                db.executemany("DELETE FROM words WHERE path = ?", [(path,) for path in known])
+            self.indexed.emit(set(known))
+        if not stale:
+            return
+
+        futures = [processPool().submit(parseSymbols, self.root, stale[i:i + self.BATCH_FILES])
+                   for i in range(0, len(stale), self.BATCH_FILES)]
+        pending = set(futures)
+        try:
+            while pending and not self._cancelled:
+                done, pending = concurrent.futures.wait(pending, timeout=0.1,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                changed = set()
+                with db:
+                    for future in done:
+                        for relPath, mtime, size, symbols, words in future.result():
+                            db.execute("DELETE FROM symbols WHERE path = ?", (relPath,))
+                            db.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?)",
+                                           [(relPath,) + symbol for symbol in symbols])
+                            db.execute("DELETE FROM words WHERE path = ?", (relPath,))
+                            db.executemany("INSERT INTO words VALUES (?, ?)", [(relPath, word) for word in words])
+                            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (relPath, mtime, size))
+                            changed.add(relPath)
+                if changed:
+                    self.indexed.emit(changed)
+                self.progress.emit(len(futures) - len(pending), len(futures))
+        finally:
+            for future in futures:
+                future.cancel()
+
+class SymbolIndex(QObject):
+    # Emitted with the relative paths whose symbols changed
+    updated = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.files = []
+        self._db = None
+        self._indexer = None
+        self._pending = False
+
+    def setRoot(self, root):
+        import sqlite3
+        self.close()
+        self.root = os.path.normpath(root)
+        self.files = []
+        try:
+            self._db = openSymbolDatabase(projectCacheDir(self.root, 'symbols.sqlite'))
+        except (OSError, sqlite3.Error):
+            self._db = None
+
+    def setFiles(self, files):
+        self.files = [path for path in files if os.path.splitext(path)[1].lower() in SOURCE_EXTENSIONS]
+        self.refresh()
+
+    def refresh(self):
+        if self._db is None:
+            return
+        if self._indexer is not None:
+            self._pending = True
+            return
+        self._indexer = SymbolIndexer(self.root, self.files, projectCacheDir(self.root, 'symbols.sqlite'), self)
+        self._indexer.indexed.connect(self._onIndexed)
+        self._indexer.progress.connect(self._onProgress)
+        self._indexer.finished.connect(self._onIndexerFinished)
+        self._indexer.start()
+
+    def close(self):
+        if self._indexer is not None:
+            self._indexer.cancel()
+            self._indexer.wait()
+            self._indexer = None
+        self._pending = False
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def relativePath(self, fileName):
+        if self.root is None:
+            return None
+        relPath = os.path.relpath(os.path.normpath(fileName), self.root)
+        return None if relPath.startswith('..') else relPath.replace(os.sep, '/')
+
+    def _query(self, sql, args):
+        import sqlite3
+        if self._db is None:
+            return []
+        try:
+            return self._db.execute(sql, args).fetchall()
+        except sqlite3.Error:
+            return []
+
+    def outline(self, fileName):
+        # (name, kind, line, column, container) tuples in file order
+        return self._query("SELECT name, kind, line, column, container FROM symbols WHERE path = ? ORDER BY line",
+                           (self.relativePath(fileName),))
+
+    def search(self, query, limit=50):
+        # Prefix matches come first and can use the name index; substring matches fill the rest
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        sql = ("SELECT name, kind, path, line, container FROM symbols WHERE name LIKE ? ESCAPE '\\' "
+               "ORDER BY length(name), name LIMIT ?")
+        results = self._query(sql, (escaped + '%', limit))
+        if len(results) < limit and query:
+            seen = set(results)
+            results += [row for row in self._query(sql, ('%' + escaped + '%', limit)) if row not in seen]
+        return results[:limit]
+
+    def words(self, prefix, limit):
+        # Identifiers starting with prefix, which the word index can answer as a range
+        return [word for word, in self._query("SELECT DISTINCT word FROM words WHERE word >= ? AND word < ? "
+                                              "ORDER BY word LIMIT ?", (prefix, prefix + '\x7f', limit))]
+
+    def definitions(self, name):
+        rows = self._query("SELECT name, kind, path, line, container FROM symbols WHERE name = ? "
+                           "AND kind != 'variable' ORDER BY path, line", (name,))
+        if not rows:
+            rows = self._query("SELECT name, kind, path, line, container FROM symbols WHERE name = ? "
+                               "ORDER BY path, line", (name,))
+        # The name column compares case-insensitively
+        return [row for row in rows if row[0] == name]
+
+    def _onIndexed(self, paths):
+        if self.sender() is self._indexer:
+            self.updated.emit(paths)
+
+    def _onProgress(self, done, total):
+        if self.sender() is self._indexer:
+            self.progress.emit(done, total)
+
+    def _onIndexerFinished(self):
+        indexer = self.sender()
+        indexer.deleteLater()
+        if indexer is not self._indexer:
+            return
+        self._indexer = None
+        if indexer.error is not None:
+            shutdownProcessPool()
+        if self._pending:
+            self._pending = False
+            self.refresh()
+
+class OutlineView(QTreeWidget):
+    lineRequested = pyqtSignal(int)
+
+    ICONS = {'class': 'C', 'function': 'f', 'variable': 'v'}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setHeaderHidden(True)
+        self.setUniformRowHeights(True)
+        self.setIndentation(10)
+        self.itemClicked.connect(lambda item: self.lineRequested.emit(item.data(0, Qt.UserRole)))
+        self.itemActivated.connect(lambda item: self.lineRequested.emit(item.data(0, Qt.UserRole)))
+
+    def setSymbols(self, symbols):
+        self.setUpdatesEnabled(False)
+        self.clear()
+        parents = {'': self.invisibleRootItem()}
+        for name, kind, line, column, container in symbols:
+            item = QTreeWidgetItem(parents.get(container, self.invisibleRootItem()),
+                                   [f"{self.ICONS.get(kind, ' ')} {name}"])
+            item.setData(0, Qt.UserRole, line)
+            if kind != 'variable':
+                parents[f"{container}.{name}" if container else name] = item
+        self.expandAll()
+        self.setUpdatesEnabled(True)
+
+class ImageDecoder(QThread):
+    decoded = pyqtSignal(QImage)
+    failed = pyqtSignal(str)
+
+    def __init__(self, fileName, key, targetSize=None, parent=None):
+        super().__init__(parent)
+        self.fileName = fileName
+        self.key = key
+        self.targetSize = targetSize
+        self.imageSize = QSize()
+
+    def run(self):
+        reader = QImageReader(self.fileName)
+        reader.setAutoTransform(True)
+        self.imageSize = reader.size()
+        if self.targetSize is not None and self.imageSize.isValid() and (
+                self.imageSize.width() > self.targetSize.width() or self.imageSize.height() > self.targetSize.height()):
+            # JPEG and friends decode straight to the smaller size instead of scaling afterwards
+            reader.setScaledSize(self.imageSize.scaled(self.targetSize, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            self.failed.emit(reader.errorString())
+        else:
+            self.decoded.emit(image)
+
+class PixmapCache:
+    def __init__(self, budget):
+        self.budget = budget
+        self.usage = 0
+        # Least recently used pixmaps come first
+        self._pixmaps = OrderedDict()
+
+    def get(self, key):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def add(self, key, pixmap):
+        self.remove(key)
+        self._pixmaps[key] = pixmap
+        self.usage += self.cost(pixmap)
+        while self.usage > self.budget and len(self._pixmaps) > 1:
+            self.remove(next(iter(self._pixmaps)))
+
+    def remove(self, key):
+        pixmap = self._pixmaps.pop(key, None)
+        if pixmap is not None:
+            self.usage -= self.cost(pixmap)
+
+    @staticmethod
+    def cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+class ImageViewer(QScrollArea):
+    failed = pyqtSignal(str)
+
+    ZOOM_STEP = 1.25
+
+    def __init__(self, cacheBudget, parent=None):
+        super().__init__(parent)
+        self.cache = PixmapCache(cacheBudget)
+        self.fileName = None
+        self.imageSize = QSize()
+        # None fits the image to the viewport, otherwise the scale of the full resolution image
+        self.zoom = None
+        self.decoder = None
+        self.label = QLabel()
+        self.label.setAlignment(Qt.AlignCenter)
+        self.setWidget(self.label)
+        self.setWidgetResizable(True)
+        self.setAlignment(Qt.AlignCenter)
+        self.setStyleSheet("background-color: #1e1e3e;")
+        self._resizeTimer = QTimer(self)
+        self._resizeTimer.setSingleShot(True)
+        self._resizeTimer.setInterval(100)
+        self._resizeTimer.timeout.connect(self.request)
+
+    def setImage(self, fileName):
+        self.fileName = fileName
+        self.zoom = None
+        self.setWidgetResizable(True)
+        self.label.clear()
+        # Lets the splitter lay the viewer out first, so the decode targets its final size
+        QTimer.singleShot(0, self.request)
+
+    def cacheKey(self, targetSize):
+        try:
+            mtime = os.path.getmtime(self.fileName)
+        except OSError:
+            mtime = None
+        return (self.fileName, mtime, targetSize.width(), targetSize.height()) if targetSize else (self.fileName, mtime)
+
+    def request(self):
+        if self.fileName is None:
+            return
+        targetSize = self.viewport().size() - QSize(2, 2) if self.zoom is None else None
+        key = self.cacheKey(targetSize)
+        pixmap = self.cache.get(key)
+        if pixmap is not None:
+            self.showPixmap(pixmap)
+            return
+        if self.decoder is not None and self.decoder.key == key:
+            return
+        self.decoder = ImageDecoder(self.fileName, key, targetSize, self)
+        self.decoder.decoded.connect(self.onDecoded)
+        self.decoder.failed.connect(self.onFailed)
+        self.decoder.finished.connect(self.decoder.deleteLater)
+        self.decoder.start()
+
+    def onDecoded(self, image):
+        decoder = self.sender()
+        if decoder is not self.decoder:
+            return
+        self.decoder = None
+        self.imageSize = decoder.imageSize if decoder.imageSize.isValid() else image.size()
+        pixmap = QPixmap.fromImage(image)
+        self.cache.add(decoder.key, pixmap)
+        self.showPixmap(pixmap)
+
+    def onFailed(self, message):
+        if self.sender() is not self.decoder:
+            return
+        self.decoder = None
+        self.failed.emit(message)
+
+    def showPixmap(self, pixmap):
+        if self.zoom is None or self.zoom == 1:
+            self.label.setPixmap(pixmap)
+        else:
+            size = self.imageSize * self.zoom
+            self.label.setPixmap(pixmap.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        if self.zoom is not None:
+            self.label.adjustSize()
+
+    def setZoom(self, zoom):
+        if zoom is None:
+            self.setWidgetResizable(True)
+        else:
+            self.setWidgetResizable(False)
+        self.zoom = zoom
+        self.request()
+
+    def fitScale(self):
+        if not self.imageSize.isValid() or self.imageSize.isEmpty():
+            return 1.0
+        viewport = self.viewport().size()
+        return min(1.0, viewport.width() / self.imageSize.width(), viewport.height() / self.imageSize.height())
+
+    def zoomBy(self, factor):
+        zoom = (self.zoom or self.fitScale()) * factor
+        # Zooming back out past the fitted size returns to the cheap downscaled preview
+        self.setZoom(None if zoom <= self.fitScale() else min(zoom, 16.0))
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            self.zoomBy(self.ZOOM_STEP if event.angleDelta().y() > 0 else 1 / self.ZOOM_STEP)
+            event.accept()
+        else:
+            super().wheelEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Plus, Qt.Key_Equal):
+            self.zoomBy(self.ZOOM_STEP)
+        elif event.key() == Qt.Key_Minus:
+            self.zoomBy(1 / self.ZOOM_STEP)
+        elif event.key() == Qt.Key_0:
+            self.setZoom(None)
+        else:
+            super().keyPressEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.zoom is None and self.fileName is not None:
+            self._resizeTimer.start()
+
+    def stop(self):
+        self.decoder = None
+        for decoder in self.findChildren(ImageDecoder):
+            decoder.wait()
+
+class Profiler(QObject):
+    # Trace events use the Chrome trace-event format, timestamps in microseconds since startup
+    recorded = pyqtSignal(dict)
+    countersUpdated = pyqtSignal(dict)
+
+    MAX_EVENTS = 20000
+    TID_GUI = 1
+    TID_IO = 2
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = False
+        self.events = deque(maxlen=self.MAX_EVENTS)
+        self.counters = {}
+        self.processes = set()
+        self.origin = time.perf_counter()
+        self.watchdog = None
+        self._sampleTimer = None
+        self._sampledAt = self.origin
+
+    def setEnabled(self, enabled, stallThreshold=0.2):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.counters.clear()
+            self._sampledAt = time.perf_counter()
+            self._sampleTimer = QTimer(self)
+            self._sampleTimer.timeout.connect(self.sampleCounters)
+            self._sampleTimer.start(1000)
+            self.watchdog = StallWatchdog(stallThreshold, self)
+            self.watchdog.stalled.connect(self.onStalled)
+            self.watchdog.start()
+        else:
+            self._sampleTimer.stop()
+            self._sampleTimer.deleteLater()
+            self._sampleTimer = None
+            self.stopWatchdog()
+
+    def stopWatchdog(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog.wait()
+            self.watchdog.deleteLater()
+            self.watchdog = None
+
+    def timestamp(self, t):
+        return round((t - self.origin) * 1e6)
+
+    def record(self, name, start, end, category='action', tid=TID_GUI, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': self.timestamp(start),
+                 'dur': round((end - start) * 1e6), 'pid': os.getpid(), 'tid': tid, 'args': args or {}}
+        self.events.append(event)
+        self.recorded.emit(event)
+
+    def count(self, name, amount):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def processStarted(self, process, program, arguments):
+        if not self.enabled:
+            return
+        start = time.perf_counter()
+        pid = process.processId()
+        if not pid:
+            # Failed to start, errorOccurred reports it
+            return
+        self.processes.add(pid)
+        self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': pid,
+                            'args': {'name': f"{os.path.basename(program)} ({pid})"}})
+        process.finished.connect(lambda exitCode, exitStatus: self.processFinished(
+            pid, start, program, arguments, exitCode))
+
+    def processFinished(self, pid, start, program, arguments, exitCode):
+        self.processes.discard(pid)
+        if self.enabled:
+            self.record(os.path.basename(program), start, time.perf_counter(), 'process', pid,
+                        {'arguments': arguments, 'exitCode': exitCode})
+
+    def sampleCounters(self):
+        now = time.perf_counter()
+        elapsed = now - self._sampledAt
+        self._sampledAt = now
+        rates = {name: total / elapsed for name, total in self.counters.items()}
+        self.counters = dict.fromkeys(self.counters, 0)
+        rates['processes'] = len(self.processes)
+        for name, value in rates.items():
+            self.events.append({'name': name, 'ph': 'C', 'ts': self.timestamp(now), 'pid': os.getpid(),
+                                'args': {name: value}})
+        self.countersUpdated.emit(rates)
+
+    def onStalled(self, start, end, stack):
+        self.record('stall', start, end, 'stall', args={'stack': stack})
+
+    def clear(self):
+        self.events.clear()
+
+    def exportTrace(self, fileName):
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                    for tid, name in ((self.TID_GUI, 'GUI thread'), (self.TID_IO, 'File loading'))]
+        with open(fileName, 'w') as f:
+            json.dump({'traceEvents': metadata + list(self.events), 'displayTimeUnit': 'ms'}, f)
+
+    def close(self):
+        self.stopWatchdog()
+
+profiler = Profiler()
+
+def timed(name):
+    # Records how long a user-facing action holds the GUI thread while the profiler is enabled.
+    # The wrapper takes any arguments, so signals connect to the methods it decorates with exactly
+    # the arguments they accept.
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(name, start, time.perf_counter())
+        return wrapper
+    return decorate
+
+class StallWatchdog(QThread):
+    # The GUI thread updates a heartbeat from the event loop. When the heartbeat goes stale the
+    # watchdog samples the GUI thread's Python stack, which shows what is blocking it.
+    stalled = pyqtSignal(float, float, list)
+
+    HEARTBEAT = 20
+    MAX_FRAMES = 40
+
+    def __init__(self, threshold, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.guiThread = threading.get_ident()
+        self.lastBeat = time.perf_counter()
+        self._stopped = False
+        self._heartbeat = QTimer(self)
+        self._heartbeat.timeout.connect(self.beat)
+        self._heartbeat.start(self.HEARTBEAT)
 
-    def data(self, index, role):
-        if role == Qt.DecorationRole and index.column() == 0:
-            file_path = self.filePath(index)
-            _, ext = os.path.splitext(file_path)
-            if ext in self.icon_map:
-                return self.icon_map[ext]
-        elif role == Qt.DisplayRole and index.column() == 0:
-            return os.path.basename(self.filePath(index))
-        return super().data(index, role)
+    def beat(self):
+        self.lastBeat = time.perf_counter()
+
+    def stop(self):
+        self._heartbeat.stop()
+        self._stopped = True
+
+    def run(self):
+        import traceback
+        stalledBeat = None
+        stack = []
+        while not self._stopped:
+            time.sleep(self.HEARTBEAT / 2000)
+            beat = self.lastBeat
+            if stalledBeat is None:
+                if time.perf_counter() - beat > self.threshold:
+                    frame = sys._current_frames().get(self.guiThread)
+                    stack = traceback.format_stack(frame, self.MAX_FRAMES) if frame is not None else []
+                    stalledBeat = beat
+            elif beat != stalledBeat:
+                # The stall lasted until the first heartbeat after it
+                self.stalled.emit(stalledBeat, beat, [line.rstrip() for line in stack])
+                stalledBeat = None
+
+class PerformancePanel(QWidget):
+    MAX_ROWS = 1000
+
+    def __init__(self, profiler, parent=None):
+        super().__init__(parent)
+        self.profiler = profiler
+        self.recordBox = QCheckBox("Record")
+        self.recordBox.setChecked(profiler.enabled)
+        self.recordBox.toggled.connect(self.setRecording)
+        self.countersLabel = QLabel()
+        clearButton = QPushButton("Clear")
+        clearButton.clicked.connect(self.clear)
+        exportButton = QPushButton("Export Trace...")
+        exportButton.clicked.connect(self.exportTrace)
+        controls = QHBoxLayout()
+        controls.addWidget(self.recordBox)
+        controls.addWidget(self.countersLabel, 1)
+        controls.addWidget(clearButton)
+        controls.addWidget(exportButton)
+
+        self.events = QTreeWidget()
+        self.events.setHeaderLabels(["Event", "Duration (ms)", "Details"])
+        self.events.setUniformRowHeights(True)
+        self.events.setColumnWidth(0, 200)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(controls)
+        layout.addWidget(self.events)
+
+        profiler.recorded.connect(self.addEvent)
+        profiler.countersUpdated.connect(self.showCounters)
+
+    def setRecording(self, enabled):
+        settings().setValue('performance/enabled', enabled)
+        self.profiler.setEnabled(enabled, settings().value('performance/stallMs', 200, type=int) / 1000)
+        if not enabled:
+            self.countersLabel.clear()
+
+    def addEvent(self, event):
+        args = event['args']
+        stack = args.get('stack')
+        if stack is not None:
+            details = stack[-1].strip().splitlines()[0] if stack else ''
+        else:
+            details = ' '.join(f"{key}={value}" for key, value in args.items())
+        item = QTreeWidgetItem([event['name'], f"{event['dur'] / 1000:.1f}", details])
+        if stack:
+            item.setForeground(0, QColor("#e06c75"))
+            # Innermost call first
+            for frame in reversed(stack):
+                QTreeWidgetItem(item, ['', '', frame.strip()])
+        self.events.insertTopLevelItem(0, item)
+        if self.events.topLevelItemCount() > self.MAX_ROWS:
+            self.events.takeTopLevelItem(self.MAX_ROWS)
+
+    def showCounters(self, rates):
+        self.countersLabel.setText(f"Console {rates.get('console.bytes', 0) / 1024:.1f} KB/s, "
+                                   f"{rates['processes']} child process(es) running")
+
+    def clear(self):
+        self.profiler.clear()
+        self.events.clear()
+
+    def exportTrace(self):
+        fileName, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json", "Trace Files (*.json)")
+        if not fileName:
+            return
+        try:
+            self.profiler.exportTrace(fileName)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export trace: {e}")
+
+class Buffer:
+    def __init__(self, fileName):
+        self.fileName = fileName
+        # None until the file is loaded, and again after the buffer is evicted
+        self.document = None
+        self.lexer = None
+        self.encoding = 'utf-8'
+        self.eolMode = QsciScintilla.EolUnix
+        self.modified = False
+        self.cursor = (0, 0)
+        self.firstVisibleLine = 0
+        self.memory = 0
+        # Past the large file thresholds, and whether full editor features were forced back on
+        self.large = False
+        self.fullFeatures = False
+        # Stamp of the file on disk the document matches when unmodified, see EditJournal
+        self.stamp = None
+        self.journal = None
+        # Counts edits, a save only marks the buffer unmodified if none were made while it ran
+        self.changes = 0
+        # Journal path and edits to replay once the buffer has loaded
+        self.recovery = None
+        # Sorted identifiers for completion, None for buffers that were not indexed
+        self.words = None
+        # The file changed on disk while another buffer was shown
+        self.diskChanged = False
+        # A change on disk the user chose not to reload
+        self.declinedStamp = None
+        # The file's contents at git HEAD for the gutter markers, False when HEAD does not have it
+        self.headText = None
+
+    @property
+    def reducedFeatures(self):
+        return self.large and not self.fullFeatures
+
+class EditJournal:
+    # Unsaved edits to a buffer, appended to a file as they are made. Recovering them loads the
+    # file they were made to and replays them, so autosaving costs the size of the edits and
+    # not of the buffer. Positions are byte offsets into the editor's UTF-8 text.
+    def __init__(self, path, fileName, base=None):
+        self.path = path
+        self.fileName = fileName
+        # Stamp of the file the edits apply to, nothing is written until it is known
+        self.base = base
+        self.records = []
+        # Holds new edits back while a save runs, they apply to whichever file the save leaves
+        self.saving = False
+
+    def insert(self, position, data):
+        self.records.append(b'+%d %d\n' % (position, len(data)) + data)
+
+    def delete(self, position, length):
+        self.records.append(b'-%d %d\n' % (position, length))
+
+    def flush(self):
+        if not self.records or self.saving or self.base is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(json.dumps({'file': self.fileName, 'base': self.base}).encode() + b'\n')
+            f.writelines(self.records)
+        self.records.clear()
+
+    def discard(self):
+        self.records.clear()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def rebase(self, stamp):
+        # The file was saved, edits made since are relative to the new contents
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.base = stamp
+        self.saving = False
+
+    def moveTo(self, path, fileName):
+        self.flush()
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                f.readline()
+                body = f.read()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(json.dumps({'file': fileName, 'base': self.base}).encode() + b'\n')
+                f.write(body)
+            os.remove(self.path)
+        self.path = path
+        self.fileName = fileName
+
+    @staticmethod
+    def read(path):
+        # Returns the header, the edits and where the last complete edit ends. A crash while
+        # appending leaves a partial edit after it, which is dropped.
+        with open(path, 'rb') as f:
+            line = f.readline()
+            header = json.loads(line)
+            body = f.read()
+        edits = []
+        offset = 0
+        while True:
+            end = body.find(b'\n', offset)
+            if end < 0:
+                break
+            kind = body[offset:offset + 1]
+            position, length = (int(value) for value in body[offset + 1:end].split())
+            if kind == b'+':
+                if end + 1 + length > len(body):
+                    break
+                edits.append((position, body[end + 1:end + 1 + length]))
+                end += length
+            elif kind == b'-':
+                edits.append((position, length))
+            else:
+                raise ValueError(f"unknown journal record {kind!r}")
+            offset = end + 1
+        return header, edits, len(line) + offset
+
+class BufferManager:
+    def __init__(self, memoryBudget):
+        self.memoryBudget = memoryBudget
+        # Least recently used buffers come first
+        self._buffers = OrderedDict()
+
+    def __iter__(self):
+        return iter(list(self._buffers.values()))
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def get(self, fileName):
+        return self._buffers.get(fileName)
+
+    def add(self, buffer):
+        self._buffers[buffer.fileName] = buffer
+
+    def remove(self, fileName):
+        return self._buffers.pop(fileName, None)
+
+    def rename(self, oldName, newName):
+        buffer = self._buffers.pop(oldName, None)
+        if buffer is not None:
+            buffer.fileName = newName
+            self._buffers[newName] = buffer
+        return buffer
+
+    def touch(self, buffer):
+        self._buffers.move_to_end(buffer.fileName)
+
+    def memoryUsage(self):
+        return sum(buffer.memory for buffer in self._buffers.values() if buffer.document is not None)
+
+    def evict(self, keep=None):
+        evicted = []
+        usage = self.memoryUsage()
+        for buffer in list(self._buffers.values()):
+            if usage <= self.memoryBudget:
+                break
+            if buffer is keep or buffer.document is None or buffer.modified:
+                continue
+            buffer.document = None
+            buffer.headText = None
+            usage -= buffer.memory
+            evicted.append(buffer)
+        return evicted
 
 class MainWindow(QMainWindow):
+    JOURNAL_EVENTS = QsciScintilla.SC_MOD_BEFOREINSERT | QsciScintilla.SC_MOD_BEFOREDELETE
+
     def __init__(self):
         super().__init__()
         self.currentFile = ''
         self.projectPath = QDir.currentPath()
-        self.process = None
+        self.loader = None
+        self.buffers = BufferManager(settings().value('buffers/memoryBudgetMB', 256, type=int) * 1024 * 1024)
+        self.currentBuffer = None
+        self.largeFileBytes = settings().value('editor/largeFileMB', 20, type=int) * 1024 * 1024
+        self.largeFileLines = settings().value('editor/largeFileLines', 300000, type=int)
+        self.reducedFeatures = False
+        self.savers = {}
+        self.differs = {}
+        self.wordJobs = {}
+        self.gitDiffer = None
+        # Buffers whose HEAD contents are being read
+        self.headRequests = set()
+        # An insertion announced by Scintilla before it happened, journaled once the text is in
+        self.pendingInsert = None
+        self.replayingJournal = False
+        self.lastRunTarget = None
+        # The session is only written once the one from the last launch has been restored
+        self.startupDone = False
+        self.sessionText = None
+        profiler.setEnabled(settings().value('performance/enabled', False, type=bool)
+                            or os.environ.get('SCRIPTBLISS_PROFILE') == '1',
+                            settings().value('performance/stallMs', 200, type=int) / 1000)
         self.initUI()
+        # Everything the first frame does not need waits until the editor has been painted
+        self.editor.viewport().installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and watched is self.editor.viewport():
+            watched.removeEventFilter(self)
+            QTimer.singleShot(0, self.finishStartup)
+        return super().eventFilter(watched, event)
+
+    def finishStartup(self):
+        self.setWindowIcon(loadIcon('logo.png'))
+        session = self.readSession()
+        if session is not None:
+            self.projectPath = session['project']
+        self.openProject(self.projectPath)
+        if session is not None:
+            self.restoreSession(session)
+        self.startupDone = True
+        self.sessionTimer.start()
+        self.terminalSession.start()
+        if settings().value('run/warmPython', False, type=bool) and WarmRunner.supported():
+            self.warmRunner.start()
 
     def initUI(self):
         self.setWindowTitle("ScriptBliss")
-        self.setWindowIcon(QIcon('logo.png'))
         self.setGeometry(100, 100, 1200, 800)          
         self.showMaximized()
 
@@ -69,15 +3527,27 @@ class MainWindow(QMainWindow):
         self.setPalette(dark_palette)
 
         self.editor = QsciScintilla()
-        self.imageViewer = QLabel()
-        self.imageViewer.setAlignment(Qt.AlignCenter)
-        self.imageViewer.setStyleSheet("background-color: #1e1e3e;")
+        # Created by displayImage the first time an image is opened
+        self.imageViewer = None
         self.editor.setUtf8(True)  # Ensure the editor is in UTF-8 mode
         self.editor.setCaretForegroundColor(QColor("#00091a"))
         # Define a largura da tabulação para 4 espaços
         self.editor.setTabWidth(4) 
         # Conecta o evento de tecla pressionada do editor
         self.editor.keyPressEvent = self.editorKeyPressEvent
+        self.editor.modificationChanged.connect(self.updateBufferTab)
+        self.editor.modificationChanged.connect(self.onSavePointChanged)
+        self.editor.SCN_MODIFIED.connect(self.onEditorModified)
+        self.journalTimer = QTimer(self)
+        self.journalTimer.setSingleShot(True)
+        self.journalTimer.setInterval(settings().value('editor/journalIntervalMs', 2000, type=int))
+        self.journalTimer.timeout.connect(self.flushJournals)
+        self.fileWatcher = FileWatcher(self)
+        self.fileWatcher.changed.connect(self.onFileChangedOnDisk)
+        self.sessionTimer = QTimer(self)
+        self.sessionTimer.setInterval(settings().value('session/intervalMs', 30000, type=int))
+        self.sessionTimer.timeout.connect(self.saveSession)
+        self.scratchDocument = self.editor.document()
 
         font = QFont()
         font.setFamily('Consolas')  # This font is good for a wide range of UTF-8 characters
@@ -92,21 +3562,61 @@ class MainWindow(QMainWindow):
         self.editor.setMarginLineNumbers(0, True)
         self.editor.setMarginsBackgroundColor(QColor("#1e1e3e"))
         self.editor.setMarginsForegroundColor(QColor("#ffffff"))
+        # Lines added, modified and deleted since git HEAD
+        self.editor.setMarginType(1, QsciScintilla.SymbolMargin)
+        self.editor.setMarginWidth(1, 4)
+        self.editor.setMarginMarkerMask(1, GIT_MARKER_MASK)
+        for marker, color in ((GIT_ADDED, "#4caf50"), (GIT_MODIFIED, "#4a90e2"), (GIT_DELETED, "#e05252")):
+            self.editor.markerDefine(QsciScintilla.FullRectangle, marker)
+            self.editor.setMarkerBackgroundColor(QColor(color), marker)
+            self.editor.setMarkerForegroundColor(QColor(color), marker)
+        self.gitDiffTimer = QTimer(self)
+        self.gitDiffTimer.setSingleShot(True)
+        self.gitDiffTimer.setInterval(500)
+        self.gitDiffTimer.timeout.connect(self.updateGitMarkers)
 
         self.editor.setBraceMatching(QsciScintilla.SloppyBraceMatch)
         self.editor.setCaretLineVisible(True)
         self.editor.setCaretLineBackgroundColor(QColor("#dee8ff"))
 
-        lexer = QsciLexerPython()
-        lexer.setDefaultFont(font)
-        self.editor.setLexer(lexer)
+        # The lexer's CompletionAPIs answer from the prepared API data and the word indexes, the
+        # document itself is never scanned for a popup
+        self.editor.setAutoCompletionSource(QsciScintilla.AcsAPIs)
+        self.editor.setAutoCompletionThreshold(settings().value('editor/completionThreshold', 3, type=int))
+        self.editor.setAutoCompletionUseSingle(QsciScintilla.AcusNever)
+        # Lines edited since their identifiers were last added to the buffer's words
+        self.dirtyLines = set()
+        self.wordTimer = QTimer(self)
+        self.wordTimer.setSingleShot(True)
+        self.wordTimer.setInterval(1000)
+        self.wordTimer.timeout.connect(self.updateBufferWords)
+
+        self.lexers = LexerRegistry(QFont("Consolas", 10), self.completionWords)
+        for language, lexerClass, extensions in LEXERS:
+            self.lexers.register(language, lexerClass, extensions)
+        # Lexers are switched while this empty document is shown, see showDocument
+        self.lexerSwitchDocument = QsciDocument()
 
         self.fileSystemModel = CustomFileSystemModel()
-        self.fileSystemModel.setRootPath(self.projectPath)
+
+        self.git = GitService(self)
+        self.git.statusChanged.connect(self.onGitStatusChanged)
+        self.git.commandFinished.connect(self.onGitCommandFinished)
+        self.fileSystemModel.directoryLoaded.connect(self.git.watchDirectory)
+
+        # The project cache is always excluded, older settings still list it
+        self.excludes = [exclude for exclude in settings().value('files/excludes', list(DEFAULT_EXCLUDES), type=list)
+                         if exclude != PROJECT_CACHE_DIR]
+        self.treeFilter = ProjectTreeFilter(self)
+        self.treeFilter.setExcludes(self.excludes)
+        self.treeFilter.setSourceModel(self.fileSystemModel)
 
         self.treeView = QTreeView()
-        self.treeView.setModel(self.fileSystemModel)
-        self.treeView.setRootIndex(self.fileSystemModel.index(self.projectPath))
+        self.treeView.setModel(self.treeFilter)
+        # Lets the view lay out tens of thousands of rows without asking each one for its size
+        self.treeView.setUniformRowHeights(True)
+        # Only resolves the path, the directory is listed and watched once openProject sets the root path
+        self.treeView.setRootIndex(self.treeFilter.mapFromSource(self.fileSystemModel.index(self.projectPath)))
         self.treeView.clicked.connect(self.onFileClicked)
         self.treeView.setHeaderHidden(True)
         self.treeView.setIndentation(10)
@@ -120,20 +3630,59 @@ class MainWindow(QMainWindow):
         self.treeView.setMinimumWidth(200)
         self.treeView.setMaximumWidth(200)
 
-        self.console = QTextEdit()
-        self.console.setReadOnly(True)
-        self.console.setFont(font)
-        self.console.setStyleSheet("background-color: #00091a; color: #c9dcff;")
+        self.outlineView = OutlineView()
+        self.outlineView.setMaximumWidth(200)
+        self.outlineView.lineRequested.connect(self.goToLine)
+        self.sidebar = QSplitter(Qt.Vertical)
+        self.sidebar.addWidget(self.treeView)
+        self.sidebar.addWidget(self.outlineView)
+        self.sidebar.setSizes([400, 200])
+
+        config = settings()
+        self.console = self.createConsole()
+        self.git.output.connect(self.console.write)
+        self.warmRunner = WarmRunner(INTERPRETERS['.py'], settings().value('run/warmModules', WARM_MODULES, type=list), self)
+        self.warmRunner.message.connect(self.console.write)
+        self.symbolIndex = SymbolIndex(self)
+        self.symbolIndex.updated.connect(self.onSymbolsUpdated)
+        self.projectIndex = ProjectIndex(self)
+        self.projectIndex.excludes = tuple(self.excludes)
+        # Wait for the first listing, an empty one would drop every cached file
+        self.projectIndex.updated.connect(
+            lambda: self.projectIndex.dirs is not None and self.symbolIndex.setFiles(self.projectIndex.files()))
+        # Edits made outside the IDE only touch file contents, which directory watches miss
+        QApplication.instance().applicationStateChanged.connect(
+            lambda state: state == Qt.ApplicationActive and self.git.scheduleRefresh())
+        QApplication.instance().applicationStateChanged.connect(
+            lambda state: state == Qt.ApplicationActive and self.symbolIndex.refresh())
 
-        self.terminal = QTextEdit()
-        self.terminal.setReadOnly(False)
+        self.terminal = TerminalWidget(config.value('terminal/scrollback', 5000, type=int))
         self.terminal.setFont(font)
         self.terminal.setStyleSheet("background-color: #00092a; color: #c9dcff;")
         self.terminal.keyPressEvent = self.terminalKeyPressEvent
+        self.terminalInput = ''
+
+        self.terminalSession = TerminalSession(self.projectPath, self)
+        self.terminalSession.output.connect(self.terminal.feed)
+        self.terminalSession.exited.connect(lambda: self.terminal.append("[Shell exited. Press Enter to restart.]"))
+        self.terminal.resized.connect(self.terminalSession.resize)
+        self.terminal.interruptRequested.connect(self.interruptTerminal)
+        self.terminal.restartRequested.connect(self.restartTerminal)
 
         self.bottomTabWidget = QTabWidget()
-        self.bottomTabWidget.addTab(self.console, "Output")
+        self.runPanel = RunPanel(self.console)
+        self.bottomTabWidget.addTab(self.runPanel, "Output")
         self.bottomTabWidget.addTab(self.terminal, "Terminal")
+
+        self.findInFiles = FindInFiles(self)
+        self.findPanel = FindInFilesPanel(self.findInFiles)
+        self.findPanel.openRequested.connect(self.loadFile)
+        self.projectIndex.updated.connect(
+            lambda: self.findPanel.setFiles(self.projectIndex.root, self.projectIndex.files()))
+        self.findPanel.setFiles(self.projectIndex.root, self.projectIndex.files())
+        self.bottomTabWidget.addTab(self.findPanel, "Search")
+        self.performancePanel = PerformancePanel(profiler)
+        self.bottomTabWidget.addTab(self.performancePanel, "Performance")
         self.bottomTabWidget.setStyleSheet("""
             QTabWidget::pane {
                 border: 1px solid #1e1e3e;
@@ -156,9 +3705,40 @@ class MainWindow(QMainWindow):
             }
         """)
 
+        self.bufferTabs = QTabBar()
+        self.bufferTabs.setTabsClosable(True)
+        self.bufferTabs.setMovable(True)
+        self.bufferTabs.setExpanding(False)
+        self.bufferTabs.setDocumentMode(True)
+        self.bufferTabs.currentChanged.connect(self.onBufferTabChanged)
+        self.bufferTabs.tabCloseRequested.connect(self.onBufferTabCloseRequested)
+        self.bufferTabs.setStyleSheet("""
+            QTabBar::tab {
+                background-color: #1e1e3e;
+                color: #e0e0ff;
+                padding: 5px;
+                border: 1px solid #1e1e3e;
+                border-bottom: none;
+            }
+            QTabBar::tab:selected {
+                background-color: #2e2e5e;
+                border: 1px solid #2e2e5e;
+            }
+            QTabBar::tab:hover {
+                background-color: #2e2e5e;
+            }
+        """)
+
+        self.editorPane = QWidget()
+        editorLayout = QVBoxLayout(self.editorPane)
+        editorLayout.setContentsMargins(0, 0, 0, 0)
+        editorLayout.setSpacing(0)
+        editorLayout.addWidget(self.bufferTabs)
+        editorLayout.addWidget(self.editor)
+
         self.splitter1 = QSplitter(Qt.Horizontal)
-        self.splitter1.addWidget(self.treeView)
-        self.splitter1.addWidget(self.editor)
+        self.splitter1.addWidget(self.sidebar)
+        self.splitter1.addWidget(self.editorPane)
         self.splitter1.setSizes([200, 1000])
         self.splitter1.setHandleWidth(0)
 
@@ -170,10 +3750,31 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(splitter2)
 
+        self.loadProgress = QProgressBar()
+        self.loadProgress.setMaximumWidth(200)
+        self.loadProgress.setRange(0, 100)
+        self.cancelLoadButton = QToolButton()
+        self.cancelLoadButton.setText("Cancel")
+        self.cancelLoadButton.clicked.connect(self.cancelLoad)
+        self.largeFileButton = QToolButton()
+        self.largeFileButton.setText("Large File Mode")
+        self.largeFileButton.setCheckable(True)
+        self.largeFileButton.setToolTip("Highlighting, brace matching and the caret line are off for this file.\n"
+                                        "Click to turn them back on.")
+        self.largeFileButton.toggled.connect(self.setLargeFileMode)
+        self.statusBar().addPermanentWidget(self.largeFileButton)
+        self.statusBar().addPermanentWidget(self.loadProgress)
+        self.statusBar().addPermanentWidget(self.cancelLoadButton)
+        self.largeFileButton.hide()
+        self.loadProgress.hide()
+        self.cancelLoadButton.hide()
+
         self.setupMenuBar()
 
     def editorKeyPressEvent(self, event):
         super(QsciScintilla, self.editor).keyPressEvent(event)
+        if self.reducedFeatures:
+            return
 
         # Obter a posição atual do cursor
         line, index = self.editor.getCursorPosition()
@@ -225,74 +3826,149 @@ class MainWindow(QMainWindow):
         gitMenu = menubar.addMenu('&Git')
         compilerMenu = menubar.addMenu('&Compilers')
 
-        newFile = QAction(QIcon('new.png'), 'New', self)
+        newFile = QAction('New', self)
+        newFile.setData('new.png')
         newFile.setShortcut('Ctrl+N')
         newFile.setStatusTip('Create new file')
         newFile.triggered.connect(self.newFile)
 
-        openFile = QAction(QIcon('open.png'), 'Open', self)
+        openFile = QAction('Open', self)
+        openFile.setData('open.png')
         openFile.setShortcut('Ctrl+O')
         openFile.setStatusTip('Open existing file')
         openFile.triggered.connect(self.openFileDialog)
 
-        openFolder = QAction(QIcon('folder.png'), 'Open Folder', self)
+        openFolder = QAction('Open Folder', self)
+        openFolder.setData('folder.png')
         openFolder.setShortcut('Ctrl+Shift+O')
         openFolder.setStatusTip('Open folder as project')
         openFolder.triggered.connect(self.openFolderDialog)
 
-        saveFile = QAction(QIcon('save.png'), 'Save', self)
+        excludes = QAction('Exclude Patterns...', self)
+        excludes.setStatusTip('Choose the files and folders the project tree and searches leave out')
+        excludes.triggered.connect(self.editExcludes)
+
+        goToFile = QAction('Go to File...', self)
+        goToFile.setShortcut('Ctrl+P')
+        goToFile.setStatusTip('Open a project file by name')
+        goToFile.triggered.connect(self.goToFile)
+
+        findInFiles = QAction('Find in Files...', self)
+        findInFiles.setShortcut('Ctrl+Shift+F')
+        findInFiles.setStatusTip('Search the contents of all project files')
+        findInFiles.triggered.connect(self.showFindInFiles)
+
+        goToSymbol = QAction('Go to Symbol in Workspace...', self)
+        goToSymbol.setShortcut('Ctrl+T')
+        goToSymbol.setStatusTip('Jump to a class, function or variable defined in the project')
+        goToSymbol.triggered.connect(self.goToSymbol)
+
+        goToDefinition = QAction('Go to Definition', self)
+        goToDefinition.setShortcut('F12')
+        goToDefinition.setStatusTip('Jump to the definition of the name under the cursor')
+        goToDefinition.triggered.connect(self.goToDefinition)
+
+        saveFile = QAction('Save', self)
+        saveFile.setData('save.png')
         saveFile.setShortcut('Ctrl+S')
         saveFile.setStatusTip('Save current file')
-        saveFile.triggered.connect(self.saveFileDialog)
+        saveFile.triggered.connect(lambda: self.saveFileDialog())
+
+        closeFile = QAction('Close', self)
+        closeFile.setShortcut('Ctrl+W')
+        closeFile.setStatusTip('Close current file')
+        closeFile.triggered.connect(self.closeCurrentBuffer)
 
-        runAction = QAction(QIcon('run.png'), 'Run Code', self)
+        runAction = QAction('Run Code', self)
+        runAction.setData('run.png')
         runAction.setShortcut('Ctrl+R')
         runAction.setStatusTip('Run Code')
-        runAction.triggered.connect(self.runCode)
+        runAction.triggered.connect(lambda: self.runCode())
 
-        gitCommit = QAction(QIcon('commit.png'), 'Commit', self)
+        warmRunner = QAction('Warm Python Runner', self)
+        warmRunner.setCheckable(True)
+        warmRunner.setChecked(settings().value('run/warmPython', False, type=bool))
+        warmRunner.setEnabled(WarmRunner.supported())
+        warmRunner.setStatusTip('Run Python scripts in a forked interpreter that has the usual modules imported already')
+        warmRunner.toggled.connect(self.setWarmRunnerEnabled)
+
+        warmModules = QAction('Warm Runner Modules...', self)
+        warmModules.setEnabled(WarmRunner.supported())
+        warmModules.setStatusTip('Choose the modules the warm Python runner imports ahead of runs')
+        warmModules.triggered.connect(self.editWarmRunnerModules)
+
+        gitCommit = QAction('Commit', self)
+        gitCommit.setData('commit.png')
         gitCommit.setStatusTip('Commit changes')
-        gitCommit.triggered.connect(self.gitCommit)
+        gitCommit.triggered.connect(lambda: self.gitCommit())
 
-        gitPush = QAction(QIcon('push.png'), 'Push', self)
+        gitPush = QAction('Push', self)
+        gitPush.setData('push.png')
         gitPush.setStatusTip('Push changes')
-        gitPush.triggered.connect(self.gitPush)
+        gitPush.triggered.connect(lambda: self.gitPush())
 
-        gitPull = QAction(QIcon('pull.png'), 'Pull', self)
+        gitPull = QAction('Pull', self)
+        gitPull.setData('pull.png')
         gitPull.setStatusTip('Pull changes')
-        gitPull.triggered.connect(self.gitPull)
+        gitPull.triggered.connect(lambda: self.gitPull())
 
         fileMenu.addAction(newFile)
         fileMenu.addAction(openFile)
         fileMenu.addAction(openFolder)
+        fileMenu.addAction(excludes)
+        fileMenu.addAction(goToFile)
+        fileMenu.addAction(findInFiles)
+        fileMenu.addAction(goToSymbol)
+        fileMenu.addAction(goToDefinition)
         fileMenu.addAction(saveFile)
+        fileMenu.addAction(closeFile)
         runMenu.addAction(runAction)
+        runMenu.addSeparator()
+        runMenu.addAction(warmRunner)
+        runMenu.addAction(warmModules)
         gitMenu.addAction(gitCommit)
         gitMenu.addAction(gitPush)
         gitMenu.addAction(gitPull)
 
-        # Compilers Menu
-        pythonCompiler = QAction(QIcon('python.png'),'Python', self)
+        # Icons are loaded the first time their menu opens and the compilers menu is built then too
+        for menu in (fileMenu, runMenu, gitMenu):
+            menu.aboutToShow.connect(lambda menu=menu: self.loadMenuIcons(menu))
+        compilerMenu.aboutToShow.connect(lambda: compilerMenu.isEmpty() and self.populateCompilersMenu(compilerMenu))
+        compilerMenu.aboutToShow.connect(lambda: self.loadMenuIcons(compilerMenu))
+
+    def loadMenuIcons(self, menu):
+        for action in menu.actions():
+            if action.data() and action.icon().isNull():
+                action.setIcon(loadIcon(action.data()))
+
+    def populateCompilersMenu(self, compilerMenu):
+        pythonCompiler = QAction('Python', self)
+        pythonCompiler.setData('python.png')
         pythonCompiler.setStatusTip('Download Python Compiler')
         pythonCompiler.triggered.connect(lambda: QDesktopServices.openUrl(QUrl('https://www.python.org/downloads/')))
 
-        javaCompiler = QAction(QIcon('java.png'),'Java', self)
+        javaCompiler = QAction('Java', self)
+        javaCompiler.setData('java.png')
         javaCompiler.setStatusTip('Download Java Compiler')
         javaCompiler.triggered.connect(lambda: QDesktopServices.openUrl(QUrl('https://www.oracle.com/java/technologies/javase-jdk11-downloads.html')))
 
-        cppCompiler = QAction(QIcon('cpp.png'),'C++', self)
+        cppCompiler = QAction('C++', self)
+        cppCompiler.setData('cpp.png')
         cppCompiler.setStatusTip('Download C++ Compiler')
         cppCompiler.triggered.connect(lambda: QDesktopServices.openUrl(QUrl('https://www.mingw-w64.org/downloads/')))
 
-        rubyCompiler = QAction(QIcon('ruby.png'),'Ruby', self)
+        rubyCompiler = QAction('Ruby', self)
+        rubyCompiler.setData('ruby.png')
         rubyCompiler.setStatusTip('Download Ruby Compiler')
         rubyCompiler.triggered.connect(lambda: QDesktopServices.openUrl(QUrl('https://www.ruby-lang.org/en/downloads/')))
 
-        phpCompiler = QAction(QIcon('php.png'),'PHP', self)
+        phpCompiler = QAction('PHP', self)
+        phpCompiler.setData('php.png')
         phpCompiler.setStatusTip('Download PHP Compiler')
         phpCompiler.triggered.connect(lambda: QDesktopServices.openUrl(QUrl('https://www.php.net/downloads')))
 
-        jsCompiler = QAction(QIcon('javascript.png'),'JavaScript', self)
+        jsCompiler = QAction('JavaScript', self)
+        jsCompiler.setData('javascript.png')
         jsCompiler.setStatusTip('Download JavaScript Compiler')
         jsCompiler.triggered.connect(lambda: QDesktopServices.openUrl(QUrl('https://nodejs.org/en/download/package-manager')))
 
@@ -306,100 +3982,442 @@ class MainWindow(QMainWindow):
     def newFile(self):
         text, ok = QInputDialog.getText(self, 'New File', 'Enter file name:')
         if ok and text:
-            self.currentFile = os.path.join(self.projectPath, text)
-            with open(self.currentFile, 'w') as f:
+            fileName = os.path.join(self.projectPath, text)
+            with open(fileName, 'w') as f:
                 f.write('')
-            self.editor.setText("")
-            self.setWindowTitle(f"ScriptBliss - {self.currentFile}")
-            self.treeView.setRootIndex(self.fileSystemModel.index(self.projectPath))
+            self.loadFile(fileName)
+            # Looking the path up adds it to the model, the rest of the tree stays as it is
+            self.treeView.setCurrentIndex(self.treeFilter.mapFromSource(self.fileSystemModel.index(fileName)))
 
     def openFileDialog(self):
         options = QFileDialog.Options()
         fileName, _ = QFileDialog.getOpenFileName(self, "Open File", self.projectPath,
-                                                  "All Files (*);;Python Files (*.py);;Java Files (*.java);;HTML Files (*.html);;JavaScript Files (*.js);;CSS Files (*.css);;C++ Files (*.cpp);;Ruby Files (*.rb);;Image Files (*.png *.jpg *.jpeg *.bmp *.gif)", options=options)
+                                                  "All Files (*);;Python Files (*.py);;Java Files (*.java);;HTML Files (*.html);;PHP Files (*.php);;JavaScript Files (*.js);;CSS Files (*.css);;C++ Files (*.cpp);;Ruby Files (*.rb);;Image Files (*.png *.jpg *.jpeg *.bmp *.gif)", options=options)
         if fileName:
             self.loadFile(fileName)
 
     def openFolderDialog(self):
         folder = QFileDialog.getExistingDirectory(self, "Open Folder", QDir.currentPath())
         if folder:
-            self.projectPath = folder
-            self.fileSystemModel.setRootPath(folder)
-            self.treeView.setRootIndex(self.fileSystemModel.index(folder))
+            self.openProject(folder)
+
+    def openProject(self, folder):
+        self.projectPath = folder
+        self.terminalSession.setCwd(folder)
+        self.treeFilter.setRoot(folder)
+        self.fileSystemModel.setRootPath(folder)
+        self.treeView.setRootIndex(self.treeFilter.mapFromSource(self.fileSystemModel.index(folder)))
+        self.git.setWorkTree(folder)
+        self.resetGitMarkers()
+        self.symbolIndex.setRoot(folder)
+        self.projectIndex.setRoot(folder)
+        self.recoverJournals()
+
+    def goToFile(self):
+        def search(text):
+            return [(f"{os.path.basename(path)}    {os.path.dirname(path)}", path, path)
+                    for path in self.projectIndex.search(text)]
+        dialog = QuickOpenDialog("Go to File", search, self, self.projectIndex.searching)
+        if dialog.exec_() == QDialog.Accepted:
+            self.loadFile(os.path.join(self.projectIndex.root, dialog.value))
+
+    def showFindInFiles(self):
+        self.bottomTabWidget.setCurrentWidget(self.findPanel)
+        if self.editor.hasSelectedText() and '\n' not in self.editor.selectedText():
+            self.findPanel.input.setText(self.editor.selectedText())
+        self.findPanel.input.setFocus()
+        self.findPanel.input.selectAll()
+
+    def goToSymbol(self):
+        def search(text):
+            return [(f"{name}    {path}:{line + 1}", f"{container}.{name}" if container else name,
+                     (path, line)) for name, kind, path, line, container in self.symbolIndex.search(text)]
+        dialog = QuickOpenDialog("Go to Symbol in Workspace", search, self)
+        if dialog.exec_() == QDialog.Accepted:
+            path, line = dialog.value
+            self.loadFile(os.path.join(self.symbolIndex.root, path), line)
+
+    def goToDefinition(self):
+        line, index = self.editor.getCursorPosition()
+        word = self.editor.wordAtLineIndex(line, index)
+        rows = self.symbolIndex.definitions(word) if word else []
+        if not rows:
+            self.statusBar().showMessage(f"No definition found for {word}" if word else "No name under the cursor", 3000)
+            return
+        if len(rows) > 1:
+            # Definitions in the current file are the likeliest target
+            current = self.symbolIndex.relativePath(self.currentFile)
+            rows.sort(key=lambda row: row[2] != current)
 
-    def loadFile(self, fileName):
-        self.currentFile = fileName
+            def search(text):
+                return [(f"{container}.{name}    {path}:{line + 1}" if container else f"{name}    {path}:{line + 1}",
+                         kind, (path, line)) for name, kind, path, line, container in rows
+                        if text.lower() in f"{container} {path}".lower()]
+            dialog = QuickOpenDialog(f"Definitions of {word}", search, self)
+            if dialog.exec_() != QDialog.Accepted:
+                return
+            path, line = dialog.value
+        else:
+            path, line = rows[0][2], rows[0][3]
+        self.loadFile(os.path.join(self.symbolIndex.root, path), line)
+
+    def goToLine(self, line):
+        self.editor.setCursorPosition(line, 0)
+        self.editor.ensureLineVisible(line)
+        self.editor.setFocus()
+
+    def updateOutline(self):
+        if self.currentBuffer is None or not self.currentFile.endswith('.py'):
+            self.outlineView.clear()
+            return
+        self.outlineView.setSymbols(self.symbolIndex.outline(self.currentFile))
+
+    def onSymbolsUpdated(self, paths):
+        if self.symbolIndex.relativePath(self.currentFile) in paths:
+            self.updateOutline()
+
+    @timed('loadFile')
+    def loadFile(self, fileName, line=None):
         if fileName.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+            self.stopLoader()
+            self.currentFile = fileName
+            self.outlineView.clear()
             self.displayImage(fileName)
-        else:
-            with open(fileName, 'r') as f:
-                code = f.read()
-                self.editor.setText(code)
-                self.setWindowTitle(f"ScriptBliss - {fileName}")
-
-            # Set the appropriate lexer based on the file extensiondasdasd
-            if fileName.endswith('.py'):
-                lexer = QsciLexerPython()
-            elif fileName.endswith('.java'):
-                lexer = QsciLexerJava()
-            elif fileName.endswith('.html'):
-                lexer = QsciLexerHTML()
-            elif fileName.endswith('.js'):
-                lexer = QsciLexerJavaScript()
-            elif fileName.endswith('.css'):
-                lexer = QsciLexerCSS()
-            elif fileName.endswith('.cpp'):
-                lexer = QsciLexerCPP()
-            elif fileName.endswith('.rb'):
-                lexer = QsciLexerRuby()
+            return
+
+        # Restore the editor pane if an image was being shown
+        if self.splitter1.widget(1) != self.editorPane:
+            self.splitter1.replaceWidget(1, self.editorPane)
+
+        buffer = self.buffers.get(fileName)
+        if buffer is None:
+            buffer = Buffer(fileName)
+            self.buffers.add(buffer)
+            self.fileWatcher.watch(fileName)
+            self.addBufferTab(fileName)
+        self.activateBuffer(buffer)
+        self.updateOutline()
+        if line is not None:
+            if self.loader is not None:
+                # Applied by onLoaderFinished once the whole file is in
+                buffer.cursor = (line, 0)
             else:
-                lexer = None
+                self.goToLine(line)
+
+    def activateBuffer(self, buffer):
+        if buffer is self.currentBuffer and buffer.document is not None:
+            self.currentFile = buffer.fileName
+            self.setWindowTitle(f"ScriptBliss - {buffer.fileName}")
+            return
+
+        self.stopLoader()
+        self.storeBufferState()
+        self.currentBuffer = buffer
+        self.currentFile = buffer.fileName
+        self.buffers.touch(buffer)
+        self.selectBufferTab(buffer.fileName)
+
+        if buffer.lexer is None:
+            buffer.lexer = self.lexers.lexerFor(buffer.fileName)
+
+        if buffer.document is not None:
+            self.showDocument(buffer.document, self.bufferLexer(buffer))
+            self.applyEditorFeatures()
+            if not buffer.modified:
+                # Saved while another buffer was shown
+                self.editor.setModified(False)
+            self.editor.setEolMode(buffer.eolMode)
+            self.editor.setCursorPosition(*buffer.cursor)
+            self.editor.setFirstVisibleLine(buffer.firstVisibleLine)
+            self.setWindowTitle(f"ScriptBliss - {buffer.fileName}")
+            self.updateGitMarkers()
+            if buffer.diskChanged:
+                self.onFileChangedOnDisk(buffer.fileName)
+            return
+
+        try:
+            buffer.large = buffer.large or os.path.getsize(buffer.fileName) > self.largeFileBytes
+        except OSError:
+            pass
+
+        # The file is read on a worker thread and appended chunk by chunk, so the editor
+        # stays read-only and does not record undo steps or send change notifications until
+        # the whole file is in.
+        buffer.document = QsciDocument()
+        self.editor.setDocument(buffer.document)
+        self.editor.setLexer(self.bufferLexer(buffer))
+        self.applyEditorFeatures()
+        self.editor.setReadOnly(True)
+        self.editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, False)
+        self.editor.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, 0)
+        self.setWindowTitle(f"ScriptBliss - Loading {buffer.fileName}...")
+        self.loadProgress.setValue(0)
+        self.loadProgress.show()
+        self.cancelLoadButton.show()
+
+        self.loader = FileLoader(buffer.fileName, self)
+        self.loader.startTime = time.perf_counter()
+        self.loader.chunkLoaded.connect(self.onLoaderChunk)
+        self.loader.restarted.connect(self.onLoaderRestarted)
+        self.loader.progress.connect(self.onLoaderProgress)
+        self.loader.loaded.connect(self.onLoaderFinished)
+        self.loader.failed.connect(self.onLoaderFailed)
+        self.loader.finished.connect(self.loader.deleteLater)
+        self.loader.start()
+
+    def showDocument(self, document, lexer):
+        # Each document keeps the lexer it was styled with, but setLexer() restyles the whole
+        # document it is attached to. Switching the shared lexer while an empty document is shown
+        # makes coming back to a large buffer cost only the visible lines.
+        self.recordPendingInsert()
+        if self.editor.lexer() is not lexer:
+            self.editor.setDocument(self.lexerSwitchDocument)
+            self.editor.setLexer(lexer)
+        self.editor.setDocument(document)
+
+    def bufferLexer(self, buffer):
+        return None if buffer.reducedFeatures else buffer.lexer
+
+    def applyEditorFeatures(self):
+        # Large files get a plain editor: Scintilla styles everything up to the first visible
+        # line when scrolling, and brace matching and the caret line redo work on every move.
+        # Change notifications go too, QScintilla counts the characters from the start of the
+        # document up to every edit for them, which alone takes a quarter second per keystroke
+        # in the middle of a 60 MB file. The ones sent before an edit do not have that cost
+        # and are all the edit journal needs.
+        buffer = self.currentBuffer
+        self.reducedFeatures = buffer is not None and buffer.reducedFeatures
+        self.editor.setBraceMatching(QsciScintilla.NoBraceMatch if self.reducedFeatures else QsciScintilla.SloppyBraceMatch)
+        self.editor.setCaretLineVisible(not self.reducedFeatures)
+        if self.loader is None:
+            self.editor.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK,
+                                      self.JOURNAL_EVENTS if self.reducedFeatures else QsciScintilla.SC_MODEVENTMASKALL)
+        digits = max(5, len(str(self.editor.lines())))
+        self.editor.setMarginWidth(0, QFontMetrics(self.editor.font()).width('0' * digits) + 6)
+        self.largeFileButton.blockSignals(True)
+        self.largeFileButton.setVisible(buffer is not None and buffer.large)
+        self.largeFileButton.setChecked(self.reducedFeatures)
+        self.largeFileButton.blockSignals(False)
+
+    def setLargeFileMode(self, enabled):
+        buffer = self.currentBuffer
+        if buffer is None:
+            return
+        buffer.fullFeatures = not enabled
+        if not enabled and buffer.words is None and buffer.document is not None:
+            self.indexBufferWords(buffer)
+        if buffer.document is not None:
+            self.showDocument(buffer.document, self.bufferLexer(buffer))
+        self.applyEditorFeatures()
+        self.updateGitMarkers()
+
+    def storeBufferState(self):
+        self.updateBufferWords()
+        buffer = self.currentBuffer
+        if buffer is None or buffer.document is None:
+            return
+        buffer.cursor = self.editor.getCursorPosition()
+        buffer.firstVisibleLine = self.editor.firstVisibleLine()
+        buffer.modified = self.editor.isModified()
+        # Text plus one style byte per character
+        buffer.memory = self.editor.length() * 2
+
+    def addBufferTab(self, fileName):
+        self.bufferTabs.blockSignals(True)
+        index = self.bufferTabs.addTab(os.path.basename(fileName))
+        self.bufferTabs.setTabData(index, fileName)
+        self.bufferTabs.setTabToolTip(index, fileName)
+        self.bufferTabs.blockSignals(False)
+        return index
+
+    def selectBufferTab(self, fileName):
+        for index in range(self.bufferTabs.count()):
+            if self.bufferTabs.tabData(index) == fileName:
+                self.bufferTabs.blockSignals(True)
+                self.bufferTabs.setCurrentIndex(index)
+                self.bufferTabs.blockSignals(False)
+                return index
+        return -1
+
+    def updateBufferTab(self, modified):
+        if self.currentBuffer is None:
+            return
+        self.setBufferTabModified(self.currentBuffer.fileName, modified)
+
+    def setBufferTabModified(self, fileName, modified):
+        for index in range(self.bufferTabs.count()):
+            if self.bufferTabs.tabData(index) == fileName:
+                name = os.path.basename(fileName)
+                self.bufferTabs.setTabText(index, f"{name} *" if modified else name)
+
+    def onBufferTabChanged(self, index):
+        if index >= 0:
+            self.loadFile(self.bufferTabs.tabData(index))
+
+    def onBufferTabCloseRequested(self, index):
+        self.closeBuffer(self.bufferTabs.tabData(index))
+
+    def closeCurrentBuffer(self):
+        if self.currentBuffer is not None:
+            self.closeBuffer(self.currentBuffer.fileName)
+
+    def closeBuffer(self, fileName, force=False):
+        buffer = self.buffers.get(fileName)
+        if buffer is None:
+            return True
+        if buffer is self.currentBuffer:
+            self.storeBufferState()
+        if buffer.modified and not force:
+            answer = QMessageBox.question(self, 'Close File', f'Save changes to "{fileName}"?',
+                                          QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
+            if answer == QMessageBox.Cancel:
+                return False
+            if answer == QMessageBox.Save:
+                self.activateBuffer(buffer)
+                self.saveFileDialog()
+                if self.loader is not None:
+                    return False
+
+        self.recordPendingInsert()
+        if buffer.journal is not None and not buffer.journal.saving:
+            buffer.journal.discard()
+        if buffer.recovery is not None:
+            self.discardRecovery(buffer)
+        if buffer is self.currentBuffer:
+            self.stopLoader()
+            self.currentBuffer = None
+            self.currentFile = ''
+            self.showDocument(self.scratchDocument, self.lexers.lexer('python'))
+            self.applyEditorFeatures()
+            self.setWindowTitle("ScriptBliss")
+            self.outlineView.clear()
+        self.buffers.remove(fileName)
+        self.fileWatcher.unwatch(fileName)
+        self.bufferTabs.blockSignals(True)
+        self.bufferTabs.removeTab(self.selectBufferTab(fileName))
+        self.bufferTabs.blockSignals(False)
+        if self.currentBuffer is None and self.bufferTabs.count():
+            self.onBufferTabChanged(self.bufferTabs.currentIndex())
+        return True
 
-            if lexer:
-                lexer.setDefaultFont(QFont("Consolas", 10))
-                self.editor.setLexer(lexer)
+    def renameBuffer(self, oldName, newName):
+        buffer = self.buffers.rename(oldName, newName)
+        if buffer is None:
+            return
+        self.fileWatcher.unwatch(oldName)
+        self.fileWatcher.watch(newName)
+        index = self.selectBufferTab(oldName)
+        self.bufferTabs.setTabData(index, newName)
+        self.bufferTabs.setTabToolTip(index, newName)
+        self.setBufferTabModified(newName, self.editor.isModified() if buffer is self.currentBuffer else buffer.modified)
+        if buffer.journal is not None:
+            self.recordPendingInsert()
+            try:
+                buffer.journal.moveTo(self.journalPath(newName), newName)
+            except OSError:
+                pass
+        buffer.headText = None
+        if buffer is self.currentBuffer:
+            self.currentFile = newName
+            self.setWindowTitle(f"ScriptBliss - {newName}")
+            self.updateGitMarkers()
+        else:
+            self.selectBufferTab(self.currentFile)
+
+    def onLoaderChunk(self, text):
+        if self.sender() is not self.loader:
+            return
+        self.editor.append(text)
+        self.loader.chunkConsumed()
+
+    def onLoaderRestarted(self):
+        if self.sender() is self.loader:
+            self.editor.clear()
+
+    def onLoaderProgress(self, percent):
+        if self.sender() is self.loader:
+            self.loadProgress.setValue(percent)
+
+    def onLoaderFinished(self):
+        loader = self.sender()
+        if loader is not self.loader:
+            return
+        self.loader = None
+        buffer = self.currentBuffer
+        buffer.encoding = loader.encoding
+        buffer.stamp = loader.stamp
+        buffer.eolMode = QsciScintilla.EolWindows if loader.windowsEol else QsciScintilla.EolUnix
+        self.editor.setEolMode(buffer.eolMode)
+        self.endLoad()
+        if not buffer.large and self.editor.lines() > self.largeFileLines:
+            buffer.large = True
+            self.showDocument(buffer.document, self.bufferLexer(buffer))
+        self.applyEditorFeatures()
+        self.editor.setModified(False)
+        if not buffer.reducedFeatures:
+            self.indexBufferWords(buffer)
+        if buffer.recovery is not None:
+            self.replayJournal(buffer)
+        self.updateGitMarkers()
+        self.editor.setCursorPosition(*buffer.cursor)
+        self.editor.setFirstVisibleLine(buffer.firstVisibleLine)
+        self.editor.ensureLineVisible(buffer.cursor[0])
+        self.storeBufferState()
+        self.buffers.evict(keep=buffer)
+        self.setWindowTitle(f"ScriptBliss - {loader.fileName}")
+        if profiler.enabled:
+            profiler.record('loadFile.read', loader.startTime, time.perf_counter(), 'io', Profiler.TID_IO,
+                            {'file': loader.fileName})
+
+    def onLoaderFailed(self, message):
+        loader = self.sender()
+        if loader is not self.loader:
+            return
+        self.stopLoader()
+        self.closeBuffer(loader.fileName, force=True)
+        QMessageBox.critical(self, "Error", f"Failed to open file: {message}")
+
+    def stopLoader(self):
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+            self.endLoad()
+            # Drop the partial document, the file is read again when the buffer is reopened
+            if self.currentBuffer is not None:
+                self.currentBuffer.document = None
+                self.showDocument(self.scratchDocument, self.lexers.lexer('python'))
+
+    def cancelLoad(self):
+        if self.loader is not None:
+            fileName = self.loader.fileName
+            self.stopLoader()
+            # A partially loaded buffer must never be saved over the original file
+            self.closeBuffer(fileName, force=True)
 
-            # Restore the original self.editor if needed
-            if self.splitter1.widget(1) != self.editor:
-                self.splitter1.replaceWidget(1, self.editor)
+    def endLoad(self):
+        self.editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, True)
+        self.editor.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, QsciScintilla.SC_MODEVENTMASKALL)
+        self.editor.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
+        self.editor.setReadOnly(False)
+        self.loadProgress.hide()
+        self.cancelLoadButton.hide()
 
+    @timed('displayImage')
     def displayImage(self, fileName):
-        pixmap = QPixmap(fileName)
-        self.imageViewer.setPixmap(pixmap)
-        try:
-            pixmap = QPixmap(fileName)
-            imageLabel = QLabel()
-            imageLabel.setPixmap(pixmap)
-            imageLabel.setAlignment(Qt.AlignCenter)
-            imageLabel.setStyleSheet("background-color: #1e1e3e;")
-
-            # Create a new QWidget to hold the imageLabel
-            imageWidget = QWidget()
-            layout = QVBoxLayout(imageWidget)
-            layout.addWidget(imageLabel)
-            layout.setContentsMargins(0, 0, 0, 0)
-
-            # Create a new QsciScintilla object to display the image
-            imageEditor = QsciScintilla()
-            imageEditor.setReadOnly(True)
-            imageEditor.setText("")
-            imageEditor.setMarginWidth(0, 0)
-            imageEditor.setMarginWidth(1, 0)
-            imageEditor.setMarginWidth(2, 0)
-            imageEditor.setMinimumSize(pixmap.width(), pixmap.height())
-            imageEditor.viewport().setBackgroundRole(QPalette.Dark)
-            imageEditor.viewport().setAutoFillBackground(True)
-
-            # Replace self.editor with the imageEditor
+        if self.imageViewer is None:
+            self.imageViewer = ImageViewer(settings().value('images/cacheMB', 64, type=int) * 1024 * 1024)
+            self.imageViewer.failed.connect(
+                lambda message: QMessageBox.critical(self, "Error", f"Failed to display image: {message}"))
+        if self.splitter1.widget(1) is not self.imageViewer:
             self.splitter1.replaceWidget(1, self.imageViewer)
-            self.imageEditor = imageEditor
-            self.imageWidget = imageWidget
-            self.imageEditor.setViewport(self.imageWidget)
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to display image: {str(e)}")
+        self.imageViewer.setImage(fileName)
+        self.setWindowTitle(f"ScriptBliss - {fileName}")
 
+    @timed('saveFileDialog')
     def saveFileDialog(self):
+        if self.loader is not None:
+            self.statusBar().showMessage("Wait for the file to finish loading before saving.", 3000)
+            return
         if self.currentFile:
             fileName = self.currentFile
         else:
@@ -407,137 +4425,682 @@ class MainWindow(QMainWindow):
             fileName, _ = QFileDialog.getSaveFileName(self, "Save File", self.projectPath,
                                                       "All Files (*);;Python Files (*.py);;Java Files (*.java);;HTML Files (*.html);;JavaScript Files (*.js);;CSS Files (*.css);;C++ Files (*.cpp);;Ruby Files (*.rb)", options=options)
         if fileName:
-            with open(fileName, 'w') as f:
-                code = self.editor.text()
-                f.write(code)
+            if fileName in self.savers:
+                self.statusBar().showMessage(f"Still saving {fileName}.", 3000)
+                return
+            buffer = self.currentBuffer
+            if buffer is not None and buffer.fileName == fileName and buffer.stamp is not None:
+                try:
+                    stamp = fileStamp(os.stat(fileName))
+                except OSError:
+                    stamp = buffer.stamp
+                if stamp != buffer.stamp and QMessageBox.question(
+                        self, 'Save File', f'"{fileName}" changed on disk since it was opened. Overwrite it?',
+                        QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+                    return
+            encoding = buffer.encoding if buffer else 'utf-8'
+            self.recordPendingInsert()
+            if buffer is None or buffer.fileName != fileName:
+                # Saved under a new name, the old buffer goes back to what is on disk
+                if buffer is not None and buffer.journal is not None:
+                    buffer.journal.discard()
+                    buffer.journal = None
+                self.adoptEditorDocument(fileName)
+                buffer = self.currentBuffer
+                buffer.encoding = encoding
+            if buffer.journal is None:
+                buffer.journal = EditJournal(self.journalPath(fileName), fileName)
+            else:
+                buffer.journal.flush()
+            buffer.journal.saving = True
+            # The text is copied here and encoded and written by the saver. bytes() ends with a NUL.
+            length = self.editor.length()
+            saver = FileSaver(fileName, memoryview(self.editor.bytes(0, length))[:length], encoding, self)
+            saver.journal = buffer.journal
+            saver.changes = buffer.changes
+            saver.startTime = time.perf_counter()
+            saver.saved.connect(self.onFileSaved)
+            saver.failed.connect(self.onSaveFailed)
+            self.savers[fileName] = saver
+            saver.start()
+            self.statusBar().showMessage(f"Saving {fileName}...")
             self.currentFile = fileName
             self.setWindowTitle(f"ScriptBliss - {fileName}")
 
+    def onFileSaved(self):
+        saver = self.sender()
+        self.savers.pop(saver.fileName, None)
+        saver.journal.rebase(saver.stamp)
+        buffer = self.buffers.get(saver.fileName)
+        if buffer is not None and buffer.journal is saver.journal:
+            buffer.stamp = saver.stamp
+            # Edits made while the file was written are still unsaved
+            if buffer.changes == saver.changes:
+                buffer.modified = False
+                if buffer is self.currentBuffer:
+                    self.editor.setModified(False)
+                else:
+                    self.setBufferTabModified(buffer.fileName, False)
+            elif buffer.journal.records:
+                self.journalTimer.start()
+        self.statusBar().showMessage(f"Saved {saver.fileName}", 3000)
+        self.git.scheduleRefresh()
+        if os.path.basename(saver.fileName) == '.gitignore':
+            self.treeFilter.reload()
+        if os.path.splitext(saver.fileName)[1].lower() in SOURCE_EXTENSIONS:
+            self.symbolIndex.refresh()
+        if profiler.enabled:
+            profiler.record('saveFile.write', saver.startTime, time.perf_counter(), 'io', Profiler.TID_IO,
+                            {'file': saver.fileName})
+
+    def onSaveFailed(self, message):
+        saver = self.sender()
+        self.savers.pop(saver.fileName, None)
+        # The edits up to the save are still in the journal, those made since follow them
+        saver.journal.saving = False
+        try:
+            saver.journal.flush()
+        except OSError:
+            pass
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", f"Failed to save {saver.fileName}: {message}")
+
+    def onFileChangedOnDisk(self, fileName):
+        buffer = self.buffers.get(fileName)
+        # Buffers that are not loaded read the new contents when they are shown
+        if buffer is None or buffer.document is None or buffer.stamp is None or fileName in self.savers:
+            return
+        try:
+            stamp = fileStamp(os.stat(fileName))
+        except OSError:
+            # Deleted or being replaced, saving writes it again
+            return
+        if stamp == buffer.stamp or stamp == buffer.declinedStamp:
+            buffer.diskChanged = False
+            return
+        if buffer is not self.currentBuffer:
+            buffer.diskChanged = True
+            return
+        if self.loader is not None:
+            return
+        buffer.diskChanged = False
+        if self.editor.isModified():
+            answer = QMessageBox.question(self, 'File Changed',
+                                          f'"{fileName}" changed on disk. Reload it? Undo brings back your '
+                                          'unsaved changes.', QMessageBox.Yes | QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                buffer.declinedStamp = stamp
+                return
+        self.reloadBuffer(buffer)
+
+    def reloadBuffer(self, buffer):
+        if buffer.fileName in self.differs:
+            self.differs[buffer.fileName].cancel()
+        # The diff runs in the process pool, only the changed hunks are applied to the document
+        length = self.editor.length()
+        differ = PoolJob(diffFile, (buffer.fileName, bytes(memoryview(self.editor.bytes(0, length))[:length])), self)
+        differ.fileName = buffer.fileName
+        differ.changes = buffer.changes
+        differ.finished.connect(self.onFileDiffed)
+        self.differs[buffer.fileName] = differ
+        differ.start()
+
+    def onFileDiffed(self):
+        differ = self.sender()
+        differ.deleteLater()
+        if self.differs.get(differ.fileName) is not differ:
+            return
+        del self.differs[differ.fileName]
+        if differ.error is not None:
+            if differ.brokenPool:
+                shutdownProcessPool()
+            self.statusBar().showMessage(f"Could not reload {differ.fileName}: {differ.error}", 5000)
+            return
+        buffer = self.buffers.get(differ.fileName)
+        if buffer is None or buffer.document is None:
+            return
+        if buffer is not self.currentBuffer or self.loader is not None:
+            buffer.diskChanged = True
+            return
+        if buffer.changes != differ.changes:
+            # Edited while the diff ran, it is out of date
+            self.reloadBuffer(buffer)
+            return
+        self.applyReload(buffer, differ.result)
+
+    def applyReload(self, buffer, result):
+        hunks = result['hunks']
+        top = self.editor.firstVisibleLine()
+        if hunks:
+            # Keeps the same text at the top of the view
+            top += sum(count - (end - start) for start, end, _, count in hunks if end <= top)
+            self.editor.beginUndoAction()
+            for start, end, text, _ in reversed(hunks):
+                startPos, endPos = (self.editor.length() if line >= result['lines'] else
+                                    self.editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line)
+                                    for line in (start, end))
+                self.editor.SendScintilla(QsciScintilla.SCI_SETTARGETRANGE, startPos, endPos)
+                self.editor.SendScintilla(QsciScintilla.SCI_REPLACETARGET, len(text), text)
+            self.editor.endUndoAction()
+            self.editor.setFirstVisibleLine(top)
+        buffer.stamp = result['stamp']
+        buffer.declinedStamp = None
+        buffer.encoding = result['encoding']
+        buffer.eolMode = QsciScintilla.EolWindows if result['windowsEol'] else QsciScintilla.EolUnix
+        self.editor.setEolMode(buffer.eolMode)
+        self.editor.setModified(False)
+        if buffer.journal is not None:
+            self.recordPendingInsert()
+            buffer.journal.discard()
+            buffer.journal = None
+        self.storeBufferState()
+        self.statusBar().showMessage(f"Reloaded {buffer.fileName}, {len(hunks)} changed "
+                                     f"{'hunk' if len(hunks) == 1 else 'hunks'}", 3000)
+
+    def journalPath(self, fileName):
+        import hashlib
+        name = hashlib.sha1(os.path.abspath(fileName).encode()).hexdigest()
+        return projectCacheDir(self.projectPath, 'journal', name + '.journal')
+
+    def onEditorModified(self, position, modificationType, text, length, *args):
+        if not modificationType & self.JOURNAL_EVENTS:
+            return
+        self.recordPendingInsert()
+        buffer = self.currentBuffer
+        if buffer is None or buffer.document is None or self.loader is not None or self.replayingJournal:
+            return
+        buffer.changes += 1
+        if buffer.headText is not False:
+            self.gitDiffTimer.start()
+        if buffer.words is not None:
+            self.dirtyLines.add(self.editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, position))
+            self.wordTimer.start()
+        if buffer.journal is None:
+            buffer.journal = EditJournal(self.journalPath(buffer.fileName), buffer.fileName, buffer.stamp)
+        if modificationType & QsciScintilla.SC_MOD_BEFOREINSERT:
+            self.pendingInsert = (buffer.journal, position, length)
+        else:
+            buffer.journal.delete(position, length)
+        if not self.journalTimer.isActive():
+            self.journalTimer.start()
+
+    def recordPendingInsert(self):
+        if self.pendingInsert is None:
+            return
+        journal, position, length = self.pendingInsert
+        self.pendingInsert = None
+        data = bytes(self.editor.bytes(position, position + length))[:length]
+        journal.insert(position, data)
+        if b'\n' in data and self.currentBuffer is not None:
+            # Pasted lines, only the first one is in dirtyLines
+            self.addBufferWords(self.currentBuffer, WORD_PATTERN.findall(data.decode('utf-8', errors='replace')))
+
+    def completionWords(self, prefix, limit):
+        words = []
+        buffer = self.currentBuffer
+        if buffer is not None and buffer.words:
+            index = bisect.bisect_left(buffer.words, prefix)
+            while index < len(buffer.words) and len(words) < limit and buffer.words[index].startswith(prefix):
+                words.append(buffer.words[index])
+                index += 1
+        if len(words) < limit:
+            seen = set(words)
+            words += [word for word in self.symbolIndex.words(prefix, limit) if word not in seen]
+        return words[:limit]
+
+    def indexBufferWords(self, buffer):
+        buffer.words = []
+        job = PoolJob(collectWords, (buffer.fileName,), self)
+        job.fileName = buffer.fileName
+        job.finished.connect(self.onBufferWordsIndexed)
+        self.wordJobs[buffer.fileName] = job
+        job.start()
+
+    def onBufferWordsIndexed(self):
+        job = self.sender()
+        job.deleteLater()
+        if self.wordJobs.get(job.fileName) is not job:
+            return
+        del self.wordJobs[job.fileName]
+        if job.brokenPool:
+            shutdownProcessPool()
+        buffer = self.buffers.get(job.fileName)
+        if buffer is not None and buffer.words is not None and job.result is not None:
+            # Words added while the file was indexed stay
+            buffer.words = sorted(set(buffer.words).union(job.result))
+
+    def addBufferWords(self, buffer, words):
+        if buffer.words is None:
+            return
+        for word in words:
+            index = bisect.bisect_left(buffer.words, word)
+            if index == len(buffer.words) or buffer.words[index] != word:
+                buffer.words.insert(index, word)
+
+    def updateBufferWords(self):
+        self.recordPendingInsert()
+        lines, self.dirtyLines = self.dirtyLines, set()
+        buffer = self.currentBuffer
+        if buffer is None or buffer.words is None or buffer.document is None:
+            return
+        caretLine, caretIndex = self.editor.getCursorPosition()
+        words = []
+        for line in lines:
+            if line >= self.editor.lines():
+                continue
+            for match in WORD_PATTERN.finditer(self.editor.text(line)):
+                # The word being typed is not finished yet
+                if line != caretLine or not match.start() <= caretIndex <= match.end():
+                    words.append(match.group())
+        self.addBufferWords(buffer, words)
+
+    def onSavePointChanged(self, modified):
+        # Undoing back to the saved text leaves nothing to recover
+        buffer = self.currentBuffer
+        if not modified and buffer is not None and buffer.journal is not None and not buffer.journal.saving:
+            self.recordPendingInsert()
+            buffer.journal.discard()
+
+    def flushJournals(self):
+        self.recordPendingInsert()
+        for buffer in self.buffers:
+            if buffer.journal is not None:
+                try:
+                    buffer.journal.flush()
+                except OSError as e:
+                    self.statusBar().showMessage(f"Could not write the recovery journal: {e}", 5000)
+
+    def recoverJournals(self):
+        directory = projectCacheDir(self.projectPath, 'journal')
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith('.journal'))
+        except OSError:
+            return
+        recoverable, stale = [], []
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                header, edits, end = EditJournal.read(path)
+                fileName = header['file']
+                current = fileStamp(os.stat(fileName)) if os.path.exists(fileName) else None
+            except (OSError, ValueError, KeyError):
+                edits = None
+            if not edits:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if fileName in [buffer.fileName for buffer in self.buffers]:
+                continue
+            if current != header['base']:
+                stale.append((path, fileName))
+            else:
+                recoverable.append((path, fileName, header['base'], edits, end))
+        if stale:
+            QMessageBox.warning(self, "Recover Unsaved Changes",
+                                "These files changed on disk after they were last edited here, so their unsaved "
+                                "changes cannot be restored:\n\n" + '\n'.join(fileName for _, fileName in stale))
+            for path, _ in stale:
+                os.remove(path)
+        if not recoverable:
+            return
+        answer = QMessageBox.question(self, "Recover Unsaved Changes",
+                                      "ScriptBliss closed with unsaved changes to:\n\n"
+                                      + '\n'.join(fileName for _, fileName, _, _, _ in recoverable)
+                                      + "\n\nRestore them?", QMessageBox.Yes | QMessageBox.No)
+        for path, fileName, base, edits, end in recoverable:
+            if answer != QMessageBox.Yes:
+                os.remove(path)
+                continue
+            # Replayed when the buffer is first shown
+            buffer = Buffer(fileName)
+            buffer.recovery = (path, base, edits, end)
+            buffer.modified = True
+            self.buffers.add(buffer)
+            self.fileWatcher.watch(fileName)
+            self.addBufferTab(fileName)
+            self.setBufferTabModified(fileName, True)
+        if answer == QMessageBox.Yes:
+            self.loadFile(recoverable[0][1])
+
+    def readSession(self):
+        try:
+            with open(sessionPath(), encoding='utf-8') as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if session.get('version') != 1 or not os.path.isdir(session.get('project', '')):
+            return None
+        return session
+
+    def restoreSession(self, session):
+        # Buffers come back unloaded, like evicted ones, and only the current one is read now.
+        # The others are read when they are first shown.
+        # The tab bar lays itself out again for every tab added while it is shown
+        self.bufferTabs.hide()
+        for entry in session['buffers']:
+            fileName = entry['file']
+            if not os.path.isfile(fileName):
+                continue
+            buffer = self.buffers.get(fileName)
+            if buffer is None:
+                buffer = Buffer(fileName)
+                self.buffers.add(buffer)
+                self.fileWatcher.watch(fileName)
+                self.addBufferTab(fileName)
+            elif buffer.document is not None and self.loader is None:
+                # Shown already by journal recovery
+                continue
+            buffer.cursor = tuple(entry['cursor'])
+            buffer.firstVisibleLine = entry['top']
+            buffer.fullFeatures = entry['fullFeatures']
+        self.bufferTabs.show()
+        self.lastRunTarget = session['runTarget']
+        if self.buffers.get(session['current']) is not None:
+            self.loadFile(session['current'])
+        # Parents first, a folder can only be expanded once its parent is listed
+        for relPath in sorted(session['expanded'], key=lambda relPath: relPath.count(os.sep)):
+            index = self.treeFilter.mapFromSource(self.fileSystemModel.index(os.path.join(self.projectPath, relPath)))
+            if index.isValid():
+                self.treeView.expand(index)
+
+    def saveSession(self):
+        if not self.startupDone:
+            return
+        if self.loader is None:
+            self.storeBufferState()
+        buffers = []
+        for index in range(self.bufferTabs.count()):
+            buffer = self.buffers.get(self.bufferTabs.tabData(index))
+            if buffer is not None:
+                buffers.append({'file': buffer.fileName, 'cursor': list(buffer.cursor), 'top': buffer.firstVisibleLine,
+                                'fullFeatures': buffer.fullFeatures})
+        session = {'version': 1, 'project': self.projectPath, 'current': self.currentFile, 'buffers': buffers,
+                   'expanded': self.expandedFolders(), 'runTarget': self.lastRunTarget}
+        text = json.dumps(session, separators=(',', ':'))
+        if text == self.sessionText:
+            return
+        path = sessionPath()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+            self.sessionText = text
+        except OSError:
+            pass
+
+    def expandedFolders(self):
+        # Only the expanded part of the tree is walked
+        folders = []
+        stack = [self.treeView.rootIndex()]
+        while stack:
+            parent = stack.pop()
+            for row in range(self.treeFilter.rowCount(parent)):
+                index = self.treeFilter.index(row, 0, parent)
+                if self.treeView.isExpanded(index):
+                    path = self.fileSystemModel.filePath(self.treeFilter.mapToSource(index))
+                    folders.append(os.path.relpath(path, self.projectPath))
+                    stack.append(index)
+        return folders
+
+    def replayJournal(self, buffer):
+        path, base, edits, end = buffer.recovery
+        buffer.recovery = None
+        if buffer.stamp != base:
+            os.remove(path)
+            QMessageBox.warning(self, "Recover Unsaved Changes",
+                                f"{buffer.fileName} changed on disk, its unsaved changes cannot be restored.")
+            return
+        self.replayingJournal = True
+        # One undo step takes the whole recovery back
+        self.editor.beginUndoAction()
+        for position, edit in edits:
+            if isinstance(edit, bytes):
+                self.editor.SendScintilla(QsciScintilla.SCI_INSERTTEXT, position, edit)
+                self.addBufferWords(buffer, WORD_PATTERN.findall(edit.decode('utf-8', errors='replace')))
+            else:
+                self.editor.SendScintilla(QsciScintilla.SCI_DELETERANGE, position, edit)
+        self.editor.endUndoAction()
+        self.replayingJournal = False
+        # New edits are appended to the same journal, minus a partial one left by the crash
+        os.truncate(path, end)
+        buffer.journal = EditJournal(path, buffer.fileName, base)
+
+    def discardRecovery(self, buffer):
+        try:
+            os.remove(buffer.recovery[0])
+        except OSError:
+            pass
+        buffer.recovery = None
+
+    def adoptEditorDocument(self, fileName):
+        # A file saved under a new name keeps the text that is in the editor as its buffer
+        self.closeBuffer(fileName, force=True)
+        self.storeBufferState()
+        buffer = Buffer(fileName)
+        buffer.document = self.editor.document()
+        if self.currentBuffer is None:
+            self.scratchDocument = QsciDocument()
+        elif self.currentBuffer.document is buffer.document:
+            self.currentBuffer.document = None
+        buffer.lexer = self.lexers.lexerFor(fileName)
+        self.editor.setLexer(buffer.lexer)
+        self.buffers.add(buffer)
+        self.fileWatcher.watch(fileName)
+        self.currentBuffer = buffer
+        self.addBufferTab(fileName)
+        self.selectBufferTab(fileName)
+        self.storeBufferState()
+
+    @timed('runCode')
     def runCode(self):
-        if self.currentFile:
-            # Clear the output and terminal before executing the code
-            self.console.clear()
-            self.terminal.clear()
-
-            if self.currentFile.endswith('.py'):
-                command = f'python "{self.currentFile}"'
-                self.process = QProcess()
-                self.process.setProcessChannelMode(QProcess.MergedChannels)
-                self.process.readyReadStandardOutput.connect(self.updateConsoleOutput)
-                self.process.readyReadStandardError.connect(self.updateConsoleOutput)
-                self.process.start(command)
-
-            elif self.currentFile.endswith('.java'):
-                compile_command = f'javac "{self.currentFile}"'
-                self.process = QProcess()
-                self.process.start(compile_command)
-                self.process.waitForFinished()
-                compile_output = self.process.readAllStandardOutput().data().decode()
-                compile_error = self.process.readAllStandardError().data().decode()
-
-                if compile_error:
-                    self.console.append(compile_error)
-                    return
+        # With nothing open, the file that ran last runs again
+        source = self.currentFile or self.lastRunTarget
+        if source:
+            ext = os.path.splitext(source)[1]
 
-                class_name = os.path.splitext(os.path.basename(self.currentFile))[0]
-                run_command = f'java -cp "{os.path.dirname(self.currentFile)}" {class_name}'
-                self.process = QProcess()
-                self.process.setProcessChannelMode(QProcess.MergedChannels)
-                self.process.readyReadStandardOutput.connect(self.updateConsoleOutput)
-                self.process.readyReadStandardError.connect(self.updateConsoleOutput)
-                self.process.start(run_command)
-
-            elif self.currentFile.endswith('.cpp'):
-                executable = self.currentFile[:-4]
-                compile_command = f'g++ "{self.currentFile}" -o "{executable}"'
-                run_command = f'"{executable}"'
-                self.process = QProcess()
-                self.process.setProcessChannelMode(QProcess.MergedChannels)
-                self.process.readyReadStandardOutput.connect(self.updateConsoleOutput)
-                self.process.readyReadStandardError.connect(self.updateConsoleOutput)
-
-                self.process.start(compile_command)
-                self.process.waitForFinished()
-                compile_output = self.process.readAllStandardOutput().data().decode()
-                compile_error = self.process.readAllStandardError().data().decode()
-
-                if compile_error:
-                    self.console.append(compile_error)
-                    return
+            if RunPlan.supports(source):
+                self.runFile(source)
 
-                self.process.start(run_command)
-
-            elif self.currentFile.endswith('.rb'):
-                command = f'ruby "{self.currentFile}"'
-                self.process = QProcess()
-                self.process.setProcessChannelMode(QProcess.MergedChannels)
-                self.process.readyReadStandardOutput.connect(self.updateConsoleOutput)
-                self.process.readyReadStandardError.connect(self.updateConsoleOutput)
-                self.process.start(command)
-
-            elif self.currentFile.endswith('.php'):
-                command = f'php "{self.currentFile}"'
-                self.process = QProcess()
-                self.process.setProcessChannelMode(QProcess.MergedChannels)
-                self.process.readyReadStandardOutput.connect(self.updateConsoleOutput)
-                self.process.readyReadStandardError.connect(self.updateConsoleOutput)
-                self.process.start(command)
-
-            elif self.currentFile.endswith('.html'):
-                html_file_path = f'file://{os.path.abspath(self.currentFile)}'
+            elif ext == '.html':
+                import webbrowser
+                html_file_path = f'file://{os.path.abspath(source)}'
                 webbrowser.open(html_file_path)
-                self.console.append(f"Opened {self.currentFile} in the default web browser.")
-
-            elif self.currentFile.endswith('.js'):
-                # Ensure Node.js is installed and the path is correct
-                command = f'node "{self.currentFile}"'
-                self.process = QProcess()
-                self.process.setProcessChannelMode(QProcess.MergedChannels)
-                self.process.readyReadStandardOutput.connect(self.updateConsoleOutput)
-                self.process.readyReadStandardError.connect(self.updateConsoleOutput)
-                self.process.start(command)
-
-            elif self.currentFile.endswith('.css'):
+                self.console.append(f"Opened {source} in the default web browser.")
+                self.runPanel.showMessages()
+
+            elif ext == '.css':
                 self.console.append("Cannot execute CSS files directly.")
+                self.runPanel.showMessages()
 
             else:
                 self.console.append("Unsupported file format for direct execution.")
+                self.runPanel.showMessages()
                 return
 
             self.bottomTabWidget.setCurrentIndex(0)  # Switch to Output tab
 
-    def updateConsoleOutput(self):
-        output = self.process.readAllStandardOutput().data().decode()
-        error = self.process.readAllStandardError().data().decode()
-        self.console.append(output + error)
+    def createConsole(self):
+        config = settings()
+        console = OutputConsole(config.value('console/maxLines', 10000, type=int),
+                                config.value('console/spillToFile', False, type=bool))
+        console.openFileRequested.connect(self.loadFile)
+        console.setFont(self.editor.font())
+        console.setStyleSheet("background-color: #00091a; color: #c9dcff;")
+        return console
+
+    def startProcess(self, program, arguments, label=None, warm=False):
+        run = Run(label or os.path.basename(program), program, arguments, self.createConsole(), self)
+        if warm:
+            run.warmRunner = self.warmRunner
+        self.runPanel.addRun(run)
+        run.start()
+        return run
+
+    def setWarmRunnerEnabled(self, enabled):
+        settings().setValue('run/warmPython', enabled)
+        if enabled:
+            self.warmRunner.restart()
+        else:
+            self.warmRunner.close()
+
+    def editExcludes(self):
+        text, ok = QInputDialog.getText(self, 'Exclude Patterns',
+                                        'Names or .gitignore patterns to leave out (comma separated):',
+                                        text=', '.join(self.excludes))
+        if not ok:
+            return
+        self.excludes = [pattern.strip() for pattern in text.split(',') if pattern.strip()]
+        settings().setValue('files/excludes', self.excludes)
+        self.treeFilter.setExcludes(self.excludes)
+        self.projectIndex.setExcludes(self.excludes)
+
+    def editWarmRunnerModules(self):
+        text, ok = QInputDialog.getText(self, 'Warm Python Runner', 'Modules to import ahead of runs (comma separated):',
+                                        text=', '.join(self.warmRunner.modules))
+        if not ok:
+            return
+        self.warmRunner.modules = [module.strip() for module in text.split(',') if module.strip()]
+        settings().setValue('run/warmModules', self.warmRunner.modules)
+        if self.warmRunner.process is not None:
+            self.warmRunner.restart()
+
+    def runFile(self, source):
+        self.lastRunTarget = source
+        plan = RunPlan(source, BuildCache(projectCacheDir(self.projectPath, 'build')))
+        try:
+            command = plan.buildCommand()
+        except OSError as e:
+            self.console.append(f"Failed to read sources: {e}")
+            self.runPanel.showMessages()
+            return
+
+        name = os.path.basename(source)
+        if command is None:
+            if plan.language is not None:
+                self.statusBar().showMessage(f"{name} is up to date, running cached build", 3000)
+            self.startProcess(*plan.runCommand(), name, warm=source.endswith('.py'))
+            return
+
+        # Compiler output streams into its own run while the build runs, and the program is
+        # started from the finished signal so the GUI thread never waits on the compiler.
+        run = self.startProcess(*command, f"Build {name}")
+        # The build directory is gone once the build finishes, Run Code builds again instead
+        run.restartable = False
+        run.finished.connect(lambda: self.onBuildFinished(run, plan))
+
+    def onBuildFinished(self, run, plan):
+        plan.buildFinished(run.exitCode == 0)
+        if run.exitCode == 0:
+            self.startProcess(*plan.runCommand(), os.path.basename(plan.source))
 
+    @timed('gitCommit')
     def gitCommit(self):
         message, ok = QInputDialog.getText(self, 'Git Commit', 'Enter commit message:')
         if ok and message:
-            process = QProcess()
-            process.start(f'git commit -am "{message}"')
-            process.waitForFinished()
-            output = process.readAllStandardOutput().data().decode()
-            error = process.readAllStandardError().data().decode()
-            self.console.append(output + '\n' + error)
+            self.git.run(['commit', '-am', message])
 
+    @timed('gitPush')
     def gitPush(self):
-        process = QProcess()
-        process.start('git push')
-        process.waitForFinished()
-        output = process.readAllStandardOutput().data().decode()
-        error = process.readAllStandardError().data().decode()
-        self.console.append(output + '\n' + error)
+        self.git.run(['push'])
 
+    @timed('gitPull')
     def gitPull(self):
-        process = QProcess()
-        process.start('git pull')
-        process.waitForFinished()
-        output = process.readAllStandardOutput().data().decode()
-        error = process.readAllStandardError().data().decode()
-        self.console.append(output + '\n' + error)
+        self.git.run(['pull'])
+
+    def onGitStatusChanged(self):
+        self.fileSystemModel.setGitStatus(self.git.status)
+        self.treeView.viewport().update()
+        # The repository root is known from the first status on
+        buffer = self.currentBuffer
+        if buffer is not None and buffer.headText is None and buffer.fileName not in self.headRequests:
+            self.updateGitMarkers()
+
+    def onGitCommandFinished(self, args, exitCode):
+        if args[0] in ('commit', 'pull') and exitCode == 0:
+            self.resetGitMarkers()
+
+    def resetGitMarkers(self):
+        # HEAD moved, every buffer reads its file from it again
+        self.headRequests.clear()
+        for buffer in self.buffers:
+            buffer.headText = None
+        self.updateGitMarkers()
+
+    def readHead(self, buffer):
+        fileName = buffer.fileName
+        if fileName in self.headRequests:
+            return
+
+        def received(data):
+            self.headRequests.discard(fileName)
+            buffer = self.buffers.get(fileName)
+            if buffer is not None:
+                buffer.headText = False if data is None else data
+                if buffer is self.currentBuffer:
+                    self.updateGitMarkers()
+        self.headRequests.add(fileName)
+        if not self.git.readHead(fileName, received):
+            self.headRequests.discard(fileName)
+
+    def updateGitMarkers(self):
+        buffer = self.currentBuffer
+        if buffer is None or buffer.document is None or self.loader is not None:
+            return
+        if buffer.reducedFeatures or buffer.headText is False:
+            for marker in (GIT_ADDED, GIT_MODIFIED, GIT_DELETED):
+                self.editor.SendScintilla(QsciScintilla.SCI_MARKERDELETEALL, marker)
+            return
+        if buffer.headText is None:
+            self.readHead(buffer)
+            return
+        if self.gitDiffer is not None:
+            # Tried again once the running diff is done
+            self.gitDiffTimer.start()
+            return
+        length = self.editor.length()
+        differ = GitDiffer(buffer.headText, bytes(memoryview(self.editor.bytes(0, length))[:length]), buffer.encoding, self)
+        differ.fileName = buffer.fileName
+        differ.changes = buffer.changes
+        differ.finished.connect(self.onGitDiffed)
+        self.gitDiffer = differ
+        differ.start()
+
+    def onGitDiffed(self):
+        differ = self.sender()
+        differ.deleteLater()
+        if differ is not self.gitDiffer:
+            return
+        self.gitDiffer = None
+        buffer = self.currentBuffer
+        # Edits, switching buffers and HEAD moving start another diff
+        if (buffer is None or buffer.fileName != differ.fileName or buffer.changes != differ.changes or
+                buffer.headText is not differ.head or buffer.reducedFeatures or self.loader is not None):
+            return
+        self.applyGitMarkers(differ.markers)
+
+    def applyGitMarkers(self, markers):
+        # Scintilla moves markers along with the lines they are on, so only the lines whose
+        # marker changed since the last diff are sent to it
+        shown = {}
+        line = self.editor.SendScintilla(QsciScintilla.SCI_MARKERNEXT, 0, GIT_MARKER_MASK)
+        while line >= 0:
+            shown[line] = self.editor.SendScintilla(QsciScintilla.SCI_MARKERGET, line) & GIT_MARKER_MASK
+            line = self.editor.SendScintilla(QsciScintilla.SCI_MARKERNEXT, line + 1, GIT_MARKER_MASK)
+        for line, mask in shown.items():
+            wanted = markers.get(line)
+            for marker in (GIT_ADDED, GIT_MODIFIED, GIT_DELETED):
+                if mask & (1 << marker) and marker != wanted:
+                    self.editor.SendScintilla(QsciScintilla.SCI_MARKERDELETE, line, marker)
+        for line, marker in markers.items():
+            if not shown.get(line, 0) & (1 << marker):
+                self.editor.SendScintilla(QsciScintilla.SCI_MARKERADD, line, marker)
 
+    @timed('treeClick')
     def onFileClicked(self, index):
+        index = self.treeFilter.mapToSource(index)
         if not self.fileSystemModel.isDir(index):
             fileName = self.fileSystemModel.filePath(index)
             if fileName.endswith(('.exe', '.zip')):
@@ -547,25 +5110,97 @@ class MainWindow(QMainWindow):
 
 
     def terminalKeyPressEvent(self, event):
-        if event.key() == Qt.Key_Return or event.key() == Qt.Key_Enter:
-            command = self.terminal.toPlainText().splitlines()[-1]
-            if self.process and self.process.state() == QProcess.Running:
-                self.process.write((command + '\n').encode())
+        run = self.runPanel.activeRun()
+        if run is not None or not self.terminalSession.hasPty:
+            self.terminalLineKeyPress(event, run)
+            return
+
+        if not self.terminalSession.isRunning():
+            if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                self.restartTerminal()
+            return
+
+        if event.matches(QKeySequence.Copy) and self.terminal.textCursor().hasSelection():
+            self.terminal.copy()
+        elif event.matches(QKeySequence.Paste):
+            self.terminalSession.write(QApplication.clipboard().text().encode())
+        elif event.modifiers() & Qt.ControlModifier and Qt.Key_A <= event.key() <= Qt.Key_Z:
+            self.terminalSession.write(bytes([event.key() - Qt.Key_A + 1]))
+        elif event.key() in TERMINAL_KEYS:
+            self.terminalSession.write(TERMINAL_KEYS[event.key()])
+        elif event.text():
+            self.terminalSession.write(event.text().encode())
+
+    def terminalLineKeyPress(self, event, run):
+        # Lines are edited locally, either for the standard input of a running program or
+        # for a shell running on pipes
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            line, self.terminalInput = self.terminalInput, ''
+            self.terminal.write('\n')
+            if run is not None:
+                run.process.write((line + '\n').encode())
                 self.bottomTabWidget.setCurrentIndex(0)  # Switch to Output tab
             else:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                output, error = process.communicate()
-                self.terminal.append(output.decode() + error.decode())
+                self.terminalSession.write((line + '\r\n').encode())
+        elif event.key() == Qt.Key_Backspace:
+            if self.terminalInput:
+                self.terminalInput = self.terminalInput[:-1]
+                self.terminal.write('\b')
+        elif event.matches(QKeySequence.Copy) and self.terminal.textCursor().hasSelection():
+            self.terminal.copy()
+        elif event.key() == Qt.Key_C and event.modifiers() & Qt.ControlModifier:
+            self.interruptTerminal()
+        elif event.text() and event.text().isprintable():
+            self.terminalInput += event.text()
+            self.terminal.write(event.text())
+
+    def interruptTerminal(self):
+        run = self.runPanel.activeRun()
+        if run is not None:
+            run.interrupt()
         else:
-            QTextEdit.keyPressEvent(self.terminal, event)
+            self.terminalSession.interrupt()
+
+    def restartTerminal(self):
+        self.terminal.clear()
+        self.terminalInput = ''
+        self.terminalSession.restart()
+
+    def closeEvent(self, event):
+        self.saveSession()
+        # Unsaved edits stay in their journals and are offered for recovery on the next start
+        for saver in list(self.savers.values()):
+            saver.wait()
+            if saver.stamp is not None:
+                saver.journal.rebase(saver.stamp)
+            saver.journal.saving = False
+        self.savers.clear()
+        self.flushJournals()
+        for job in list(self.differs.values()) + list(self.wordJobs.values()):
+            job.cancel()
+            job.wait()
+        if self.gitDiffer is not None:
+            self.gitDiffer.wait()
+        self.runPanel.close()
+        self.warmRunner.close()
+        self.terminalSession.close()
+        self.git.close()
+        self.findInFiles.close()
+        self.symbolIndex.close()
+        self.projectIndex.close()
+        shutdownProcessPool()
+        if self.imageViewer is not None:
+            self.imageViewer.stop()
+        profiler.close()
+        super().closeEvent(event)
 
     def showContextMenu(self, point: QPoint):
         index = self.treeView.indexAt(point)
         if index.isValid():
             contextMenu = QMenu(self)
-            deleteAction = QAction(QIcon('delete.png'), 'Delete', self)
+            deleteAction = QAction(loadIcon('delete.png'), 'Delete', self)
             deleteAction.triggered.connect(lambda: self.deleteFile(index))
-            renameAction = QAction(QIcon('rename.png'), 'Rename', self)
+            renameAction = QAction(loadIcon('rename.png'), 'Rename', self)
             renameAction.triggered.connect(lambda: self.renameFile(index))
             contextMenu.addAction(deleteAction)
             contextMenu.addAction(renameAction)
@@ -574,17 +5209,22 @@ class MainWindow(QMainWindow):
     def deleteFile(self, index=None):
         if index is None:
             index = self.treeView.currentIndex()
+        index = self.treeFilter.mapToSource(index)
         filePath = self.fileSystemModel.filePath(index)
         if QMessageBox.question(self, 'Delete File', f'Are you sure you want to delete "{filePath}"?', QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
-            if os.path.isfile(filePath):
-                os.remove(filePath)
-            elif os.path.isdir(filePath):
-                os.rmdir(filePath)
-            self.treeView.setRootIndex(self.fileSystemModel.index(self.projectPath))
+            # The model removes the entry along with the file, the rest of the tree stays as it is
+            if self.fileSystemModel.isDir(index):
+                if not self.fileSystemModel.rmdir(index):
+                    QMessageBox.critical(self, "Delete File", f'Failed to delete "{filePath}", only empty folders can be deleted.')
+            elif self.fileSystemModel.remove(index):
+                self.closeBuffer(filePath, force=True)
+            else:
+                QMessageBox.critical(self, "Delete File", f'Failed to delete "{filePath}".')
 
     def renameFile(self, index=None):
         if index is None:
             index = self.treeView.currentIndex()
+        index = self.treeFilter.mapToSource(index)
         
         filePath = self.fileSystemModel.filePath(index)
         baseName = os.path.basename(filePath)
@@ -609,16 +5249,62 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Rename File", "A file with this name already exists. Please choose a different name.")
             else:
                 # Tudo certo para renomear
-                try:
-                    os.rename(filePath, newFilePath)
-                    # Atualiza a visualização do diretório no tree view
-                    self.treeView.setRootIndex(self.fileSystemModel.index(self.projectPath))
-                    return
-                except OSError as e:
-                    QMessageBox.critical(self, "Rename File", f"Failed to rename file: {e}")
-                    return
+                # Renaming through the model updates the entry in place, the rest of the tree
+                # stays as it is
+                self.fileSystemModel.setReadOnly(False)
+                renamed = self.fileSystemModel.setData(index, newName)
+                self.fileSystemModel.setReadOnly(True)
+                if renamed:
+                    self.renameBuffer(filePath, newFilePath)
+                else:
+                    QMessageBox.critical(self, "Rename File", f'Failed to rename "{filePath}".')
+                return
+
+def runBatch(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='main.py --run-batch',
+                                     description='Runs files the way Run Code does, without opening the IDE, '
+                                                 'and writes a JSON summary of the runs.')
+    parser.add_argument('--run-batch', nargs='+', required=True, metavar='PATH',
+                        help='files, directories or glob patterns (** included) to run')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='runs at a time (default: CPU count)')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds each build or run may take (default 60)')
+    parser.add_argument('--output', help='write the summary to this file instead of standard output')
+    parser.add_argument('--build-cache', default=projectCacheDir(os.getcwd(), 'build'),
+                        help='where compiled programs are cached (default .scriptbliss/build)')
+    args = parser.parse_args(argv)
+
+    scripts = batchScripts(args.run_batch)
+    if not scripts:
+        print("No files to run", file=sys.stderr)
+        return 2
+
+    def progress(result):
+        status = 'ok' if result['passed'] else 'timeout' if result.get('timedOut') else 'FAIL'
+        print(f"{status:<8} {result['script']}  {result.get('wall', 0):.2f}s", file=sys.stderr, flush=True)
+
+    runner = BatchRunner(BuildCache(args.build_cache), max(1, args.jobs), args.timeout)
+    start = time.perf_counter()
+    try:
+        results = runner.run(scripts, progress)
+    except KeyboardInterrupt:
+        return 130
+    failed = sum(not result['passed'] for result in results)
+    summary = {'scripts': len(results), 'passed': len(results) - failed, 'failed': failed,
+               'wall': time.perf_counter() - start, 'jobs': runner.jobs, 'timeout': runner.timeout, 'runs': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    print(f"{summary['passed']} passed, {failed} failed in {summary['wall']:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
 
 if __name__ == '__main__':
+    if '--run-batch' in sys.argv[1:]:
+        # Needs no display, Qt is never started
+        sys.exit(runBatch(sys.argv[1:]))
     app = QApplication(sys.argv)
     main = MainWindow()
     main.show()
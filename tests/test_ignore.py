@@ -0,0 +1,29 @@
+import main
+
+
+def test_project_cache_is_always_ignored():
+    matcher = main.IgnoreMatcher([])
+    assert matcher.ignored(main.PROJECT_CACHE_DIR, True)
+    assert matcher.ignored('sub/' + main.PROJECT_CACHE_DIR, True)
+    assert not matcher.ignored(main.PROJECT_CACHE_DIR, False)
+    assert not matcher.ignored('src', True)
+    assert main.PROJECT_CACHE_DIR not in main.DEFAULT_EXCLUDES
+
+
+def test_trailing_spaces_are_dropped_unless_escaped():
+    rules = main.IgnoreRules(['plain   ', 'kept\\ ', 'twice\\\\  ', 'tab\t'])
+    assert rules.match('plain', False)
+    assert not rules.match('plain ', False)
+    assert rules.match('kept ', False)
+    assert not rules.match('kept', False)
+    assert not rules.match('kept\\ ', False)
+    assert rules.match('twice\\', False)
+    assert rules.match('tab', False)
+
+
+def test_escaped_characters_match_themselves():
+    rules = main.IgnoreRules(['\\#hash', 'star\\*', '\\!bang'])
+    assert rules.match('#hash', False)
+    assert rules.match('star*', False)
+    assert not rules.match('starry', False)
+    assert rules.match('!bang', False)
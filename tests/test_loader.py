@@ -0,0 +1,43 @@
+import main
+
+
+def load(fileName):
+    loader = main.FileLoader(str(fileName))
+    chunks = []
+
+    def chunkLoaded(text):
+        chunks.append(text)
+        loader.chunkConsumed()
+    loader.chunkLoaded.connect(chunkLoaded)
+    loader.restarted.connect(chunks.clear)
+    loader.run()
+    return loader, ''.join(chunks)
+
+
+def test_invalid_bytes_after_first_chunk_fall_back_losslessly(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.FileLoader, 'CHUNK_SIZE', 16)
+    data = 'naïve text, all UTF-8\n'.encode('utf-8') * 4 + b'caf\xe9 in Latin-1\n'
+    fileName = tmp_path / 'mixed.txt'
+    fileName.write_bytes(data)
+
+    loader, text = load(fileName)
+    assert loader.encoding == main.FALLBACK_ENCODING
+    assert text == data.decode('latin-1')
+    assert '�' not in text
+
+    saver = main.FileSaver(str(fileName), text.encode('utf-8'), loader.encoding)
+    saver.run()
+    assert fileName.read_bytes() == data
+
+    diff = main.diffFile(str(fileName), text.encode('utf-8'))
+    assert diff['encoding'] == main.FALLBACK_ENCODING
+    assert diff['hunks'] == []
+
+
+def test_valid_utf8_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.FileLoader, 'CHUNK_SIZE', 7)
+    text = 'ü€𝄞 mixed widths\n' * 5
+    fileName = tmp_path / 'utf8.txt'
+    fileName.write_text(text, encoding='utf-8')
+    loader, loaded = load(fileName)
+    assert (loader.encoding, loaded) == ('utf-8', text)
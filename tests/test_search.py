@@ -0,0 +1,51 @@
+import main
+
+
+def search(root, relPaths, query, caseSensitive=False, maxHits=100):
+    matcher = main.FindInFiles().compile(query, caseSensitive=caseSensitive)
+    return main.searchFiles(str(root), relPaths, matcher, maxHits)
+
+
+def test_case_insensitive_literal_in_mapped_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'MMAP_THRESHOLD', 64)
+    (tmp_path / 'big.txt').write_bytes(b'first line\n' * 10 + b'the NEEDLE is here\n' + b'last line\n' * 10)
+    (tmp_path / 'small.txt').write_bytes(b'needle\n')
+    hits = search(tmp_path, ['big.txt', 'small.txt'], 'needle')
+    assert hits == [('big.txt', 10, 4, 'the NEEDLE is here'), ('small.txt', 0, 0, 'needle')]
+
+
+def test_case_sensitive_literal_in_mapped_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'MMAP_THRESHOLD', 64)
+    (tmp_path / 'big.txt').write_bytes(b'x' * 100 + b'\nNeedle needle\n')
+    assert search(tmp_path, ['big.txt'], 'needle', caseSensitive=True) == [('big.txt', 1, 7, 'Needle needle')]
+
+
+def test_failing_file_is_skipped(tmp_path, monkeypatch):
+    (tmp_path / 'a.txt').write_bytes(b'needle\n')
+    (tmp_path / 'b.txt').write_bytes(b'needle\n')
+    searchData = main.searchData
+
+    def failOnA(relPath, *args):
+        if relPath == 'a.txt':
+            raise MemoryError
+        searchData(relPath, *args)
+    monkeypatch.setattr(main, 'searchData', failOnA)
+    assert search(tmp_path, ['a.txt', 'missing.txt', 'b.txt'], 'needle') == [('b.txt', 0, 0, 'needle')]
+
+
+def test_file_search_resumed_slice_by_slice_matches_one_pass(monkeypatch):
+    paths = ['src/core/util.py', 'lib/core_util.h', 'docs/util/core.md', 'src/main.py', 'tests/test_util.py'] * 20
+    paths = ['%s/%d/%s' % (path.split('/')[0], i, path) for i, path in enumerate(paths)]
+    data = main.FileSearchData(paths)
+    whole = main.FileSearch('coreutil', data, data)
+    whole.run(60, 50, 1000)
+    assert whole.done and whole.complete
+
+    monkeypatch.setattr(main.FileSearch, 'SLICE', 16)
+    sliced = main.FileSearch('coreutil', data, data)
+    calls = 0
+    while not sliced.done:
+        sliced.run(0, 500, 1000)
+        calls += 1
+    assert calls > 1
+    assert sliced.paths() == whole.paths()
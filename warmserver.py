@@ -0,0 +1,222 @@
+# Keeps a Python interpreter around with a list of modules already imported and forks a fresh
+# child of it for every script run, so that runs skip interpreter startup and those imports.
+#
+#     python warmserver.py serve SOCKET MODULE...
+#     python warmserver.py run SOCKET SCRIPT ARG...
+#
+# "run" hands its stdin and stdout to the server, the forked child writes straight into them.
+# It then reports the child's exit status and resource usage as JSON on its own stderr, the same
+# way the run wrapper in main.py does, and runs the script cold if the server cannot be reached.
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+
+
+def report(status, usage, wall):
+    signalled = os.WIFSIGNALED(status)
+    return {'wall': wall, 'cpu': usage.ru_utime + usage.ru_stime,
+            'maxRss': usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024),
+            'exitCode': None if signalled else os.WEXITSTATUS(status),
+            'signal': os.WTERMSIG(status) if signalled else None}
+
+
+def exitCode(error):
+    # What the interpreter does with an uncaught SystemExit
+    if error.code is None:
+        return 0
+    if isinstance(error.code, int):
+        return error.code
+    print(error.code, file=sys.stderr)
+    return 1
+
+
+def runScript(request, fds, inherited):
+    os.setpgid(0, 0)
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for fd in inherited:
+        os.close(fd)
+    stdin, stdout = fds
+    os.dup2(stdin, 0)
+    os.dup2(stdout, 1)
+    os.dup2(stdout, 2)
+    os.close(stdin)
+    os.close(stdout)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    script = request['argv'][0]
+    sys.argv = list(request['argv'])
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    import runpy
+    code = 0
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        code = exitCode(e)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except OSError:
+        pass
+    os._exit(code)
+
+
+def serve(path, modules):
+    imported = []
+    for module in modules:
+        try:
+            __import__(module)
+            imported.append(module)
+        except Exception as e:
+            print(f"Warm runner could not import {module}: {e}", file=sys.stderr, flush=True)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    wakeupRead, wakeupWrite = os.pipe()
+    os.set_blocking(wakeupRead, False)
+    os.set_blocking(wakeupWrite, False)
+    signal.set_wakeup_fd(wakeupWrite)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wakeupRead, selectors.EVENT_READ)
+    # The IDE holds the other end, the server goes when it does
+    selector.register(sys.stdin, selectors.EVENT_READ)
+    children = {}
+    print('ready', ','.join(imported), flush=True)
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                connection, _ = listener.accept()
+                child = spawn(connection, [listener.fileno(), wakeupRead, wakeupWrite, selector.fileno()] +
+                              [c.fileno() for c, _ in children.values()])
+                if child is None:
+                    connection.close()
+                else:
+                    children[child] = (connection, time.perf_counter())
+                    selector.register(connection, selectors.EVENT_READ)
+            elif key.fileobj is wakeupRead:
+                while os.read(wakeupRead, 512) == 512:
+                    pass
+                reap(children, selector)
+            elif key.fileobj is sys.stdin:
+                if not os.read(sys.stdin.fileno(), 512):
+                    return
+            else:
+                # Clients only ever write their request, so this is a client that was killed.
+                # Its script goes with it.
+                selector.unregister(key.fileobj)
+                for child, (connection, _) in children.items():
+                    if connection is key.fileobj:
+                        try:
+                            os.killpg(child, signal.SIGKILL)
+                        except OSError:
+                            pass
+
+
+def spawn(connection, inherited):
+    # The request comes with the client's stdin and stdout
+    data, fds, _, _ = socket.recv_fds(connection, 1 << 16, 2)
+    while data and not data.endswith(b'\n'):
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            break
+        data += chunk
+    if len(fds) != 2 or not data.endswith(b'\n'):
+        for fd in fds:
+            os.close(fd)
+        return None
+    request = json.loads(data)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    child = os.fork()
+    if child == 0:
+        try:
+            runScript(request, fds, inherited + [connection.fileno()])
+        finally:
+            os._exit(1)
+    for fd in fds:
+        os.close(fd)
+    try:
+        connection.sendall(json.dumps({'pid': child}).encode() + b'\n')
+    except OSError:
+        pass
+    return child
+
+
+def reap(children, selector):
+    while children:
+        try:
+            child, status, usage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if not child:
+            return
+        connection, started = children.pop(child)
+        try:
+            connection.sendall(json.dumps(report(status, usage, time.perf_counter() - started)).encode() + b'\n')
+        except OSError:
+            pass
+        try:
+            selector.unregister(connection)
+        except KeyError:
+            pass
+        connection.close()
+
+
+def runCold(argv):
+    os.dup2(1, 2)
+    os.execv(sys.executable, [sys.executable] + argv)
+
+
+def run(path, argv):
+    # Stopping the run signals this process group, which is forwarded to the script's own group
+    os.setpgid(0, 0)
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+        request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+        socket.send_fds(connection, [json.dumps(request).encode() + b'\n'], [0, 1])
+    except OSError:
+        runCold(argv)
+    replies = connection.makefile('rb')
+    reply = replies.readline()
+    if not reply:
+        runCold(argv)
+    child = json.loads(reply)['pid']
+
+    def forward(signum, frame):
+        try:
+            os.killpg(child, signum)
+        except OSError:
+            pass
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward)
+
+    reply = replies.readline()
+    if not reply:
+        sys.exit(1)
+    os.write(2, reply.rstrip(b'\n'))
+    result = json.loads(reply)
+    os._exit(128 + result['signal'] if result['signal'] else result['exitCode'])
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'serve':
+        serve(sys.argv[2], sys.argv[3:])
+    else:
+        run(sys.argv[2], sys.argv[3:])